@@ -0,0 +1,179 @@
+def run_rabi_ribi_benchmark(seeds: int = 10, players: int = 20) -> None:
+    """
+    Run a benchmark of the stages of Rabi-Ribi generation for several option presets.
+
+    :param seeds: Number of seeds to search a map allocation for, per preset.
+    :param players: Number of Rabi-Ribi players in the multiplayer generation.
+    """
+    import argparse
+    import collections
+    import logging
+    import statistics
+    import typing
+    from unittest import mock
+
+    from time_it import TimeIt
+
+    from Utils import init_logging
+    from BaseClasses import MultiWorld, CollectionState
+    from Fill import balance_multiworld_progression, distribute_items_restrictive
+    from worlds.AutoWorld import call_all
+    from worlds.generic.Rules import locality_rules
+    from worlds.rabi_ribi.entrance_shuffle import MapGenerator
+    from worlds.rabi_ribi.existing_randomizer import dataparser
+    from worlds.rabi_ribi.existing_randomizer.dataparser import RandomizerData
+    from worlds.rabi_ribi.locations import setup_locations
+    from worlds.rabi_ribi.regions import RegionHelper
+    from worlds.rabi_ribi.rules import parse_connections
+    from worlds.rabi_ribi.world import RabiRibiWorld
+
+    init_logging("Benchmark Runner")
+    logger = logging.getLogger("Benchmark")
+
+    class BenchmarkRunner:
+        gen_steps: typing.Tuple[str, ...] = (
+            "generate_early",
+            "create_regions",
+            "create_items",
+            "set_rules",
+            "connect_entrances",
+            "generate_basic",
+            "pre_fill",
+        )
+
+        presets: typing.Dict[str, typing.Dict[str, typing.Any]] = {
+            "default": {},
+            "no map shuffle": {
+                "shuffle_map_transitions": False,
+                "number_of_constraint_changes": 0,
+            },
+            "map shuffle": {
+                "shuffle_map_transitions": True,
+            },
+            "map shuffle, 50 constraint changes": {
+                "shuffle_map_transitions": True,
+                "number_of_constraint_changes": 50,
+            },
+            "map shuffle, advanced knowledge, hard tricks": {
+                "shuffle_map_transitions": True,
+                "knowledge": "advanced",
+                "trick_difficulty": "hard",
+            },
+        }
+
+        randomizer_data_iterations: int = 10
+
+        @staticmethod
+        def create_multiworld(player_count: int, seed: int, options: typing.Dict[str, typing.Any]) -> MultiWorld:
+            multiworld = MultiWorld(player_count)
+            multiworld.game = {player: RabiRibiWorld.game for player in range(1, player_count + 1)}
+            multiworld.player_name = {player: f"Tester{player}" for player in multiworld.player_ids}
+            multiworld.set_seed(seed)
+            args = argparse.Namespace()
+            for name, option in RabiRibiWorld.options_dataclass.type_hints.items():
+                setattr(args, name, {
+                    player: option.from_any(options.get(name, option.default)) for player in multiworld.player_ids
+                })
+            multiworld.set_options(args)
+            multiworld.state = CollectionState(multiworld)
+            return multiworld
+
+        @staticmethod
+        def format_histogram(counter: collections.Counter[int]) -> str:
+            buckets = ((1, 1), (2, 10), (11, 100), (101, 1000), (1001, 10000))
+            lines = []
+            for low, high in buckets:
+                count = sum(amount for attempts, amount in counter.items() if low <= attempts <= high)
+                label = str(low) if low == high else f"{low}-{high}"
+                lines.append(f"  {label:>10} attempts: {count:3} {'#' * count}")
+            return "\n".join(lines)
+
+        def parse_connections_test(self) -> None:
+            with TimeIt("Rabi-Ribi parse_connections", logger):
+                parse_connections()
+            with TimeIt("Rabi-Ribi parse_connections (already parsed)", logger):
+                parse_connections()
+
+        def randomizer_data_test(self, preset: str, options: typing.Dict[str, typing.Any]) -> None:
+            multiworld = self.create_multiworld(1, 0, options)
+            call_all(multiworld, "generate_early")
+            settings = multiworld.worlds[1].existing_randomizer_args
+
+            # Bypass the on-disk constraint cache, to time parsing the constraint files.
+            dataparser._static_data_cache.clear()
+            with mock.patch.object(dataparser, "load_cached_constraints", return_value=None):
+                with TimeIt(f"Rabi-Ribi {preset}: RandomizerData without parsed data", logger):
+                    RandomizerData(settings)
+            dataparser._static_data_cache.clear()
+            with TimeIt(f"Rabi-Ribi {preset}: RandomizerData from the constraint cache", logger):
+                RandomizerData(settings)
+            with TimeIt(f"Rabi-Ribi {preset}: {self.randomizer_data_iterations} runs of RandomizerData", logger):
+                for _ in range(self.randomizer_data_iterations):
+                    RandomizerData(settings)
+
+        def generate_seed_test(self, preset: str, options: typing.Dict[str, typing.Any]) -> None:
+            times: typing.List[float] = []
+            attempts: collections.Counter[int] = collections.Counter()
+            for seed in range(seeds):
+                multiworld = self.create_multiworld(1, seed, options)
+                call_all(multiworld, "generate_early")
+                world = multiworld.worlds[1]
+                generator = MapGenerator(world.randomizer_data, world.existing_randomizer_args,
+                                         set(setup_locations(world.options)), world)
+                with TimeIt(f"Rabi-Ribi {preset}: generate_seed with seed {seed}") as t:
+                    generator.generate_seed()
+                times.append(t.dif)
+                attempts[generator.attempts] += 1
+
+            logger.info(f"Rabi-Ribi {preset}: generate_seed took {statistics.mean(times):.4f} seconds on average "
+                        f"and {max(times):.4f} at most over {seeds} seeds.")
+            logger.info(f"Rabi-Ribi {preset}: attempts needed to find a valid map allocation:\n"
+                        f"{self.format_histogram(attempts)}")
+
+        def region_helper_test(self, preset: str, options: typing.Dict[str, typing.Any]) -> None:
+            multiworld = self.create_multiworld(1, 0, options)
+            call_all(multiworld, "generate_early")
+            region_helper = RegionHelper(multiworld.worlds[1])
+            region_helper.generate_seed()
+            with TimeIt(f"Rabi-Ribi {preset}: RegionHelper.set_regions", logger):
+                region_helper.set_regions()
+            with TimeIt(f"Rabi-Ribi {preset}: RegionHelper.connect_regions", logger):
+                region_helper.connect_regions()
+            with TimeIt(f"Rabi-Ribi {preset}: RegionHelper.set_locations", logger):
+                region_helper.set_locations()
+
+        def generation_test(self, preset: str, options: typing.Dict[str, typing.Any], player_count: int) -> None:
+            multiworld = self.create_multiworld(player_count, 0, options)
+            with TimeIt(f"Rabi-Ribi {preset}: full generation with {player_count} players", logger):
+                for step in self.gen_steps:
+                    with TimeIt(f"Rabi-Ribi {preset}: {player_count} players step {step}", logger):
+                        call_all(multiworld, step)
+                    if step == "set_rules" and player_count > 1:
+                        locality_rules(multiworld)
+                with TimeIt(f"Rabi-Ribi {preset}: {player_count} players fill", logger):
+                    distribute_items_restrictive(multiworld)
+                    call_all(multiworld, "post_fill")
+                    if player_count > 1:
+                        balance_multiworld_progression(multiworld)
+
+        def main(self) -> None:
+            # Parse the connections first, as generate_early parses them once per process
+            self.parse_connections_test()
+            for preset, options in self.presets.items():
+                try:
+                    self.randomizer_data_test(preset, options)
+                    self.generate_seed_test(preset, options)
+                    self.region_helper_test(preset, options)
+                    self.generation_test(preset, options, 1)
+                    self.generation_test(preset, options, players)
+                except Exception as e:
+                    logger.exception(e)
+
+    runner = BenchmarkRunner()
+    runner.main()
+
+
+if __name__ == "__main__":
+    from path_change import change_home
+    change_home()
+    run_rabi_ribi_benchmark()
@@ -1,12 +1,13 @@
 import logging
 from typing import Any, override
 
-from BaseClasses import MultiWorld
+from BaseClasses import CollectionState, Item, MultiWorld
 from Options import OptionError
+from rule_builder.cached_world import CachedRuleBuilderWorld
 from rule_builder.rules import Rule
-from worlds.AutoWorld import World
 
 from .constants import GAME_NAME
+from .counters import StateCounters
 from .data import data
 from .existing_randomizer.dataparser import RandomizerData
 from .existing_randomizer.randomizer import parse_args
@@ -15,7 +16,7 @@ from .options import RabiRibiOptions
 logger = logging.getLogger(GAME_NAME)
 
 
-class RabiRibiWorldBase(World):
+class RabiRibiWorldBase(CachedRuleBuilderWorld):
     options_dataclass = RabiRibiOptions
     # pyright: ignore[reportIncompatibleVariableOverride]
     options: RabiRibiOptions
@@ -28,20 +29,40 @@ class RabiRibiWorldBase(World):
 
     existing_randomizer_args: Any
     randomizer_data: RandomizerData
+    state_counters: StateCounters | None
 
     def __init__(self, multiworld: MultiWorld, player: int) -> None:
         super().__init__(multiworld, player)
         self.rule_macros = {}
+        self.state_counters = None
 
     @override
     def generate_early(self) -> None:
         super().generate_early()
+        self.state_counters = StateCounters(
+            bool(self.options.rainbow_shot_in_logic.value),
+            self.options.knowledge.value >= self.options.knowledge.option_advanced,
+        )
         self.existing_randomizer_args = self._convert_options_to_existing_randomizer_args()
         self.randomizer_data = RandomizerData(self.existing_randomizer_args)
         self.update_minimum_number_of_constraints()
         self.detect_excluded_required_constraint()
         self.detect_conflicting_constraints()
 
+    @override
+    def collect(self, state: CollectionState, item: Item) -> bool:
+        changed = super().collect(state, item)
+        if changed and self.state_counters is not None:
+            self.state_counters.update(state.prog_items[self.player], item.name)
+        return changed
+
+    @override
+    def remove(self, state: CollectionState, item: Item) -> bool:
+        changed = super().remove(state, item)
+        if changed and self.state_counters is not None:
+            self.state_counters.update(state.prog_items[self.player], item.name)
+        return changed
+
     def update_minimum_number_of_constraints(self):
         if self.options.number_of_constraint_changes < len(self.options.required_constraints.value):
             logger.warning(
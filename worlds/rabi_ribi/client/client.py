@@ -1,4 +1,4 @@
-from typing import NamedTuple, Optional
+from typing import TYPE_CHECKING, NamedTuple, Optional
 import ast
 import asyncio
 import os
@@ -18,15 +18,26 @@ from CommonClient import (
 from NetUtils import ClientStatus, NetworkItem
 
 from worlds.AutoWorld import World
-from ..client.memory_io import RabiRibiMemoryIO
+from ..client.map_writer import MapWriter
+from ..client.memory_backend import ProcessLost
+from ..client.memory_io import (
+    EXCLAMATION_POINT_ITEM_ID,
+    RabiRibiMemoryIO,
+    RabiRibiSnapshot,
+    SnapshotEvent,
+    get_snapshot_events,
+)
 from ..constants import GAME_NAME
 from ..data import data
-from ..items import item_groups
-from ..locations import all_locations
+from ..items import item_groups, item_table, lookup_item_id_to_game_id
+from ..locations import all_locations, location_coordinates_by_id, location_ids_by_coordinates
 from ..names import ItemName
 from ..options import AttackMode
 from ..world import RabiRibiWorld
 
+if TYPE_CHECKING:
+    from ..client.patch import PatchInputs
+
 try:
     from worlds.tracker.TrackerClient import UT_VERSION, TrackerCommandProcessor, TrackerGameContext # type: ignore
 
@@ -57,6 +68,28 @@ except ImportError:
 STRANGE_BOX_ITEM_ID = 30
 TROPHY_ITEM_ID = 42
 TRIGGER_BLOCK_EVENT_ID1 = 576
+# Tiles from the player an item location can be, to be found after getting an item
+MAX_ITEM_LOCATION_DISTANCE = 9
+# Seconds between snapshots of the game while its state is changing.
+# While nothing changes, the interval doubles up to MAX_POLL_INTERVAL, which stays short
+# so pauses are detected fast (see update_menu_times), or up to MAX_IDLE_POLL_INTERVAL
+# while the game is not on the scenario of this seed.
+MIN_POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.1
+MAX_IDLE_POLL_INTERVAL = 1
+# Seconds to wait for the item receive animation to start after giving an item
+ITEM_ANIMATION_START_TIMEOUT = 1
+NOTHING_ITEM_ID = item_table[ItemName.nothing]
+EASTER_EGG_ITEM_ID = item_table[ItemName.easter_egg]
+# Rabi-ribi item id given for the first received potion of each type, decremented for the next ones.
+#  Subtract 30 since those are reserved for shop and super / hyper attack modes
+POTION_START_IDS = {
+    item_table[ItemName.attack_up]: 223 - 30,
+    item_table[ItemName.mp_up]: 287 - 30,
+    item_table[ItemName.regen_up]: 351 - 30,
+    item_table[ItemName.hp_up]: 159 - 30,
+    item_table[ItemName.pack_up]: 415 - 30
+}
 
 class RabiRibiCommandProcessor(TrackerCommandProcessor): # type: ignore
     ctx: "RabiRibiContext"
@@ -125,6 +158,13 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
         self.custom_seed_subdir = None
         self.seed_player = None
         self.seed_player_id = None
+        self.maps_patched = False
+        # Set if patching the maps failed, so the watcher stops waiting for the patch
+        self.patch_failed = False
+        # The patch of the current connection. A patch thread cannot be stopped, so the lock keeps
+        # a new patch from starting before the thread of a previous connection is done.
+        self.patch_task: Optional[asyncio.Task] = None
+        self.patch_lock = asyncio.Lock()
 
         self.time_since_last_paused = time.time()
         self.time_since_main_menu = time.time()
@@ -133,9 +173,16 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
         self.time_since_last_costume_menu = time.time()
         self.time_since_last_save_menu = time.time()
         self.time_since_last_death = time.time()
+        self.time_since_in_shaft = 0
+
+        self.last_snapshot: Optional[RabiRibiSnapshot] = None
+        # Changes seen while waiting on the main menu or in the starting shaft, handled once the player is in game
+        self.pending_snapshot_events: set[SnapshotEvent] = set()
+        self.poll_interval = MIN_POLL_INTERVAL
         
-        self.items_received_rabi_ribi_ids = []
+        self.reset_received_rabi_ribi_item_ids()
         self.obtained_items_queue: asyncio.Queue[NetworkItem] = asyncio.Queue()
+        self.map_writer = MapWriter()
 
         self.critical_section_lock = asyncio.Lock()
 
@@ -146,6 +193,11 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
         self.is_crosswarp_disabled = True
         self.updated_attack_mode = None
 
+    async def shutdown(self):
+        # Make sure every collected exclamation point is removed from the map files
+        await self.map_writer.close()
+        await super().shutdown()
+
     def make_gui(self):
         ui = super().make_gui()
         ui.base_title = f"Rabi-Ribi Client v{RabiRibiWorld.world_version.as_simple_string()}"
@@ -169,13 +221,16 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
             self.seed_player_id = str(hashlib.sha256(self.seed_player.encode()).hexdigest()[:7])
             self.custom_seed_subdir = f"{RabiRibiWorld.settings.game_installation_path}/custom/{self.seed_player}"
 
-            if not os.path.isfile(f"{self.custom_seed_subdir}/area0.map"):
-                asyncio.create_task(self.send_msgs([{
-                    "cmd": "LocationScouts",
-                    "locations": self.server_locations
-                }]))
+            # The scouted locations are part of the key of the patched maps, see patch_map_files_if_needed.
+            asyncio.create_task(self.send_msgs([{
+                "cmd": "LocationScouts",
+                "locations": self.server_locations
+            }]))
 
         if cmd == "ReceivedItems":
+            if args["index"] == 0:
+                # The server sent every received item again
+                self.reset_received_rabi_ribi_item_ids()
             asyncio.create_task(self.set_received_rabi_ribi_item_ids())
 
         if cmd == "RoomInfo":
@@ -193,7 +248,7 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
         """
         This method waits until the client finishes the initial conversation with the server.
         This means:
-            - All LocationInfo packages recieved - requested only if patch files dont exist.
+            - All LocationInfo packages recieved.
             - DataPackage package recieved (id_to_name maps and name_to_id maps are popualted)
             - Connection package recieved (slot number populated)
             - RoomInfo package recieved (seed name populated)
@@ -203,16 +258,23 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
             self.slot
         )
 
+    def client_finished_patching(self):
+        """
+        The map files are patched, or patching them failed and the client continues without them.
+        """
+        return self.client_recieved_initial_server_data() and (self.maps_patched or self.patch_failed)
+
     async def wait_for_initial_connection_info(self):
         """
-        This method waits until the client finishes the initial conversation with the server.
+        This method waits until the client finishes the initial conversation with the server,
+        and the map files are patched.
         See client_recieved_initial_server_data for wait requirements.
         """
-        if self.client_recieved_initial_server_data():
+        if self.client_finished_patching():
             return
 
         logger.info("Waiting for connect from server...")
-        while not self.client_recieved_initial_server_data() and not self.exit_event.is_set():
+        while not self.client_finished_patching() and not self.exit_event.is_set():
             await asyncio.sleep(1)
         if not self.exit_event.is_set():
             # wait an extra second to process data
@@ -233,111 +295,154 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
         See client_recieved_initial_server_data for wait requirements.
         """
         if self.client_recieved_initial_server_data():
+            from worlds.rabi_ribi.client.patch import PatchInputs
+            if self.patch_task is not None and not self.patch_task.done():
+                return
             assert self.custom_seed_subdir
-            # Patch the map files if we haven't done so already
+            # Patch the map files if we haven't done so already for this seed, slot data and game installation
             if not os.path.isdir(self.custom_seed_subdir):
                 os.mkdir(self.custom_seed_subdir)
-            if not os.path.isfile(f"{self.custom_seed_subdir}/area0.map"):
-                from worlds.rabi_ribi.client.patch import patch_map_files
-                patch_map_files(self)
+            self.patch_task = asyncio.create_task(
+                self.patch_map_files(PatchInputs.from_context(self)), name="Rabi-Ribi Map Patch")
+
+    async def patch_map_files(self, patch_inputs: "PatchInputs"):
+        """
+        Patch the map files in a worker thread, so the client stays responsive, and report the progress to the UI.
+        The thread only reads patch_inputs, and the result is ignored if the client was reset in the meantime.
+        """
+        from worlds.rabi_ribi.client.patch import patch_map_files_if_needed
+        loop = asyncio.get_running_loop()
+        def report_progress(message: str):
+            loop.call_soon_threadsafe(logger.info, message)
+
+        task = asyncio.current_task()
+        async with self.patch_lock:
+            if self.patch_task is not task:
+                return
+            # The patch rewrites the map files, so wait for the queued removals to be written first
+            await self.map_writer.close()
+            try:
+                patched = await asyncio.to_thread(patch_map_files_if_needed, patch_inputs, report_progress)
+            except Exception as err:
+                if self.patch_task is task:
+                    logger.error("Failed to patch the map files. Reconnect to the server to retry. "
+                                 "If this keeps happening, please post a message to the Rabi-Ribi thread on the AP discord")
+                    logger.exception(str(err))
+                    self.patch_failed = True
+                return
+        if self.patch_task is not task:
+            return
+        if patched:
+            self.remove_checked_exclamation_points_from_maps()
+        self.maps_patched = True
+        self.patch_failed = False
 
-    async def give_item(self):
+    def remove_checked_exclamation_points_from_maps(self):
+        """
+        Newly patched maps contain every item, so remove the exclamation points of the checked locations again.
+        """
+        for location_id in self.locations_checked:
+            coordinates = location_coordinates_by_id.get(location_id)
+            if coordinates is not None:
+                self.map_writer.remove_exclamation_point(self.custom_seed_subdir, *coordinates)
+
+    async def give_item(self, snapshot: RabiRibiSnapshot):
         """
         Give an item to the player. This method will always give the oldest
         item that the player has recieved from AP, but not in game yet.
         """
         # Find the first item ID that the player has not recieved yet
-        last_received_item_index = self.rr_interface.get_last_received_item_index()
+        last_received_item_index = snapshot.get_last_received_item_index()
         remaining_items = self.items_received_rabi_ribi_ids[last_received_item_index:]
         skipped_items, cur_item_id = next(((idx, item_id) for idx, item_id in enumerate(remaining_items) if item_id != -1), (-1, -1))
 
         if cur_item_id > 0:
-            already_has_item = self.rr_interface.does_player_have_item_id(cur_item_id)
+            already_has_item = snapshot.does_player_have_item_id(cur_item_id)
             if not already_has_item:
                 self.rr_interface.give_item(cur_item_id)
             # Update index regardless to move to the next item in the queue
             self.rr_interface.set_last_received_item_index(last_received_item_index + skipped_items + 1)
             if not already_has_item:
-                await asyncio.sleep(1)
+                await self.wait_until_item_receive_animation_starts()
             await self.wait_until_out_of_item_receive_animation()
         elif len(remaining_items) > 0:
             # Update index to mark the player as not waiting for Nothing items
             self.rr_interface.set_last_received_item_index(last_received_item_index + len(remaining_items))
 
+    async def give_queued_items(self, snapshot: RabiRibiSnapshot) -> RabiRibiSnapshot:
+        """
+        Give the queued items to the player back to back, as long as the player is in a state
+        where they can receive items.
+
+        :returns: a snapshot of the game after giving the items
+        """
+        while self.in_state_where_can_give_items(snapshot) and not self.exit_event.is_set():
+            await self.give_item(snapshot)
+            snapshot = self.read_snapshot()
+        return snapshot
+
+    def reset_received_rabi_ribi_item_ids(self):
+        """
+        Forget the processed received items, so they are processed again from the first one.
+        """
+        self.items_received_rabi_ribi_ids = []
+        self.processed_received_item_count = 0
+        self.next_potion_ids = dict(POTION_START_IDS)
+
     async def set_received_rabi_ribi_item_ids(self):
+        """
+        Convert the items received since the last call to rabi-ribi item ids.
+        """
         async with self.critical_section_lock:
-            self.items_received_rabi_ribi_ids = []
-            #  Subtract 30 since those are reserved for shop and super / hyper attack modes
-            potion_ids = {
-                ItemName.attack_up: 223 - 30,
-                ItemName.mp_up: 287 - 30,
-                ItemName.regen_up: 351 - 30,
-                ItemName.hp_up: 159 - 30,
-                ItemName.pack_up: 415 - 30
-            }
-
-            for network_item in self.items_received:
-                item_name = self.item_names.lookup_in_game(network_item.item)
-                if item_name == ItemName.nothing:
+            new_items = self.items_received[self.processed_received_item_count:]
+            self.processed_received_item_count = len(self.items_received)
+            for network_item in new_items:
+                if network_item.item == NOTHING_ITEM_ID:
                     self.items_received_rabi_ribi_ids.append(-1)
-                elif item_name in potion_ids:
-                    self.items_received_rabi_ribi_ids.append(potion_ids[item_name])
-                    potion_ids[item_name] -= 1
-                elif item_name == ItemName.easter_egg:
+                elif network_item.item in self.next_potion_ids:
+                    self.items_received_rabi_ribi_ids.append(self.next_potion_ids[network_item.item])
+                    self.next_potion_ids[network_item.item] -= 1
+                elif network_item.item == EASTER_EGG_ITEM_ID:
                     if self.slot_concerns_self(network_item.player):
-                        location_name = self.location_names.lookup_in_game(network_item.location)
-                        location = data.get_location_by_ap_name(location_name)
-                        egg_coordinates = (location.area_id, location.x_position, location.y_position)
-                        self.collected_eggs.add(egg_coordinates)
+                        self.collected_eggs.add(location_coordinates_by_id[network_item.location])
                 else:
-                    self.items_received_rabi_ribi_ids.append(
-                        int(data.get_item_by_ap_name(item_name).id))
+                    self.items_received_rabi_ribi_ids.append(lookup_item_id_to_game_id[network_item.item])
 
-    def is_item_queued(self):
+    def is_item_queued(self, snapshot: RabiRibiSnapshot):
         """
         To determine if we have any items to give, look at the last recieved item index
         and check if we have received more items.
         """
         if self.items_received:
-            last_received_item_index = self.rr_interface.get_last_received_item_index()
+            last_received_item_index = snapshot.get_last_received_item_index()
             return last_received_item_index < len(self.items_received_rabi_ribi_ids)
         return False
 
-    def is_in_shaft(self):
+    def is_in_shaft(self, snapshot: RabiRibiSnapshot):
         """
         Returns true if the player is in the starting shaft. We want to avoid giving them items
         if this is the case since its pitch black so you cant see any of the items that you get.
         """
-        area_id, x, y = self.rr_interface.read_player_tile_position()
-        return area_id == 0 and \
+        area_id, x, y = snapshot.read_player_tile_position()
+        in_shaft = area_id == 0 and \
             ((110 <= x <= 112 and 36 <= y <= 91) or \
              (69 <= x <= 71 and 81 <= y <= 136))
+        if in_shaft:
+            self.time_since_in_shaft = time.time()
+        return in_shaft
 
-    async def wait_until_out_of_shaft(self):
-        """
-        Waits until the player is out of the starting shaft, plus a few extra seconds for safety.
-        If the player isnt in the starting shaft, returns immediatly.
-        """
-        if not self.is_in_shaft():
-            return
-        while self.is_in_shaft() and not self.exit_event.is_set():
-            await asyncio.sleep(1)
-        if not self.exit_event.is_set():
-            await asyncio.sleep(5)
-
-    async def handle_egg_changes(self):
-        player_current_eggs = self.rr_interface.get_collected_eggs()
+    async def handle_egg_changes(self, snapshot: RabiRibiSnapshot):
+        player_current_eggs = snapshot.get_collected_eggs()
         for (area, x, y) in player_current_eggs:
             if (area, x, y) not in self.collected_eggs:
                 self.collected_eggs.add((area, x, y))
-                if data.is_coordinates_location(area, x, y):
-                    location_name = data.get_location_name_by_coordinates(area, x, y)
-                    location_id = all_locations[location_name]
+                location_id = location_ids_by_coordinates.get((area, x, y))
+                if location_id is not None:
                     if location_id not in self.locations_checked:
                         self.locations_checked.add(location_id)
                         await self.check_locations([location_id])
 
-    def handle_consumable_changes(self):
+    def handle_consumable_changes(self, snapshot: RabiRibiSnapshot):
         """
         Checks if the player has any consumable items,
         and sets the events to open them at the start warp point.
@@ -345,12 +450,13 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
         rumi_donut_game_id = data.get_item_by_ap_name(ItemName.rumi_donut).id
         for item_name in item_groups["Consumables"]:
             game_item_id = data.get_item_by_ap_name(item_name).id
-            if self.rr_interface.does_player_have_item_id(game_item_id):
+            if snapshot.does_player_have_item_id(game_item_id):
                 event_id = TRIGGER_BLOCK_EVENT_ID1 + (game_item_id - rumi_donut_game_id)
-                self.rr_interface.set_event_state(event_id, True)
+                if not snapshot.get_event_state(event_id):
+                    self.rr_interface.set_event_state(event_id, True)
 
-    async def update_player_location(self):
-        area_id, x, y = self.rr_interface.read_player_tile_position()
+    async def update_player_location(self, snapshot: RabiRibiSnapshot):
+        area_id, x, y = snapshot.read_player_tile_position()
         if self.current_area_id != area_id:
             self.current_area_id = area_id
             await self.send_msgs(
@@ -392,68 +498,62 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
                 ]
             )
 
-    def is_player_paused(self):
-        paused = self.rr_interface.is_player_paused()
-        if paused:
-            if self.has_zero_health():
-                return False
-            self.time_since_last_paused = time.time()
-        return paused
-    
-    def is_player_in_warp_menu(self):
-        in_warp_menu = self.rr_interface.is_in_warp_menu()
-        if in_warp_menu:
-            self.time_since_last_warp_menu = time.time()
-        return in_warp_menu
-
-    def is_player_in_costume_menu(self):
-        in_costume_menu = self.rr_interface.is_in_costume_menu()
-        if in_costume_menu:
-            self.time_since_last_costume_menu = time.time()
-        return in_costume_menu
-
-    def is_player_in_save_menu(self):
-        in_save_menu = self.rr_interface.is_in_save_menu()
-        if in_save_menu:
-            self.time_since_last_save_menu = time.time()
-        return in_save_menu
-
-    def in_state_where_can_give_items(self):
+    def read_snapshot(self) -> RabiRibiSnapshot:
+        """
+        Read a snapshot of the game, and note the menus the player is in.
+        """
+        snapshot = self.rr_interface.read_snapshot()
+        self.update_menu_times(snapshot)
+        return snapshot
+
+    def update_menu_times(self, snapshot: RabiRibiSnapshot):
+        """
+        Every snapshot notes the menus the player is in. We want to detect pauses really fast
+        since players can reload a save really fast with quick save reload. We want to make sure
+        that we dont give items too soon after a save load since this lags the game hard.
+        """
+        cur_time = time.time()
+        if snapshot.is_player_paused() and not snapshot.has_zero_health():
+            self.time_since_last_paused = cur_time
+        if snapshot.is_in_warp_menu():
+            self.time_since_last_warp_menu = cur_time
+        if snapshot.is_in_costume_menu():
+            self.time_since_last_costume_menu = cur_time
+        if snapshot.is_in_save_menu():
+            self.time_since_last_save_menu = cur_time
+
+    def update_poll_interval(self, events: set[SnapshotEvent], max_interval: float = MAX_POLL_INTERVAL):
+        """
+        Poll fast while the game state is changing, and back off while it is idle.
+        """
+        if events:
+            self.poll_interval = MIN_POLL_INTERVAL
+        else:
+            self.poll_interval = min(self.poll_interval * 2, max_interval)
+
+    def in_state_where_can_give_items(self, snapshot: RabiRibiSnapshot):
         cur_time = time.time()
         return (
             (cur_time - self.time_since_last_paused >= 2) and
             (cur_time - self.time_since_last_warp_menu >= 5.5) and
             (cur_time - self.time_since_last_costume_menu >= 2) and
             (cur_time - self.time_since_last_save_menu >= 2) and
-            not self.rr_interface.is_player_frozen() and
+            not snapshot.is_player_frozen() and
             len(self.death_link_buffer) == 0 and
-            self.is_item_queued()
+            self.is_item_queued(snapshot)
         )
 
-    def in_state_where_should_open_warp_menu(self):
+    def in_state_where_should_open_warp_menu(self, snapshot: RabiRibiSnapshot):
         cur_time = time.time()
         return (
             (cur_time - self.time_since_last_paused >= .5) and
-            not self.rr_interface.is_player_frozen() and
-            not self.is_item_queued() and
-            self.rr_interface.get_item_state(STRANGE_BOX_ITEM_ID) == -1
+            not snapshot.is_player_frozen() and
+            not self.is_item_queued(snapshot) and
+            snapshot.get_item_state(STRANGE_BOX_ITEM_ID) == -1
         )
 
-    async def watch_for_menus(self):
-        """
-        Run this on a faster loop. We want to detect pauses really fast since players
-        can reload a save really fast with quick save reload. We want to make sure that
-        we dont give items too soon after a save load since this lags the game hard.
-        """
-        while self.rr_interface.is_connected() and not self.exit_event.is_set():
-            self.is_player_paused()
-            self.is_player_in_warp_menu()
-            self.is_player_in_costume_menu()
-            self.is_player_in_save_menu()
-            await asyncio.sleep(0.1)
-
-    def is_on_main_menu(self):
-        on_main_menu = self.rr_interface.is_on_main_menu()
+    def is_on_main_menu(self, snapshot: RabiRibiSnapshot):
+        on_main_menu = snapshot.is_on_main_menu()
         if on_main_menu:
             self.time_since_main_menu = time.time()
         return on_main_menu
@@ -467,7 +567,7 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
             return
         self.rr_interface.open_warp_menu()
 
-    def in_deathlink_eligible_state(self):
+    def in_deathlink_eligible_state(self, snapshot: RabiRibiSnapshot):
         cur_time = time.time()
         return (
             (cur_time - self.time_since_last_paused >= 2) and
@@ -475,7 +575,7 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
             (cur_time - self.time_since_last_costume_menu >= 2) and
             (cur_time - self.time_since_last_save_menu >= 2) and
             (cur_time - self.time_since_last_death >= 5.5) and
-            not self.rr_interface.is_player_frozen() and
+            not snapshot.is_player_frozen() and
             not self.has_died and
             len(self.death_link_buffer) > 0
         )
@@ -490,10 +590,7 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
         self.death_link_buffer = []
         self.has_died = True
 
-    def has_zero_health(self):
-        return self.rr_interface.has_zero_health()
-
-    def find_closest_item_location(self):
+    def find_closest_item_location(self, snapshot: RabiRibiSnapshot):
         """
         Finds the closest location to the player for the purpose of finding which
         check they just cleared. Returns None if it cannot find any location within
@@ -502,28 +599,33 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
         :returns int, (int, int, int): the ap id of the closest location and the coordinates of it
         """
         # Just recieved an item, mark the closet location as the one found
-        area_id, x, y = self.rr_interface.read_player_tile_position()
-        closest_location_id = None
-        closest_location_coordinates = None
-        closest_distance = 9999
-
-        for location in data.get_locations_in_area(area_id).values():
-            distance = abs(x - location.x_position) + abs(y - location.y_position)
-            if distance < closest_distance:
-                closest_distance = distance
-                closest_location_id = all_locations[location.name]
-                closest_location_coordinates = (area_id, location.x_position, location.y_position)
-
-        if closest_distance < 10 and closest_location_id in self.server_locations:
-            return closest_location_id, closest_location_coordinates
+        area_id, x, y = snapshot.read_player_tile_position()
+        nearby_locations = data.get_locations_near(area_id, x, y, MAX_ITEM_LOCATION_DISTANCE)
+        if not nearby_locations:
+            return None, None
+
+        _, closest_location = nearby_locations[0]
+        closest_location_id = all_locations[closest_location.name]
+        if closest_location_id in self.server_locations:
+            return closest_location_id, (area_id, closest_location.x_position, closest_location.y_position)
         return None, None
 
+    async def wait_until_item_receive_animation_starts(self):
+        """
+        Waits until the item receive animation of an item given to the player starts,
+        or at most ITEM_ANIMATION_START_TIMEOUT seconds.
+        """
+        timeout = time.time() + ITEM_ANIMATION_START_TIMEOUT
+        while (not self.rr_interface.is_in_item_receive_animation() and
+               time.time() < timeout and not self.exit_event.is_set()):
+            await asyncio.sleep(MIN_POLL_INTERVAL)
+
     async def wait_until_out_of_item_receive_animation(self):
         """
         Waits until the player is outside the item receive animation, and then returns.
         """
         while self.rr_interface.is_in_item_receive_animation() and not self.exit_event.is_set():
-            await asyncio.sleep(0.1)
+            await asyncio.sleep(MIN_POLL_INTERVAL)
 
     def print_egg_amounts(self) -> None:
         if self.client_recieved_initial_server_data():
@@ -563,6 +665,10 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
         self.custom_seed_subdir = None
         self.seed_player = None
         self.seed_player_id = None
+        self.maps_patched = False
+        self.patch_failed = False
+        # A running patch finishes in the background and its result is ignored
+        self.patch_task = None
 
         self.time_since_last_paused = time.time()
         self.time_since_main_menu = time.time()
@@ -571,8 +677,13 @@ class RabiRibiContext(TrackerGameContext): # type: ignore
         self.time_since_last_costume_menu = time.time()
         self.time_since_last_save_menu = time.time()
         self.time_since_last_death = time.time()
+        self.time_since_in_shaft = 0
 
-        self.items_received_rabi_ribi_ids = []
+        self.last_snapshot = None
+        self.pending_snapshot_events = set()
+        self.poll_interval = MIN_POLL_INTERVAL
+
+        self.reset_received_rabi_ribi_item_ids()
         self.obtained_items_queue = asyncio.Queue()
 
         self.is_crosswarp_disabled = True
@@ -589,7 +700,6 @@ async def rabi_ribi_watcher(ctx: RabiRibiContext):
 
     :RabiRibiContext ctx: The Rabi Ribi Client context instance.
     """
-    watch_menu_task = None
     await ctx.wait_for_initial_connection_info()
     while not ctx.exit_event.is_set():
         if not ctx.server:
@@ -599,80 +709,19 @@ async def rabi_ribi_watcher(ctx: RabiRibiContext):
         if not ctx.rr_interface.is_connected():
             logger.info("Waiting for connection to Rabi Ribi")
             await ctx.rr_interface.connect(ctx.exit_event)
-            watch_menu_task = asyncio.create_task(ctx.watch_for_menus())
+            ctx.last_snapshot = None
         try:
-            while True:
-                if not ctx.server:
-                    break
-                await asyncio.sleep(0.5)
+            while ctx.server and not ctx.exit_event.is_set():
+                await asyncio.sleep(ctx.poll_interval)
                 if ctx.exit_event.is_set():
                     break
-                if ctx.seed_player_id is None:
-                    continue
-                if not ctx.rr_interface.is_on_correct_scenerio(ctx.seed_player_id):
-                    continue
-                if ctx.is_on_main_menu():
-                    continue
-                if time.time() - ctx.time_since_main_menu < 4:
-                    continue
-                break
-            if ctx.exit_event.is_set():
-                break
-            if not ctx.server:
-                continue
-            await ctx.wait_until_out_of_shaft()
-
-            cur_time = time.time()
-
-            if not ctx.has_zero_health() and (cur_time - ctx.time_since_last_death) >= 5.5:
-                ctx.has_died = False
-
-            if ctx.in_deathlink_eligible_state():
-                ctx.trigger_death()
-
-            if ctx.has_zero_health() and not ctx.has_died and ctx.death_link_enabled:
-                ctx.has_died = True
-                ctx.time_since_last_death = time.time()
-                await ctx.send_death(f"{ctx.player_names[ctx.slot]} was defeated...")
-
-            await ctx.handle_egg_changes()
-
-            await check_for_locations(ctx)
-            await ctx.update_player_location()
-
-            if ctx.in_state_where_should_open_warp_menu():
-                ctx.open_warp_menu()
-
-            if ctx.in_state_where_can_give_items():
-                await ctx.give_item()
-
-            ctx.handle_consumable_changes()
-
-            if ctx.updated_attack_mode is not None:
-                ctx.update_attack_mode()
-
-            # Fallback if player collected items while the client was disconnected.
-            #   Make sure the player never has an exclamation point in their inventory.
-            #   (or else they wont be able to see/collect any other exclamation point)
-            if cur_time - ctx.time_since_last_item_obtained > 7:
-                ctx.rr_interface.remove_exclamation_point_from_inventory()
-
-            if ctx.slot_data:
-                if (not ctx.finished_game and
-                    not ctx.rr_interface.is_on_main_menu() and
-                    ctx.rr_interface.does_player_have_item_id(TROPHY_ITEM_ID)):
-                    ctx.finished_game = True
-                    await ctx.send_msgs([{"cmd": "StatusUpdate", "status": ClientStatus.CLIENT_GOAL}])
+                await watcher_tick(ctx)
 
         except Exception as err:
+            ctx.last_snapshot = None
+            ctx.poll_interval = MAX_IDLE_POLL_INTERVAL
             # Process closed trap
-            if type(err) is AttributeError and not ctx.rr_interface.is_connected():
-                # Stop the ayncio task. No cleanup is necessary
-                if watch_menu_task is not None:
-                    try:
-                        watch_menu_task.cancel()
-                    except:
-                        pass
+            if isinstance(err, (AttributeError, ProcessLost)) and not ctx.rr_interface.is_connected():
                 # attempt to reconnect at the top of the loop
                 continue
 
@@ -683,19 +732,96 @@ async def rabi_ribi_watcher(ctx: RabiRibiContext):
             logger.exception(str(err))
             # attempt to reconnect at the top of the loop
             continue
-        await asyncio.sleep(0.5)
 
-async def check_for_locations(ctx: RabiRibiContext):
+async def watcher_tick(ctx: RabiRibiContext):
+    """
+    A single iteration of the client loop. Reads a snapshot of the game, compares it to the
+    previous one and reacts to the changes. Sets the time until the next tick.
+
+    :RabiRibiContext ctx: The Rabi Ribi Client context instance.
+    """
+    if ctx.seed_player_id is None or not ctx.rr_interface.is_on_correct_scenerio(ctx.seed_player_id):
+        ctx.last_snapshot = None
+        ctx.update_poll_interval(set(), MAX_IDLE_POLL_INTERVAL)
+        return
+
+    snapshot = ctx.read_snapshot()
+    events = get_snapshot_events(ctx.last_snapshot, snapshot)
+    ctx.last_snapshot = snapshot
+
+    cur_time = time.time()
+    # Wait on the main menu and until the player is out of the starting shaft, plus a few extra seconds for safety.
+    # The changes seen meanwhile, e.g. the eggs of a loaded save, are handled once the wait is over.
+    if (ctx.is_on_main_menu(snapshot) or cur_time - ctx.time_since_main_menu < 4 or
+        ctx.is_in_shaft(snapshot) or cur_time - ctx.time_since_in_shaft < 5):
+        ctx.pending_snapshot_events |= events
+        ctx.update_poll_interval(events)
+        return
+    events |= ctx.pending_snapshot_events
+    ctx.pending_snapshot_events = set()
+
+    if not snapshot.has_zero_health() and (cur_time - ctx.time_since_last_death) >= 5.5:
+        ctx.has_died = False
+
+    if ctx.in_deathlink_eligible_state(snapshot):
+        ctx.trigger_death()
+
+    if snapshot.has_zero_health() and not ctx.has_died and ctx.death_link_enabled:
+        ctx.has_died = True
+        ctx.time_since_last_death = time.time()
+        await ctx.send_death(f"{ctx.player_names[ctx.slot]} was defeated...")
+
+    if SnapshotEvent.EGGS_CHANGED in events:
+        await ctx.handle_egg_changes(snapshot)
+
+    if snapshot.is_in_item_receive_animation():
+        await check_for_locations(ctx, snapshot)
+        # Removing the exclamation point waits until the player can move again
+        snapshot = ctx.read_snapshot()
+    await ctx.update_player_location(snapshot)
+
+    if ctx.in_state_where_should_open_warp_menu(snapshot):
+        ctx.open_warp_menu()
+        snapshot = ctx.read_snapshot()
+
+    if ctx.in_state_where_can_give_items(snapshot):
+        snapshot = await ctx.give_queued_items(snapshot)
+        events.add(SnapshotEvent.INVENTORY_CHANGED)
+
+    if SnapshotEvent.INVENTORY_CHANGED in events:
+        ctx.handle_consumable_changes(snapshot)
+
+    if ctx.updated_attack_mode is not None:
+        ctx.update_attack_mode()
+
+    # Fallback if player collected items while the client was disconnected.
+    #   Make sure the player never has an exclamation point in their inventory.
+    #   (or else they wont be able to see/collect any other exclamation point)
+    if (cur_time - ctx.time_since_last_item_obtained > 7 and
+        snapshot.does_player_have_item_id(EXCLAMATION_POINT_ITEM_ID)):
+        ctx.rr_interface.remove_exclamation_point_from_inventory()
+
+    if ctx.slot_data:
+        if (not ctx.finished_game and
+            not snapshot.is_on_main_menu() and
+            snapshot.does_player_have_item_id(TROPHY_ITEM_ID)):
+            ctx.finished_game = True
+            await ctx.send_msgs([{"cmd": "StatusUpdate", "status": ClientStatus.CLIENT_GOAL}])
+
+    ctx.update_poll_interval(events)
+
+async def check_for_locations(ctx: RabiRibiContext, snapshot: RabiRibiSnapshot):
     """
     This method checks if the player coordinates overlaps with any location checks.
     If it is, it will update the locations_checked set to include the location
     (if it's not already included).
 
     :RabiRibiContext ctx: The Rabi Ribi Client context instance.
+    :RabiRibiSnapshot snapshot: The state of the game read at the start of this tick.
     """
     # Game paused or just got item
-    if ctx.rr_interface.is_in_item_receive_animation():
-        ap_location_id, coordinates = ctx.find_closest_item_location()
+    if snapshot.is_in_item_receive_animation():
+        ap_location_id, coordinates = ctx.find_closest_item_location(snapshot)
         if not ap_location_id:
             # logger.warning("Detected item obtained, but unable to find location.")
             return
@@ -706,9 +832,8 @@ async def check_for_locations(ctx: RabiRibiContext):
 
 async def remove_exclamation_point(ctx: RabiRibiContext, coordinates):
     ctx.rr_interface.remove_exclamation_point_from_in_memory_map(coordinates[0], coordinates[1], coordinates[2])
-    from worlds.rabi_ribi.client.patch import remove_exclamation_point_from_map
-    remove_exclamation_point_from_map(ctx, coordinates[0], coordinates[1], coordinates[2])
-    while ctx.rr_interface.is_player_frozen():
+    ctx.map_writer.remove_exclamation_point(ctx.custom_seed_subdir, coordinates[0], coordinates[1], coordinates[2])
+    while ctx.read_snapshot().is_player_frozen():
         await asyncio.sleep(0.25)
     ctx.rr_interface.remove_exclamation_point_from_inventory()
 
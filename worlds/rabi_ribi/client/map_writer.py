@@ -0,0 +1,136 @@
+"""
+This module defines MapWriter, which removes the collected exclamation point items from the
+patched map files. Only the 2 bytes of each collected tile are written, the removals are batched
+per map file, and the files are written in a worker thread to avoid blocking the client loop.
+"""
+import asyncio
+import os
+import struct
+from typing import Iterable, Optional
+
+from CommonClient import logger
+
+from .memory_io import EXCLAMATION_POINT_ITEM_ID
+from ..existing_randomizer.mapfileio import MAP_ITEMS_OFFSET
+from ..existing_randomizer.utility import to_index
+
+# Seconds to wait for more collected items before writing the map files.
+MAP_WRITE_DELAY = 0.5
+
+def get_map_filename(directory: str, area_id: int) -> str:
+    return os.path.join(directory, f"area{area_id}.map")
+
+def remove_exclamation_points_from_map_file(filename: str, positions: Iterable[tuple[int, int]]):
+    """
+    Remove the exclamation point items on the given tiles of a map file. Other items are left untouched.
+
+    :str filename: The map file to modify.
+    :positions: The (x, y) tile coordinates of the items to remove.
+    """
+    with open(filename, "r+b") as f:
+        for position in sorted(set(positions)):
+            tile_offset = MAP_ITEMS_OFFSET + to_index(position) * 2
+            f.seek(tile_offset)
+            if struct.unpack('<h', f.read(2))[0] == EXCLAMATION_POINT_ITEM_ID:
+                f.seek(tile_offset)
+                f.write(struct.pack('<h', 0))
+
+def write_map_removals(pending: dict[str, set[tuple[int, int]]]) -> int:
+    """
+    Remove the exclamation points on the given tiles of each map file, and return the number of files written.
+
+    :pending: The (x, y) tile coordinates of the items to remove, by map filename.
+    """
+    for filename, positions in pending.items():
+        remove_exclamation_points_from_map_file(filename, positions)
+    return len(pending)
+
+class MapWriter():
+    """
+    MapWriter collects the exclamation points to remove from the map files, and writes them
+    in batches. Call close to make sure every queued removal has been written.
+    The queue is only accessed from the event loop thread, the worker thread only writes the files.
+    """
+
+    def __init__(self, write_delay: float = MAP_WRITE_DELAY):
+        """
+        :write_delay: seconds to wait for more removals before writing the map files.
+        """
+        self.write_delay = write_delay
+        # Queued (x, y) positions, by map filename
+        self.pending: dict[str, set[tuple[int, int]]] = {}
+        self.flush_task: Optional[asyncio.Task] = None
+        self.write_future: Optional[asyncio.Future] = None
+        # The removals being written by write_future
+        self.writing: dict[str, set[tuple[int, int]]] = {}
+        # Statistics, for benchmarks
+        self.write_count = 0
+
+    def remove_exclamation_point(self, directory: str, area_id: int, x: int, y: int):
+        """
+        Queue the removal of the exclamation point on the tile (area_id, x, y) from the map files in directory.
+        The map files are written after write_delay seconds, if an event loop is running, or on close.
+        """
+        self.pending.setdefault(get_map_filename(directory, area_id), set()).add((x, y))
+        if self.flush_task is None or self.flush_task.done():
+            try:
+                self.flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+            except RuntimeError:
+                # Not running in an event loop, close writes the removals instead.
+                pass
+
+    def take_pending(self) -> dict[str, set[tuple[int, int]]]:
+        pending, self.pending = self.pending, {}
+        return pending
+
+    def requeue(self, pending: dict[str, set[tuple[int, int]]], err: OSError):
+        """
+        Queue the removals of a failed write again, so the next write retries them.
+        """
+        logger.warning(f"Failed to remove the collected items from the map files, retrying on the next write: {err}")
+        for filename, positions in pending.items():
+            self.pending.setdefault(filename, set()).update(positions)
+
+    async def _flush_later(self):
+        # Removals queued while writing are written by the next iteration.
+        while self.pending:
+            await asyncio.sleep(self.write_delay)
+            self.writing = self.take_pending()
+            self.write_future = asyncio.ensure_future(asyncio.to_thread(write_map_removals, self.writing))
+            # Closing the writer cancels this task, but waits for the files to be written.
+            try:
+                self.write_count += await asyncio.shield(self.write_future)
+            except OSError as err:
+                # Retry with the next queued removal or close, rather than in a loop while the file is locked.
+                self.requeue(self.writing, err)
+                return
+            finally:
+                if self.write_future.done():
+                    self.write_future = None
+                    self.writing = {}
+
+    async def close(self):
+        """
+        Write every queued removal to the map files, waiting for a running write to finish first.
+        The writer can still queue removals afterwards.
+        """
+        if self.flush_task is not None and not self.flush_task.done():
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+        self.flush_task = None
+        if self.write_future is not None:
+            try:
+                self.write_count += await self.write_future
+            except OSError as err:
+                self.requeue(self.writing, err)
+            self.write_future = None
+            self.writing = {}
+        pending = self.take_pending()
+        if pending:
+            try:
+                self.write_count += await asyncio.to_thread(write_map_removals, pending)
+            except OSError as err:
+                self.requeue(pending, err)
@@ -0,0 +1,85 @@
+"""
+This module defines the interface RabiRibiMemoryIO uses to access the memory
+of a Rabi Ribi game, and the implementation that attaches to the game process with pymem.
+
+Other implementations (see simulator.py) allow running the client without the game.
+"""
+from abc import ABC, abstractmethod
+
+GAME_PROCESS_NAME = "rabiribi.exe"
+
+class ProcessNotFound(Exception):
+    """
+    Raised when creating a memory backend while the game is not running.
+    """
+
+class ProcessLost(Exception):
+    """
+    Raised when accessing the memory of a game that is no longer running.
+    """
+
+class MemoryBackend(ABC):
+    """
+    MemoryBackend serves as an interface for reading/writing the memory of a rabi-ribi game instance.
+    All addresses are absolute, offsets in the game module are relative to base_address.
+    """
+    base_address: int
+    process_id: int
+
+    @abstractmethod
+    def read_bytes(self, address: int, length: int) -> bytes:
+        """
+        Read length bytes of data at address and return it.
+        """
+
+    @abstractmethod
+    def write_bytes(self, address: int, data: bytes) -> None:
+        """
+        Write data at address.
+        """
+
+    @abstractmethod
+    def allocate(self, size: int) -> int:
+        """
+        Allocate size bytes of memory in the game, and return its address.
+        """
+
+    @abstractmethod
+    def start_thread(self, address: int) -> None:
+        """
+        Run the code at address in a new thread of the game.
+        """
+
+class PymemBackend(MemoryBackend):
+    """
+    Accesses the memory of the running game process using pymem.
+    """
+
+    def __init__(self, process_name: str = GAME_PROCESS_NAME):
+        # pymem only works on Windows, so only import it when attaching to the game.
+        from pymem import pymem
+        self.pymem = pymem
+        try:
+            self.rr_mem = pymem.Pymem(process_name)
+        except pymem.exception.ProcessNotFound as err:
+            raise ProcessNotFound(process_name) from err
+        self.base_address = self.rr_mem.base_address
+        self.process_id = self.rr_mem.process_id
+
+    def read_bytes(self, address: int, length: int) -> bytes:
+        try:
+            return self.rr_mem.read_bytes(address, length)
+        except self.pymem.exception.ProcessError as err:
+            raise ProcessLost() from err
+
+    def write_bytes(self, address: int, data: bytes) -> None:
+        try:
+            self.rr_mem.write_bytes(address, data, len(data))
+        except self.pymem.exception.ProcessError as err:
+            raise ProcessLost() from err
+
+    def allocate(self, size: int) -> int:
+        return self.rr_mem.allocate(size)
+
+    def start_thread(self, address: int) -> None:
+        self.rr_mem.start_thread(address)
@@ -9,12 +9,14 @@ in realtime. This is used to:
  - etc... 
 """
 import asyncio
+import enum
 import struct
-
-from pymem import pymem
+from typing import Callable, NamedTuple
 
 from CommonClient import logger
 
+from .memory_backend import MemoryBackend, ProcessLost, ProcessNotFound, PymemBackend
+
 OFFSET_AREA_ID = int(0x00DDBFA0)
 OFFSET_PLAYER_X = int(0x010736C8)
 OFFSET_PLAYER_Y = int(0x013EEF00)
@@ -44,6 +46,179 @@ UNUSED_ITEM_ID_48 = 48
 EVENT_FLAG_ID_START = 255
 TILE_LENGTH = 64
 EGG_ARRAY_LENGTH = 80 * 3 * 2 # 80 eggs stored as 3 shorts
+# The event flags are stored directly after the inventory
+INVENTORY_LENGTH = (OFFSET_EVENT_START - OFFSET_INVENTORY_START) // 4
+EVENT_FLAG_COUNT = 512
+# Fields at most this many bytes apart are read together in a single read of a snapshot.
+# Only the adjacent blocks are grouped, reading large gaps costs more than the extra reads.
+SNAPSHOT_MAX_GAP = 0x200
+
+class SnapshotField(NamedTuple):
+    name: str
+    offset: int
+    format: str
+
+SNAPSHOT_FIELDS = (
+    SnapshotField("area_id", OFFSET_AREA_ID, "i"),
+    SnapshotField("player_x", OFFSET_PLAYER_X, "f"),
+    SnapshotField("player_y", OFFSET_PLAYER_Y, "f"),
+    SnapshotField("player_frozen", OFFSET_PLAYER_FROZEN, "i"),
+    SnapshotField("player_paused", OFFSET_PLAYER_PAUSED, "i"),
+    SnapshotField("max_health", OFFSET_MAX_HEALTH, "i"),
+    SnapshotField("in_item_receive_animation", OFFSET_IN_ITEM_GET_ANIMATION, "?"),
+    SnapshotField("in_warp_menu", OFFSET_IN_WARP_MENU, "i"),
+    SnapshotField("in_costume_menu", OFFSET_IN_COSTUME_MENU, "i"),
+    SnapshotField("in_save_menu", OFFSET_IN_SAVE_MENU, "?"),
+    SnapshotField("player_state_address", OFFSET_PLAYER_STATE, "i"),
+    SnapshotField("inventory", OFFSET_INVENTORY_START, f"{INVENTORY_LENGTH}i"),
+    SnapshotField("events", OFFSET_EVENT_START, f"{EVENT_FLAG_COUNT}i"),
+    SnapshotField("eggs", OFFSET_EGG_START, f"{EGG_ARRAY_LENGTH}s"),
+)
+
+def _group_snapshot_fields(fields):
+    """
+    Groups the snapshot fields into contiguous memory ranges, so that fields that are
+    close to each other are read with a single read.
+
+    :returns: a list of (start offset, length, [(field name, struct, offset in range)])
+    """
+    groups = []
+    for field in sorted(fields, key=lambda field: field.offset):
+        field_struct = struct.Struct("<" + field.format)
+        if groups and field.offset - (groups[-1][0] + groups[-1][1]) <= SNAPSHOT_MAX_GAP:
+            start, length, group_fields = groups[-1]
+            groups[-1] = (start, max(length, field.offset + field_struct.size - start), group_fields)
+        else:
+            start = field.offset
+            groups.append((start, field_struct.size, []))
+        groups[-1][2].append((field.name, field_struct, field.offset - start))
+    return groups
+
+SNAPSHOT_RANGES = _group_snapshot_fields(SNAPSHOT_FIELDS)
+
+def _decode_collected_eggs(data: bytes) -> list[tuple[int, int, int]]:
+    """
+    Decodes the egg array into the locations of all eggs collected by the player.
+    """
+    eggs: list[tuple[int, int, int]] = list(struct.iter_unpack('3h', data))
+
+    # Check if the player has 80 eggs
+    if (0,0,0) not in eggs:
+        return eggs
+
+    egg_count = eggs.index((0,0,0))
+
+    if egg_count >= 0:
+        eggs = eggs[:egg_count]
+
+    return eggs
+
+class RabiRibiSnapshot(NamedTuple):
+    """
+    The state of the game at a single point in time, read with a few bulk reads
+    by RabiRibiMemoryIO.read_snapshot. The methods mirror the methods of RabiRibiMemoryIO.
+    """
+    area_id: int
+    player_x: float
+    player_y: float
+    player_frozen: int
+    player_paused: int
+    max_health: int
+    in_item_receive_animation: bool
+    in_warp_menu: int
+    in_costume_menu: int
+    in_save_menu: bool
+    player_state_address: int
+    inventory: tuple[int, ...]
+    events: tuple[int, ...]
+    eggs: bytes
+    health: int
+
+    def read_player_tile_position(self) -> tuple[int, int, int]:
+        return (self.area_id, round(self.player_x / TILE_LENGTH), round(self.player_y / TILE_LENGTH))
+
+    def is_player_frozen(self) -> bool:
+        return bool(self.player_frozen) or not self.max_health or self.is_player_paused()
+
+    def is_player_paused(self) -> bool:
+        return bool(self.player_paused)
+
+    def is_in_item_receive_animation(self) -> bool:
+        return self.in_item_receive_animation
+
+    def is_on_main_menu(self) -> bool:
+        return not self.max_health and not self.is_player_paused()
+
+    def is_in_save_menu(self) -> bool:
+        return self.in_save_menu
+
+    def is_in_warp_menu(self) -> bool:
+        return bool(self.in_warp_menu)
+
+    def is_in_costume_menu(self) -> bool:
+        return bool(self.in_costume_menu)
+
+    def has_zero_health(self) -> bool:
+        return not self.health
+
+    def does_player_have_item_id(self, item_id) -> bool:
+        return self.inventory[int(item_id)] != 0
+
+    def get_item_state(self, item_id) -> int:
+        return self.inventory[int(item_id)]
+
+    def get_last_received_item_index(self) -> int:
+        return self.get_item_state(UNUSED_ITEM_ID_48)
+
+    def get_event_state(self, event_id: int) -> bool:
+        return self.events[event_id - EVENT_FLAG_ID_START] != 0
+
+    def get_collected_eggs(self) -> list[tuple[int, int, int]]:
+        return _decode_collected_eggs(self.eggs)
+
+class SnapshotEvent(enum.Enum):
+    """
+    Changes between two consecutive snapshots, see get_snapshot_events.
+    """
+    AREA_CHANGED = enum.auto()
+    ITEM_ANIMATION_STARTED = enum.auto()
+    ITEM_ANIMATION_ENDED = enum.auto()
+    # The inventory or the event flags changed
+    INVENTORY_CHANGED = enum.auto()
+    EGGS_CHANGED = enum.auto()
+    MENU_CHANGED = enum.auto()
+    HEALTH_CHANGED = enum.auto()
+
+def get_snapshot_events(previous: RabiRibiSnapshot | None, current: RabiRibiSnapshot) -> set[SnapshotEvent]:
+    """
+    Compares two consecutive snapshots and returns the changes between them.
+    Without a previous snapshot, everything is considered changed.
+    """
+    if previous is None:
+        events = {SnapshotEvent.AREA_CHANGED, SnapshotEvent.INVENTORY_CHANGED, SnapshotEvent.EGGS_CHANGED,
+                  SnapshotEvent.MENU_CHANGED, SnapshotEvent.HEALTH_CHANGED}
+        if current.in_item_receive_animation:
+            events.add(SnapshotEvent.ITEM_ANIMATION_STARTED)
+        return events
+    events = set()
+    if previous.area_id != current.area_id:
+        events.add(SnapshotEvent.AREA_CHANGED)
+    if previous.in_item_receive_animation != current.in_item_receive_animation:
+        events.add(SnapshotEvent.ITEM_ANIMATION_STARTED if current.in_item_receive_animation
+                   else SnapshotEvent.ITEM_ANIMATION_ENDED)
+    if previous.inventory != current.inventory or previous.events != current.events:
+        events.add(SnapshotEvent.INVENTORY_CHANGED)
+    if previous.eggs != current.eggs:
+        events.add(SnapshotEvent.EGGS_CHANGED)
+    if (previous.player_paused != current.player_paused or
+        previous.max_health != current.max_health or
+        previous.in_warp_menu != current.in_warp_menu or
+        previous.in_costume_menu != current.in_costume_menu or
+        previous.in_save_menu != current.in_save_menu):
+        events.add(SnapshotEvent.MENU_CHANGED)
+    if previous.health != current.health:
+        events.add(SnapshotEvent.HEALTH_CHANGED)
+    return events
 
 class RabiRibiMemoryIO():
     """
@@ -51,8 +226,13 @@ class RabiRibiMemoryIO():
     a rabi-ribi game instance.
     """
 
-    def __init__(self):
-        self.rr_mem = None
+    def __init__(self, backend_factory: Callable[[], MemoryBackend] = PymemBackend):
+        """
+        :backend_factory: creates the memory backend when connecting, raising ProcessNotFound
+            if the game is not running.
+        """
+        self.backend_factory = backend_factory
+        self.rr_mem: MemoryBackend | None = None
         self.rr_process_id = None
         self.addr_injected_give_item_entrypoint = None
 
@@ -62,7 +242,7 @@ class RabiRibiMemoryIO():
         # confirm the process is still running
         try:
             self._read_int(OFFSET_AREA_ID)
-        except pymem.exception.ProcessError:
+        except ProcessLost:
             logger.info("Lost connection with rabi ribi game.")
             self.rr_process_id = None
             self.rr_mem = None
@@ -73,12 +253,12 @@ class RabiRibiMemoryIO():
         logger.info("Waiting for connection to Rabi Ribi game instance...")
         while not exit_event.is_set():
             try:
-                self.rr_mem = pymem.Pymem("rabiribi.exe")
+                self.rr_mem = self.backend_factory()
                 self.rr_process_id = self.rr_mem.process_id
                 self.allocate()
                 logger.info("Successfully connected to Rabi Ribi Game.")
                 return
-            except pymem.exception.ProcessNotFound:
+            except ProcessNotFound:
                 await asyncio.sleep(3)
 
     def allocate(self):
@@ -157,6 +337,15 @@ class RabiRibiMemoryIO():
             return False
         return True
 
+    def _write_int(self, offset, value):
+        """
+        Write an int at <base_process_address> + offset.
+
+        :int offset: the offset to write data to.
+        :int value: the value to write.
+        """
+        self.rr_mem.write_bytes(self.rr_mem.base_address + offset, struct.pack("<i", value))
+
     def _read_4_byte_bool_raw(self, address):
         """
         Read a word at the specified address, and interpret it as a bool
@@ -169,6 +358,24 @@ class RabiRibiMemoryIO():
             return False
         return True
 
+    def read_snapshot(self) -> RabiRibiSnapshot:
+        """
+        Read the state of the game that the client checks every tick. Fields that are close
+        together in memory are read with a single read, see SNAPSHOT_RANGES.
+
+        :returns: The state of the game, decoded into a RabiRibiSnapshot
+        """
+        values = {}
+        for start, length, fields in SNAPSHOT_RANGES:
+            data = self.rr_mem.read_bytes(self.rr_mem.base_address + start, length)
+            for name, field_struct, offset in fields:
+                value = field_struct.unpack_from(data, offset)
+                values[name] = value[0] if len(value) == 1 else value
+        # The player state is stored at a pointer, so it can only be read afterwards
+        health_data = self.rr_mem.read_bytes(values["player_state_address"] + OFFSET_PLAYER_STATE_HEALTH, 4)
+        values["health"] = struct.unpack("<i", health_data)[0]
+        return RabiRibiSnapshot(**values)
+
     def read_player_tile_position(self):
         """
         Read the player (area_id,x,y) and convert it to tile (area_id,x,y).
@@ -277,8 +484,7 @@ class RabiRibiMemoryIO():
         # write our code to memory
         self.rr_mem.write_bytes(
             self.addr_injected_give_item_entrypoint, 
-            injected_call_func_code,
-            len(injected_call_func_code)
+            injected_call_func_code
         )
 
         # start a thread at the entrypoint of our injected code
@@ -299,9 +505,9 @@ class RabiRibiMemoryIO():
             OFFSET_ITEM_MAP +
             (((x * 200) + y) * 2)
         )
-        current_item = self.rr_mem.read_short(map_tile_item_info_offset)
+        current_item = struct.unpack("<h", self.rr_mem.read_bytes(map_tile_item_info_offset, 2))[0]
         if current_item == EXCLAMATION_POINT_ITEM_ID:
-            self.rr_mem.write_short(map_tile_item_info_offset, 0)
+            self.rr_mem.write_bytes(map_tile_item_info_offset, struct.pack("<h", 0))
 
     def remove_exclamation_point_from_inventory(self):
         """
@@ -336,7 +542,7 @@ class RabiRibiMemoryIO():
         If 2 or 3, the player has the item, along with an upgrade.
         If -1, -2, or -3, the player has the item, but has disabled it.
         """
-        self.rr_mem.write_int(self.rr_mem.base_address + OFFSET_INVENTORY_START + (4 * int(item_id)), state)
+        self._write_int(OFFSET_INVENTORY_START + (4 * int(item_id)), state)
 
     def get_last_received_item_index(self):
         """
@@ -354,38 +560,26 @@ class RabiRibiMemoryIO():
         """
         Sets the state of the given event flag ID.
         """
-        address = self.rr_mem.base_address + OFFSET_EVENT_START + (4 * (event_id - EVENT_FLAG_ID_START))
         value = 1 if state else 0
-        self.rr_mem.write_int(address, value)
+        self._write_int(OFFSET_EVENT_START + (4 * (event_id - EVENT_FLAG_ID_START)), value)
 
     def open_warp_menu(self):
         """
         Opens the warp menu.
         """
-        self.rr_mem.write_int(self.rr_mem.base_address + OFFSET_IN_WARP_MENU, 1)
+        self._write_int(OFFSET_IN_WARP_MENU, 1)
 
         # When using the warp menu, the player cannot select to warp to their current location.
         # Since we're opening the menu in a random location, we need to set the current location to not be 0
         # to allow warping to Starting Forest. Using -1 allows all warps to be selected.
-        self.rr_mem.write_int(self.rr_mem.base_address + OFFSET_CURRENT_WARP_ID, -1)
+        self._write_int(OFFSET_CURRENT_WARP_ID, -1)
 
     def get_collected_eggs(self) -> list[tuple[int, int, int]]:
         """
         Returns the locations of all eggs collected by the player.
         """
         data = self.rr_mem.read_bytes(self.rr_mem.base_address + OFFSET_EGG_START, EGG_ARRAY_LENGTH)
-        eggs: list[tuple[int, int, int]] = list(struct.iter_unpack('3h', data))
-
-        # Check if the player has 80 eggs
-        if (0,0,0) not in eggs:
-            return eggs
-
-        egg_count = eggs.index((0,0,0))
-
-        if egg_count >= 0:
-            eggs = eggs[:egg_count]
-
-        return eggs
+        return _decode_collected_eggs(data)
 
     def get_number_of_eggs_collected(self) -> int:
         """
@@ -435,4 +629,4 @@ class RabiRibiMemoryIO():
         Sets the player health to 0
         """
         player_state_health_address = self._read_int(OFFSET_PLAYER_STATE) + OFFSET_PLAYER_STATE_HEALTH
-        self.rr_mem.write_int(player_state_health_address, 0)
+        self.rr_mem.write_bytes(player_state_health_address, struct.pack("<i", 0))
@@ -2,17 +2,24 @@
 This module is responsible for patching the game's map files per world.
 This is done on the client side upon connect to allow for a smoother setup experience.
 """
+import copy
+import hashlib
+import json
 import os
-import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, NamedTuple, Optional
+
+from NetUtils import NetworkItem
+
 from .client import RabiRibiContext
+from .map_writer import get_map_filename
 from ..data import data
 from ..existing_randomizer.dataparser import RandomizerData
 from ..existing_randomizer.mapfileio import (
     ItemModifier,
     grab_original_maps,
-    MAP_ITEMS_OFFSET,
-    MAP_TILES0_OFFSET,
-    MAP_SIZE
+    MAP_TILES0_OFFSET
 )
 from ..existing_randomizer.randomizer import (
     apply_item_specific_fixes,
@@ -23,12 +30,36 @@ from ..existing_randomizer.randomizer import (
     parse_args,
     pre_modify_map_data
 )
-from ..existing_randomizer.utility import to_index
 from ..items import lookup_item_id_to_name
 from ..locations import lookup_location_id_to_name
 from ..options import AttackMode
 from ..world import RabiRibiWorld
 
+class PatchInputs(NamedTuple):
+    """
+    The client state the patch reads. It is copied on the client loop,
+    so the patch can run in a worker thread while the client state changes.
+    """
+    slot: int
+    slot_data: dict[str, Any]
+    locations_info: dict[int, NetworkItem]
+    custom_seed_subdir: str
+    seed_player: str
+    seed_player_id: str
+
+    @staticmethod
+    def from_context(ctx: RabiRibiContext) -> "PatchInputs":
+        if not ctx.slot_data or not ctx.custom_seed_subdir or not ctx.seed_player or not ctx.seed_player_id:
+            raise RuntimeError("Missing seed info while attempting to patch maps")
+        return PatchInputs(
+            ctx.slot,
+            copy.deepcopy(ctx.slot_data),
+            dict(ctx.locations_info),
+            ctx.custom_seed_subdir,
+            ctx.seed_player,
+            ctx.seed_player_id,
+        )
+
 class Allocation():
     """
     This class mimics the existing randomizer's Allocation class.
@@ -36,22 +67,22 @@ class Allocation():
     data manipulation and file write functions.
     """
 
-    def __init__(self, ctx: RabiRibiContext, randomizer_data: RandomizerData):
+    def __init__(self, patch_inputs: PatchInputs, randomizer_data: RandomizerData):
         self.map_modifications = []
         self.item_at_item_location = self.set_location_info(
-            ctx.slot,
-            ctx.locations_info
+            patch_inputs.slot,
+            patch_inputs.locations_info
         )
 
-        if not ctx.slot_data:
+        if not patch_inputs.slot_data:
             raise RuntimeError("Missing slot data while attempting to patch maps")
 
-        map_transition_shuffle_order: list[int] = ctx.slot_data["map_transition_shuffle_order"]
+        map_transition_shuffle_order: list[int] = patch_inputs.slot_data["map_transition_shuffle_order"]
 
         self.map_modifications += randomizer_data.default_map_modifications
         self.walking_left_transitions = [randomizer_data.walking_left_transitions[x] for x in map_transition_shuffle_order]
 
-        start_location_name = data.get_region_by_ap_name(ctx.slot_data["start_location"]).logic_key
+        start_location_name = data.get_region_by_ap_name(patch_inputs.slot_data["start_location"]).logic_key
         self.start_location = next((location for location in randomizer_data.start_locations
                                     if location.location == start_location_name), randomizer_data.start_locations[0])
 
@@ -63,101 +94,189 @@ class Allocation():
             for location in location_info.values()
         }
 
-def patch_map_files(ctx: RabiRibiContext):
+PATCH_MANIFEST_NAME = "ap_patch_manifest.json"
+# Bump when the patching output changes for the same inputs, to invalidate existing patched maps.
+PATCH_MANIFEST_VERSION = 2
+
+def get_map_source_dir() -> str:
+    return f"{RabiRibiWorld.settings.game_installation_path}/data/area"
+
+def get_patch_key(patch_inputs: PatchInputs, map_source_dir: str) -> str:
+    """
+    Compute the key identifying the patched maps of a world: a hash of the seed player,
+    the slot data, the scouted locations and the original maps of the game installation.
+    Any change in these inputs (e.g. a game update) changes the key. The original maps
+    are identified by their sizes and modification times, to avoid reading them on every connect.
+
+    :PatchInputs patch_inputs: The client state to patch the maps for.
+    :str map_source_dir: The directory containing the original map files.
+    """
+    key = hashlib.sha256()
+    key.update(f"{PATCH_MANIFEST_VERSION}:{patch_inputs.seed_player_id}".encode())
+    key.update(json.dumps(patch_inputs.slot_data, sort_keys=True).encode())
+    locations_info = sorted((location.location, location.item, location.player)
+                            for location in patch_inputs.locations_info.values())
+    key.update(json.dumps(locations_info).encode())
+    for filename in sorted(f for f in os.listdir(map_source_dir) if f.endswith('.map')):
+        stat = os.stat(os.path.join(map_source_dir, filename))
+        key.update(f"{filename}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return key.hexdigest()
+
+def is_legacy_patched_map_dir(directory: str) -> bool:
+    """
+    Check if the directory contains maps patched by a client that did not write a manifest.
+    Those maps were never patched again, so they are kept along with the items removed from them.
+
+    :str directory: The patched map directory.
+    """
+    return (
+        not os.path.isfile(os.path.join(directory, PATCH_MANIFEST_NAME)) and
+        os.path.isfile(get_map_filename(directory, 0))
+    )
+
+def is_patched_map_dir_valid(directory: str, key: str) -> bool:
+    """
+    Check that the directory contains the complete output of a patch with the given key.
+    Only the file sizes are verified, as collected items are removed from the maps in place.
+
+    :str directory: The patched map directory.
+    :str key: The expected patch key, see get_patch_key.
+    """
+    try:
+        with open(os.path.join(directory, PATCH_MANIFEST_NAME), "r") as f:
+            manifest = json.load(f)
+        return (
+            manifest["key"] == key and
+            all(os.path.getsize(os.path.join(directory, filename)) == size
+                for filename, size in manifest["files"].items())
+        )
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return False
+
+def write_patch_manifest(directory: str, key: str):
+    """
+    Record the key and the files of a completed patch. This is written last,
+    so an interrupted patch is never considered valid.
+
+    :str directory: The patched map directory.
+    :str key: The patch key, see get_patch_key.
+    """
+    files = {
+        filename: os.path.getsize(os.path.join(directory, filename))
+        for filename in sorted(os.listdir(directory))
+        if filename != PATCH_MANIFEST_NAME
+    }
+    with open(os.path.join(directory, PATCH_MANIFEST_NAME), "w") as f:
+        json.dump({"key": key, "files": files}, f)
+
+def patch_map_files_if_needed(patch_inputs: PatchInputs, report_progress: Optional[Callable[[str], None]] = None) -> bool:
+    """
+    Patch the map files, unless the seed directory already contains the maps
+    patched for the same seed, slot data, locations and original maps.
+    The patched maps contain every item again, so the caller must remove the collected ones.
+
+    :PatchInputs patch_inputs: The client state to patch the maps for.
+    :report_progress: Called with a message after each step of the patch.
+    :returns: True if the map files were patched.
+    """
+    assert patch_inputs.custom_seed_subdir
+    key = get_patch_key(patch_inputs, get_map_source_dir())
+    if is_patched_map_dir_valid(patch_inputs.custom_seed_subdir, key):
+        return False
+    if is_legacy_patched_map_dir(patch_inputs.custom_seed_subdir):
+        write_patch_manifest(patch_inputs.custom_seed_subdir, key)
+        return False
+    manifest_path = os.path.join(patch_inputs.custom_seed_subdir, PATCH_MANIFEST_NAME)
+    if os.path.isfile(manifest_path):
+        os.remove(manifest_path)
+    patch_map_files(patch_inputs, report_progress)
+    write_patch_manifest(patch_inputs.custom_seed_subdir, key)
+    return True
+
+def patch_map_files(patch_inputs: PatchInputs, report_progress: Optional[Callable[[str], None]] = None):
     """
     Patch the map files to make map modifications (item changes / room changes, etc).
+    The areas are loaded, copied and written concurrently. The modifications themselves are
+    applied in order, as the music and background shuffles must consume the seeded rng in order.
 
-    :RabiRibiContext ctx: The Rabi Ribi Context instance.
+    :PatchInputs patch_inputs: The client state to patch the maps for.
+    :report_progress: Called with a message after each step of the patch.
     """
-    if not ctx.slot_data or not ctx.custom_seed_subdir:
+    if not patch_inputs.slot_data or not patch_inputs.custom_seed_subdir:
         raise RuntimeError("Missing seed info while attempting to patch maps")
+    if report_progress is None:
+        report_progress = lambda message: None
 
-    map_source_dir = f"{RabiRibiWorld.settings.game_installation_path}/data/area"
-    grab_original_maps(map_source_dir, ctx.custom_seed_subdir)
-    settings = initialize_settings(ctx)
-    attack_mode = ctx.slot_data["attackMode"]
-    picked_templates = ctx.slot_data["picked_templates"]
-    if attack_mode == AttackMode.option_hyper:
-        settings.hyper_attack_mode = True
-    elif attack_mode == AttackMode.option_super:
-        settings.super_attack_mode = True
+    start_time = time.perf_counter()
+    map_source_dir = get_map_source_dir()
     area_ids = get_default_areaids()
-    randomizer_data = RandomizerData(settings)
-    item_modifier = ItemModifier(
-        area_ids,
-        map_source_dir
-    )
-    allocation = Allocation(ctx, randomizer_data)
-    map_modifications = allocation.map_modifications
-    for template in picked_templates:
-        map_modifications.append(os.path.join('existing_randomizer', 'maptemplates', 'constraint_shuffle', f'CS_{template}.txt'))
+    with ThreadPoolExecutor(max_workers=len(area_ids), thread_name_prefix="Rabi-Ribi Map Patch") as executor:
+        grab_original_maps(map_source_dir, patch_inputs.custom_seed_subdir, executor)
+        settings = initialize_settings(patch_inputs)
+        attack_mode = patch_inputs.slot_data["attackMode"]
+        picked_templates = patch_inputs.slot_data["picked_templates"]
+        if attack_mode == AttackMode.option_hyper:
+            settings.hyper_attack_mode = True
+        elif attack_mode == AttackMode.option_super:
+            settings.super_attack_mode = True
+        randomizer_data = RandomizerData(settings)
+        item_modifier = ItemModifier(
+            area_ids,
+            map_source_dir,
+            executor
+        )
+        report_progress(f"Patching maps: loaded {len(area_ids)} areas")
+        allocation = Allocation(patch_inputs, randomizer_data)
+        map_modifications = allocation.map_modifications
+        for template in picked_templates:
+            map_modifications.append(os.path.join('existing_randomizer', 'maptemplates', 'constraint_shuffle', f'CS_{template}.txt'))
 
-    pre_modify_map_data(item_modifier, settings, map_modifications, randomizer_data.config_data)
-    apply_item_specific_fixes(item_modifier, allocation)
-    apply_map_transition_shuffle(item_modifier, randomizer_data, settings, allocation)
-    apply_start_location_shuffle(item_modifier, settings, allocation)
-    insert_items_into_map(item_modifier, randomizer_data, settings, allocation)
+        pre_modify_map_data(item_modifier, settings, map_modifications, randomizer_data.config_data)
+        apply_item_specific_fixes(item_modifier, allocation)
+        apply_map_transition_shuffle(item_modifier, randomizer_data, settings, allocation)
+        apply_start_location_shuffle(item_modifier, settings, allocation)
+        report_progress("Patching maps: applied map modifications")
+        insert_items_into_map(item_modifier, randomizer_data, settings, allocation)
 
-    if (ctx.custom_seed_subdir):
-        item_modifier.save(ctx.custom_seed_subdir)
+        item_modifier.save(patch_inputs.custom_seed_subdir, executor)
+        report_progress(f"Patching maps: wrote {len(area_ids)} areas")
 
-    embed_seed_player_into_mapdata(ctx, item_modifier)
-    create_custom_text_file(ctx)
+    embed_seed_player_into_mapdata(patch_inputs, item_modifier)
+    create_custom_text_file(patch_inputs)
+    report_progress(f"Patched maps in {time.perf_counter() - start_time:.1f}s")
 
-def initialize_settings(ctx: RabiRibiContext):
-    assert(ctx.slot_data is not None)
+def initialize_settings(patch_inputs: PatchInputs):
+    assert(patch_inputs.slot_data is not None)
     settings = parse_args()
     settings.open_mode = True
-    settings.num_hard_to_reach = ctx.slot_data["required_egg_count"]
+    settings.num_hard_to_reach = patch_inputs.slot_data["required_egg_count"]
     settings.shuffle_gift_items = True
 
     # Need a unique seed to ensure that the background and music shuffles can be regenerated if needed.
-    settings.random_seed = ctx.seed_player
-    settings.shuffle_music = ctx.slot_data["shuffle_music"]
-    settings.shuffle_backgrounds = ctx.slot_data["shuffle_backgrounds"]
+    settings.random_seed = patch_inputs.seed_player
+    settings.shuffle_music = patch_inputs.slot_data["shuffle_music"]
+    settings.shuffle_backgrounds = patch_inputs.slot_data["shuffle_backgrounds"]
     settings.shuffle_start_location = True # Always apply start location shuffle to enable start room.
-    settings.apply_beginner_mod = ctx.slot_data["apply_beginner_mod"]
-    settings.no_laggy_backgrounds = True if "allow_laggy_backgrounds" not in ctx.slot_data else not ctx.slot_data["allow_laggy_backgrounds"]
-    settings.no_difficult_backgrounds = True if "allow_difficult_backgrounds" not in ctx.slot_data else not ctx.slot_data["allow_difficult_backgrounds"]
+    settings.apply_beginner_mod = patch_inputs.slot_data["apply_beginner_mod"]
+    settings.no_laggy_backgrounds = True if "allow_laggy_backgrounds" not in patch_inputs.slot_data else not patch_inputs.slot_data["allow_laggy_backgrounds"]
+    settings.no_difficult_backgrounds = True if "allow_difficult_backgrounds" not in patch_inputs.slot_data else not patch_inputs.slot_data["allow_difficult_backgrounds"]
     return settings
 
-def remove_exclamation_point_from_map(ctx: RabiRibiContext, area_id: int, x: int, y: int):
-    """
-    This method removes a specified item from the map. This is used to delete
-    items from other worlds (represented by exclamation point items) on the map
-    after the player collects it. This is needed because the item being visible
-    is directly linked to whether the exclamation point item is in the player's
-    inventory. We always set that value to false so that the player can see all
-    of the exclamation points, but we want to delete the ones the player has already
-    obtained.
-    """
-    EXCLAMATION_POINT_ITEM_ID = 43
-    f = open(f"{ctx.custom_seed_subdir}/area{area_id}.map", "r+b")
-    f.seek(MAP_ITEMS_OFFSET)
-    tiledata_items = list(struct.unpack('%dh' % MAP_SIZE, f.read(MAP_SIZE*2)))
-    index = to_index((x, y))
-
-    if tiledata_items[index] == EXCLAMATION_POINT_ITEM_ID:
-        tiledata_items[index] = 0
-        f.seek(MAP_ITEMS_OFFSET)
-        f.write(struct.pack('%dh' % MAP_SIZE, *tiledata_items))
-        f.close()
-
-def embed_seed_player_into_mapdata(ctx: RabiRibiContext, item_modifier):
-    if not ctx.seed_player_id:
+def embed_seed_player_into_mapdata(patch_inputs: PatchInputs, item_modifier):
+    if not patch_inputs.seed_player_id:
         raise RuntimeError("Missing seed player ID while embedding seed in map")
 
     for area_id, _ in item_modifier.stored_datas.items():
-        with open(f"{ctx.custom_seed_subdir}/area{area_id}.map", "r+b") as f:
+        with open(f"{patch_inputs.custom_seed_subdir}/area{area_id}.map", "r+b") as f:
             f.seek(MAP_TILES0_OFFSET)
-            f.write(ctx.seed_player_id.encode())
+            f.write(patch_inputs.seed_player_id.encode())
             f.close()
 
-def create_custom_text_file(ctx: RabiRibiContext):
-    assert(ctx.slot_data is not None)
-    start_location = ctx.slot_data["start_location"]
-    required_egg_count = ctx.slot_data["required_egg_count"] if "required_egg_count" in ctx.slot_data else 5
-    with open(f"{ctx.custom_seed_subdir}/story_text.rbrb", "w") as f:
+def create_custom_text_file(patch_inputs: PatchInputs):
+    assert(patch_inputs.slot_data is not None)
+    start_location = patch_inputs.slot_data["start_location"]
+    required_egg_count = patch_inputs.slot_data["required_egg_count"] if "required_egg_count" in patch_inputs.slot_data else 5
+    with open(f"{patch_inputs.custom_seed_subdir}/story_text.rbrb", "w") as f:
         f.write("\r\n")
         f.write("Starting Forest\r\n")
         f.write("Forgotten Cave II\r\n")
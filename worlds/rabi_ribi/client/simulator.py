@@ -0,0 +1,261 @@
+"""
+This module defines SimulatedRabiRibi, a memory backend that simulates the parts of a
+rabi-ribi game instance that the client reads and writes. The game is driven by a scripted
+scenario (item pickups, egg collection, menus, deaths, ...), which allows exercising,
+testing and benchmarking the client without the game, e.g. on Linux or in CI.
+
+Example:
+    game = SimulatedRabiRibi()
+    ctx.rr_interface = RabiRibiMemoryIO(lambda: game)
+    await game.play([
+        ScenarioStep(0, "load_game", (ctx.seed_player_id,)),
+        ScenarioStep(1, "pick_up_item", (0, 91, 57)),
+    ])
+"""
+import asyncio
+import struct
+from typing import Iterable, NamedTuple
+
+from .memory_backend import MemoryBackend, ProcessLost
+from .memory_io import (
+    EGG_ARRAY_LENGTH,
+    EXCLAMATION_POINT_ITEM_ID,
+    OFFSET_AREA_ID,
+    OFFSET_EGG_START,
+    OFFSET_GIVE_ITEM_FUNC,
+    OFFSET_IN_COSTUME_MENU,
+    OFFSET_IN_ITEM_GET_ANIMATION,
+    OFFSET_IN_SAVE_MENU,
+    OFFSET_IN_WARP_MENU,
+    OFFSET_INVENTORY_START,
+    OFFSET_ITEM_MAP,
+    OFFSET_MAX_HEALTH,
+    OFFSET_PLAYER_FROZEN,
+    OFFSET_PLAYER_PAUSED,
+    OFFSET_PLAYER_STATE,
+    OFFSET_PLAYER_STATE_HEALTH,
+    OFFSET_PLAYER_X,
+    OFFSET_PLAYER_Y,
+    OFFSET_SCENERIO_INDICATOR,
+    TILE_LENGTH,
+)
+
+SIMULATED_BASE_ADDRESS = 0x00400000
+SIMULATED_PLAYER_STATE_ADDRESS = 0x30000000
+SIMULATED_ALLOCATION_ADDRESS = 0x40000000
+SIMULATED_PAGE_SIZE = 0x1000
+SIMULATED_MAX_HEALTH = 100
+# Opcodes of the give item code injected by RabiRibiMemoryIO.give_item
+MOV_ECX_OPCODE = 185
+CALL_OPCODE = 232
+
+class ScenarioStep(NamedTuple):
+    """
+    A step of a scenario: after waiting delay seconds, call the method action of the game with args.
+    """
+    delay: float
+    action: str
+    args: tuple = ()
+
+class SimulatedRabiRibi(MemoryBackend):
+    """
+    SimulatedRabiRibi stores the game memory in sparse pages, so reads and writes at the real
+    game offsets behave like the game process. The scenario methods update the memory like the game does.
+    """
+
+    def __init__(self, item_animation_time: float = 1.0):
+        """
+        :item_animation_time: seconds the player is frozen after getting an item.
+        """
+        self.base_address = SIMULATED_BASE_ADDRESS
+        self.process_id = 0
+        self.item_animation_time = item_animation_time
+        self.pages: dict[int, bytearray] = {}
+        self.next_allocation_address = SIMULATED_ALLOCATION_ADDRESS
+        self.closed = False
+        self.egg_count = 0
+        # Rabi-ribi item ids given by the client, in order
+        self.received_item_ids: list[int] = []
+        # Statistics, for benchmarks
+        self.read_count = 0
+        self.write_count = 0
+        self._write_int(OFFSET_PLAYER_STATE, SIMULATED_PLAYER_STATE_ADDRESS)
+
+    # MemoryBackend
+
+    def read_bytes(self, address: int, length: int) -> bytes:
+        if self.closed:
+            raise ProcessLost()
+        self.read_count += 1
+        data = bytearray(length)
+        position = 0
+        while position < length:
+            page_index, page_offset = divmod(address + position, SIMULATED_PAGE_SIZE)
+            chunk_length = min(length - position, SIMULATED_PAGE_SIZE - page_offset)
+            page = self.pages.get(page_index)
+            if page is not None:
+                data[position:position + chunk_length] = page[page_offset:page_offset + chunk_length]
+            position += chunk_length
+        return bytes(data)
+
+    def write_bytes(self, address: int, data: bytes) -> None:
+        if self.closed:
+            raise ProcessLost()
+        self.write_count += 1
+        position = 0
+        while position < len(data):
+            page_index, page_offset = divmod(address + position, SIMULATED_PAGE_SIZE)
+            chunk_length = min(len(data) - position, SIMULATED_PAGE_SIZE - page_offset)
+            page = self.pages.get(page_index)
+            if page is None:
+                page = self.pages[page_index] = bytearray(SIMULATED_PAGE_SIZE)
+            page[page_offset:page_offset + chunk_length] = data[position:position + chunk_length]
+            position += chunk_length
+
+    def allocate(self, size: int) -> int:
+        address = self.next_allocation_address
+        self.next_allocation_address += size
+        return address
+
+    def start_thread(self, address: int) -> None:
+        """
+        The only code the client runs is the give item code, so decode the item id from it.
+        """
+        code = self.read_bytes(address, 11)
+        if code[0] != MOV_ECX_OPCODE or code[5] != CALL_OPCODE:
+            raise ValueError(f"Unknown code injected at {address:#x}: {code.hex()}")
+        item_id = struct.unpack("<i", code[1:5])[0]
+        call_address = address + 10 + struct.unpack("<i", code[6:10])[0]
+        if call_address != self.base_address + OFFSET_GIVE_ITEM_FUNC:
+            raise ValueError(f"Injected code calls unknown function at {call_address:#x}")
+        self.received_item_ids.append(item_id)
+        self.give_item(item_id)
+
+    # Memory helpers
+
+    def _read_int(self, offset: int) -> int:
+        return struct.unpack("<i", self.read_bytes(self.base_address + offset, 4))[0]
+
+    def _write_int(self, offset: int, value: int) -> None:
+        self.write_bytes(self.base_address + offset, struct.pack("<i", value))
+
+    def _write_float(self, offset: int, value: float) -> None:
+        self.write_bytes(self.base_address + offset, struct.pack("<f", value))
+
+    def _write_bool(self, offset: int, value: bool) -> None:
+        self.write_bytes(self.base_address + offset, struct.pack("<?", value))
+
+    def get_item_state(self, item_id: int) -> int:
+        return self._read_int(OFFSET_INVENTORY_START + 4 * item_id)
+
+    def set_item_state(self, item_id: int, state: int) -> None:
+        self._write_int(OFFSET_INVENTORY_START + 4 * item_id, state)
+
+    def get_health(self) -> int:
+        return struct.unpack("<i", self.read_bytes(SIMULATED_PLAYER_STATE_ADDRESS + OFFSET_PLAYER_STATE_HEALTH, 4))[0]
+
+    def set_health(self, health: int) -> None:
+        self.write_bytes(SIMULATED_PLAYER_STATE_ADDRESS + OFFSET_PLAYER_STATE_HEALTH, struct.pack("<i", health))
+
+    # Scenario actions
+
+    async def play(self, steps: Iterable[ScenarioStep]) -> None:
+        """
+        Play a scripted scenario.
+        """
+        for step in steps:
+            if step.delay > 0:
+                await asyncio.sleep(step.delay)
+            getattr(self, step.action)(*step.args)
+
+    def load_game(self, scenario: str) -> None:
+        """
+        Load into the custom scenario with the given name from the main menu.
+        """
+        self.write_bytes(self.base_address + OFFSET_SCENERIO_INDICATOR, scenario.encode("utf-8"))
+        self._write_int(OFFSET_MAX_HEALTH, SIMULATED_MAX_HEALTH)
+        self.set_health(SIMULATED_MAX_HEALTH)
+
+    def return_to_main_menu(self) -> None:
+        self._write_int(OFFSET_MAX_HEALTH, 0)
+        self._write_int(OFFSET_PLAYER_PAUSED, 0)
+
+    def move_player(self, area_id: int, x: int, y: int) -> None:
+        """
+        Move the player to the tile (area_id, x, y).
+        """
+        self._write_int(OFFSET_AREA_ID, area_id)
+        self._write_float(OFFSET_PLAYER_X, float(x * TILE_LENGTH))
+        self._write_float(OFFSET_PLAYER_Y, float(y * TILE_LENGTH))
+
+    def place_item(self, x: int, y: int, item_id: int) -> None:
+        """
+        Place an item on the tile (x, y) of the map loaded into memory.
+        """
+        self.write_bytes(self.base_address + OFFSET_ITEM_MAP + ((x * 200) + y) * 2, struct.pack("<h", item_id))
+
+    def pick_up_item(self, area_id: int, x: int, y: int, item_id: int = EXCLAMATION_POINT_ITEM_ID) -> None:
+        """
+        Move the player to the item on the tile (area_id, x, y) and pick it up.
+        """
+        self.move_player(area_id, x, y)
+        self.place_item(x, y, 0)
+        self.give_item(item_id)
+
+    def give_item(self, item_id: int) -> None:
+        """
+        Add an item to the inventory, and play the item get animation.
+        """
+        if self.get_item_state(item_id) == 0:
+            self.set_item_state(item_id, 1)
+        self.start_item_animation()
+
+    def start_item_animation(self) -> None:
+        self._write_bool(OFFSET_IN_ITEM_GET_ANIMATION, True)
+        self._write_int(OFFSET_PLAYER_FROZEN, 1)
+        try:
+            asyncio.get_running_loop().call_later(self.item_animation_time, self.end_item_animation)
+        except RuntimeError:
+            # Not running in an event loop, the scenario ends the animation instead.
+            pass
+
+    def end_item_animation(self) -> None:
+        if self.closed:
+            return
+        self._write_bool(OFFSET_IN_ITEM_GET_ANIMATION, False)
+        self._write_int(OFFSET_PLAYER_FROZEN, 0)
+
+    def collect_egg(self, area_id: int, x: int, y: int) -> None:
+        """
+        Collect the egg on the tile (area_id, x, y).
+        """
+        if (self.egg_count + 1) * 6 > EGG_ARRAY_LENGTH:
+            raise ValueError("The player already has all eggs")
+        self.move_player(area_id, x, y)
+        self.write_bytes(self.base_address + OFFSET_EGG_START + self.egg_count * 6, struct.pack("<3h", area_id, x, y))
+        self.egg_count += 1
+        self.start_item_animation()
+
+    def set_paused(self, paused: bool) -> None:
+        self._write_int(OFFSET_PLAYER_PAUSED, int(paused))
+
+    def set_in_warp_menu(self, in_menu: bool) -> None:
+        self._write_int(OFFSET_IN_WARP_MENU, int(in_menu))
+
+    def set_in_costume_menu(self, in_menu: bool) -> None:
+        self._write_int(OFFSET_IN_COSTUME_MENU, int(in_menu))
+
+    def set_in_save_menu(self, in_menu: bool) -> None:
+        self._write_bool(OFFSET_IN_SAVE_MENU, in_menu)
+
+    def die(self) -> None:
+        self.set_health(0)
+
+    def respawn(self) -> None:
+        self.set_health(SIMULATED_MAX_HEALTH)
+
+    def close(self) -> None:
+        """
+        Close the game. Accessing the memory afterwards raises ProcessLost.
+        """
+        self.closed = True
@@ -0,0 +1,120 @@
+"""
+This module defines the derived counters, which the world maintains as pseudo-items in the collection
+state in collect and remove. Rules that need the number of town members, magic types or amulet/food
+compare the counter instead of counting the items it is derived from on every evaluation.
+"""
+from collections import Counter
+
+from .items import item_groups, recruit_table, recruit_table_irisu
+from .names import ItemName
+
+TOWN_MEMBER_COUNT = "Town Member Count"
+MAIN_GAME_TOWN_MEMBER_COUNT = "Main Game Town Member Count"
+MAGIC_TYPE_COUNT = "Magic Type Count"
+AMULET_FOOD_COUNT = "Amulet/Food Count"
+
+counter_names: tuple[str, ...] = (
+    TOWN_MEMBER_COUNT,
+    MAIN_GAME_TOWN_MEMBER_COUNT,
+    MAGIC_TYPE_COUNT,
+    AMULET_FOOD_COUNT,
+)
+
+# The chapter events the counters are derived from.
+chapter_events: tuple[str, ...] = ("Chapter 1", "Chapter 2", "Chapter 3", "Chapter 4")
+
+# Collecting or removing one of these items can change a counter.
+counter_dependencies: frozenset[str] = frozenset({
+    *recruit_table,
+    *item_groups["Magic"],
+    *item_groups["Consumables"],
+    *chapter_events,
+    "Shop Reachable",
+    ItemName.bunny_amulet,
+    ItemName.rumi_recruit,
+    ItemName.easter_egg,
+    ItemName.glitched_logic,
+})
+
+
+class StateCounters:
+    """
+    Computes the derived counters of a player from their collected items. The options the counters
+    depend on are fixed when the world is generated.
+    """
+
+    def __init__(self, rainbow_shot_in_logic_enabled: bool, has_advanced_knowledge: bool):
+        self.rainbow_shot_in_logic_enabled = rainbow_shot_in_logic_enabled
+        self.has_advanced_knowledge = has_advanced_knowledge
+
+    def update(self, items: Counter[str], item_name: str) -> None:
+        """
+        Update the counters in items after item_name was collected or removed.
+
+        :items: The collected items of the player, as stored in CollectionState.prog_items.
+        """
+        if item_name not in counter_dependencies:
+            return
+        town_members = sum(1 for recruit in recruit_table if items[recruit])
+        main_game_town_members = sum(1 for recruit in recruit_table_irisu if items[recruit])
+        magic_types = self._count_magic_types(items)
+        amulet_food = self._count_amulet_food(items, town_members, magic_types)
+        for name, value in zip(counter_names, (town_members, main_game_town_members, magic_types, amulet_food)):
+            if value:
+                items[name] = value
+            else:
+                items.pop(name, None)
+
+    def _rainbow_shot_in_logic(self, items: Counter[str]) -> bool:
+        """Player has Rainbow Shot and it's not out of logic by options"""
+        return (self.rainbow_shot_in_logic_enabled or items[ItemName.glitched_logic] > 0) and \
+            items[ItemName.easter_egg] >= 5
+
+    def _count_magic_types(self, items: Counter[str]) -> int:
+        magic_types = sum(1 for magic in item_groups["Magic"] if items[magic])
+        if self._rainbow_shot_in_logic(items):
+            magic_types += 1
+        return magic_types
+
+    def _count_amulet_food(self, items: Counter[str], town_members: int, magic_types: int) -> int:
+        amulet = self._count_amulet_charges(items)
+        food = 0
+
+        # Player has access to the item menu
+        if items["Chapter 1"] or \
+                ((self.has_advanced_knowledge or items[ItemName.glitched_logic]) and magic_types >= 2):
+            if items[ItemName.rumi_donut] or items["Shop Reachable"]:
+                food = 1
+                # Eating a Rumi Donut gives an amulet charge
+                if items[ItemName.rumi_cake] or items["Shop Reachable"]:
+                    amulet += 1
+                food += self._count_normal_consumable_items(items, town_members)
+                # Kotri's buff can save enough amulet charge for an additional amulet use
+                if amulet >= 4 and items[ItemName.kotri_recruit] and town_members >= 3:
+                    amulet += 1
+        return amulet + food
+
+    def _count_amulet_charges(self, items: Counter[str]) -> int:
+        """Counts the number of amulet charges the player has"""
+        if items[ItemName.bunny_amulet] or items["Chapter 2"]:
+            if items[ItemName.rumi_recruit]:
+                return 4
+            if items["Shop Reachable"] or items["Chapter 4"]:
+                return 3
+            if items["Chapter 3"]:
+                return 2
+            return 1
+        return 0
+
+    def _count_normal_consumable_items(self, items: Counter[str], town_members: int) -> int:
+        """Counts which normal consumable items the player can reach, either from locations or purchases."""
+        consumables = 0
+        if items[ItemName.rumi_cake] or items["Shop Reachable"]:
+            consumables += 1
+        # The cocoa bomb can be purchased once Cocoa is recruited
+        if items[ItemName.cocoa_bomb] or \
+                (items["Chapter 1"] and items[ItemName.cocoa_recruit] and town_members >= 3):
+            consumables += 1
+        if items[ItemName.gold_carrot]:
+            consumables += 1
+        return consumables
@@ -105,6 +105,7 @@ class RabiRibiData:
     _logic_constraints: dict[str, ConstraintData]
 
     _locations_by_coordinates: dict[int, dict[tuple[int, int], LocationData]]
+    _location_buckets: dict[tuple[int, int, int], list[LocationData]]
 
     def __init__(self) -> None:
         self.items = []
@@ -162,6 +163,13 @@ class RabiRibiData:
             self._locations_by_coordinates[location.area_id][(
                 location.x_position, location.y_position)] = location
 
+        # Spatial index of the locations, by area and square buckets of tiles
+        self._location_buckets = defaultdict(list)
+        for location in self.locations:
+            self._location_buckets[(location.area_id,
+                                    location.x_position // LOCATION_BUCKET_SIZE,
+                                    location.y_position // LOCATION_BUCKET_SIZE)].append(location)
+
     def create_item_groups(self) -> dict[str, set[str]]:
         tags: set[str] = {tag for item in self.items for tag in item.tags}
         return {tag: {item.name for item in self.items if tag in item.tags} for tag in tags}
@@ -230,11 +238,33 @@ class RabiRibiData:
     def get_location_name_by_coordinates(self, area_id: int, x_position: int, y_position: int) -> str:
         return self._locations_by_coordinates[area_id][(x_position, y_position)].name
 
+    def get_locations_near(self, area_id: int, x_position: int, y_position: int,
+                           max_distance: int) -> list[tuple[int, LocationData]]:
+        """
+        Returns the locations in the area within max_distance tiles (manhattan distance) of the given tile,
+        along with their distance, nearest first.
+        """
+        nearby_locations = []
+        for bucket_x in range((x_position - max_distance) // LOCATION_BUCKET_SIZE,
+                              (x_position + max_distance) // LOCATION_BUCKET_SIZE + 1):
+            for bucket_y in range((y_position - max_distance) // LOCATION_BUCKET_SIZE,
+                                  (y_position + max_distance) // LOCATION_BUCKET_SIZE + 1):
+                for location in self._location_buckets.get((area_id, bucket_x, bucket_y), ()):
+                    distance = abs(x_position - location.x_position) + abs(y_position - location.y_position)
+                    if distance <= max_distance:
+                        nearby_locations.append((distance, location))
+        nearby_locations.sort(key=lambda nearby_location: (nearby_location[0], nearby_location[1].id))
+        return nearby_locations
+
     def get_location_coordinates(self, name) -> tuple[int, int, int]:
         location = self._ap_locations[name]
         return (location.area_id, location.x_position, location.y_position)
 
 
+# Size in tiles of the squares the locations are bucketed by for get_locations_near.
+LOCATION_BUCKET_SIZE = 10
+
+
 def _load_json_data(data_name: str) -> list[Any]:
     file_data = pkgutil.get_data(__name__, "data/" + data_name)
     assert (isinstance(file_data, bytes))
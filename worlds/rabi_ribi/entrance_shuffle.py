@@ -1,6 +1,8 @@
 import bisect
 import logging
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from random import Random
 from typing import Any, override
 from Options import Accessibility
@@ -14,6 +16,7 @@ from .options import RabiRibiOptions
 
 logger = logging.getLogger(GAME_NAME)
 MAX_ATTEMPTS = 10000
+PARALLEL_BATCH_SIZE = 25
 
 class MapAllocation(Allocation):
     """An implementation of Allocation that replaces all items in the pool with item locations to obtain."""
@@ -166,6 +169,104 @@ class MapAllocation(Allocation):
 
         self.start_location = next((location for location in data.start_locations if location.location == start_location), data.start_locations[0])
 
+class MapConnectivity(object):
+    """Checks the connectivity of the graph, only ignoring the constraints that obtaining items could satisfy.
+    The locations connected to the start location are an upper bound for the locations the analyzer can reach,
+    so allocations that fail this check can be discarded without running the analyzer."""
+    def __init__(self, data: RandomizerData):
+        self.data = data
+
+        # Setting flags never change during the analysis, so constraints contradicting them can never be satisfied.
+        variable_bits = data.variable_bits
+        self.known_true_bits = 0
+        self.known_false_bits = 0
+        for name, value in data.configured_setting_flags.items():
+            if value:
+                self.known_true_bits |= variable_bits.get(name, 0)
+            else:
+                self.known_false_bits |= variable_bits.get(name, 0)
+
+        # Edges before replacement_edges_id are the same for every allocation
+        self.static_outgoing = {location: [] for location in data.initial_outgoing_edges}
+        for edge in data.initial_edges[:data.replacement_edges_id]:
+            if self.is_possibly_satisfiable(edge.satisfied_masks):
+                self.static_outgoing[edge.from_location].append(edge.to_location)
+
+        # Constraint edges keep their locations, but their constraints change between allocations
+        self.constraint_outgoing: dict[str, list[int]] = {}
+        for edge in data.initial_edges[data.replacement_edges_id:data.transition_edges_id]:
+            self.constraint_outgoing.setdefault(edge.from_location, []).append(edge.edge_id)
+        # Map transitions keep their constraints, but their locations change between allocations
+        self.possible_transition_edges = [
+            edge.edge_id for edge in data.initial_edges[data.transition_edges_id:]
+            if self.is_possibly_satisfiable(edge.satisfied_masks)
+        ]
+
+        # Nodes that can have outgoing edges which change between allocations
+        self.dynamic_sources = set(self.constraint_outgoing)
+        self.dynamic_sources.update(edge.from_location for edge in data.initial_edges[data.transition_edges_id:])
+        self.dynamic_sources.update(transition.origin_location for transition in data.walking_left_transitions)
+
+        self.location_names_in_node = {
+            node: {game_data.get_location_ap_name(item_location) for item_location in item_locations}
+            for node, item_locations in data.item_locations_in_node.items()
+        }
+        self.static_reachable_cache: dict[str, tuple[frozenset[str], list[str]]] = {}
+
+    def is_possibly_satisfiable(self, masks) -> bool:
+        if masks is None:
+            return True
+        for required, forbidden in masks:
+            if not (required & self.known_false_bits or forbidden & self.known_true_bits):
+                return True
+        return False
+
+    def get_static_reachable(self, location: str) -> tuple[frozenset[str], list[str]]:
+        """Returns the locations connected to location through the static edges, and the nodes among them
+        with edges that change between allocations. Cached per location, which covers every start location."""
+        result = self.static_reachable_cache.get(location)
+        if result is None:
+            visited = {location}
+            dfs_stack = [location]
+            while len(dfs_stack) > 0:
+                for target in self.static_outgoing[dfs_stack.pop()]:
+                    if target not in visited:
+                        visited.add(target)
+                        dfs_stack.append(target)
+            connected_locations = set()
+            for node in visited:
+                connected_locations |= self.location_names_in_node[node]
+            result = self.static_reachable_cache[location] = \
+                frozenset(connected_locations), [node for node in visited if node in self.dynamic_sources]
+        return result
+
+    def get_connected_locations(self, allocation: MapAllocation) -> set[str]:
+        """Returns the names of the locations connected to the start location of the allocation."""
+        edges = allocation.edges
+        transition_outgoing = {}
+        for edge_id in self.possible_transition_edges:
+            transition_outgoing.setdefault(edges[edge_id].from_location, []).append(edges[edge_id].to_location)
+
+        # Search through the static components connected by the dynamic edges
+        connected_locations = set()
+        visited = set()
+        expanded_sources = set()
+        pending = [allocation.start_location.location]
+        while len(pending) > 0:
+            location = pending.pop()
+            if location in visited: continue
+            visited.add(location)
+            static_locations, dynamic_sources = self.get_static_reachable(location)
+            connected_locations |= static_locations
+            for node in dynamic_sources:
+                if node in expanded_sources: continue
+                expanded_sources.add(node)
+                pending.extend(transition_outgoing.get(node, ()))
+                for edge_id in self.constraint_outgoing.get(node, ()):
+                    if self.is_possibly_satisfiable(edges[edge_id].satisfied_masks):
+                        pending.append(edges[edge_id].to_location)
+        return connected_locations
+
 class MapGenerator(object):
     """The MapAnalyzer class is an reimplementation of the Generator class with simplified validation,
     only ensuring that all locations are reachable if the player has all upgrades."""
@@ -175,39 +276,90 @@ class MapGenerator(object):
         self.allocation = MapAllocation(data, settings, world.random)
         self.locations_to_reach = locations_to_reach
         self.world = world
+        self.connectivity = MapConnectivity(data)
+        # Number of attempts the last search needed to find a valid allocation
+        self.attempts = 0
 
     def generate_seed(self):
+        processes = self.world.settings.map_generation_processes
+        if processes > 1:
+            return self.generate_seed_parallel(processes)
+
         success = False
         analyzer = None
 
         for i in range(MAX_ATTEMPTS):
             self.shuffle()
-            analyzer = MapAnalyzer(self.data, self.settings, self.allocation, self.locations_to_reach)
+            analyzer = MapAnalyzer(self.data, self.settings, self.allocation, self.locations_to_reach, self.connectivity)
 
             if analyzer.success:
                 success = True
+                self.attempts = i + 1
                 logger.debug(f'Rabi-Ribi: Valid map transition and/or constraint set for Player {self.world.player} ({self.world.player_name}) found after {i+1} attempts.')
                 break
 
-            # Revert graph for next attempt
-            self.allocation.revert_graph(self.data)
-
         if not success:
             raise RuntimeError(f'Rabi-Ribi: Unable to find a valid map transition and/or constraint set for Player {self.world.player} ({self.world.player_name}) after {MAX_ATTEMPTS} attempts.')
 
         return self.allocation, analyzer
 
+    def generate_seed_parallel(self, processes: int):
+        """
+        Searches for a valid allocation with a pool of processes.
+        Every attempt shuffles a new allocation seeded from a single draw of world.random,
+        and the first valid attempt is picked, so the result does not depend on the number of processes.
+        """
+        search_random = Random(self.world.random.getrandbits(64))
+        attempt_seeds = [search_random.getrandbits(64) for _ in range(MAX_ATTEMPTS)]
+        attempts = list(enumerate(attempt_seeds))
+        batches = [attempts[start:start + PARALLEL_BATCH_SIZE] for start in range(0, MAX_ATTEMPTS, PARALLEL_BATCH_SIZE)]
+
+        attempt = None
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=_init_map_search_process,
+            initargs=(self.settings, self.locations_to_reach)
+        ) as executor:
+            # Only keep a few batches queued, so the search stops soon after finding a valid allocation.
+            # Results are read in submission order, so the first valid attempt is always picked.
+            pending = deque(executor.submit(_search_map_batch, batch) for batch in batches[:processes * 2])
+            next_batch = len(pending)
+            while len(pending) > 0:
+                attempt = pending.popleft().result()
+                if attempt is not None:
+                    executor.shutdown(cancel_futures=True)
+                    break
+                if next_batch < len(batches):
+                    pending.append(executor.submit(_search_map_batch, batches[next_batch]))
+                    next_batch += 1
+
+        if attempt is None:
+            raise RuntimeError(f'Rabi-Ribi: Unable to find a valid map transition and/or constraint set for Player {self.world.player} ({self.world.player_name}) after {MAX_ATTEMPTS} attempts.')
+
+        # Recreate the valid allocation in this process
+        self.allocation = MapAllocation(self.data, self.settings, Random(attempt_seeds[attempt]))
+        self.shuffle()
+        analyzer = MapAnalyzer(self.data, self.settings, self.allocation, self.locations_to_reach, self.connectivity)
+        if not analyzer.success:
+            raise RuntimeError(f'Rabi-Ribi: Map allocation found in parallel search is invalid for Player {self.world.player} ({self.world.player_name}).')
+        self.attempts = attempt + 1
+        logger.debug(f'Rabi-Ribi: Valid map transition and/or constraint set for Player {self.world.player} ({self.world.player_name}) found after {attempt+1} attempts.')
+
+        return self.allocation, analyzer
+
     def shuffle(self):
         self.allocation.shuffle(self.data, self.settings)
 
 class MapAnalyzer(Analyzer):
     """The MapAnalyzer class is an extension of the Analyzer class with simplified validation,
     only ensuring that all locations are reachable if the player has all upgrades."""
-    def __init__(self, data: RandomizerData, settings: Any, allocation: MapAllocation, locations_to_reach: set[str]):
+    def __init__(self, data: RandomizerData, settings: Any, allocation: MapAllocation, locations_to_reach: set[str],
+                 connectivity: MapConnectivity):
         self.data = data
         self.settings = settings
         self.allocation = allocation
         self.locations_to_reach = locations_to_reach
+        self.connectivity = connectivity
 
         # Disable the existing analyzer's visualizer
         self.visualize = False
@@ -223,57 +375,80 @@ class MapAnalyzer(Analyzer):
             self.error_message = 'Not all warps reachable.'
             return False
 
-        if not self.verify_any_location_reachable(starting_variables, backward_exitable):
+        # Discard allocations where the locations are not even connected before running the full analysis.
+        # Only done when all locations must be reachable, as the check almost never fails otherwise.
+        ap_options: RabiRibiOptions = self.settings.ap_options
+        if ap_options.accessibility == Accessibility.option_full:
+            if not self.verify_all_locations_reachable(self.connectivity.get_connected_locations(self.allocation)):
+                self.error_message = 'Not all locations are connected.'
+                return False
+
+        # Search once without items, then continue the same search after obtaining all upgrades
+        reachability = self.iterate_reachable_items(starting_variables, backward_exitable)
+        reachable, _, _, _ = next(reachability)
+        if not self.verify_any_location_reachable(reachable):
             self.error_message = 'No locations are reachable at the start.'
             return False
 
-        ap_options: RabiRibiOptions = self.settings.ap_options
+        reachable, _, _, _ = reachability.send(self.data.must_be_reachable)
+        reachability.close()
+
+        item_location_reachable = self.get_item_locations_reachable(reachable)
         if ap_options.accessibility == Accessibility.option_full:
-            if not self.verify_all_locations_reachable(starting_variables, backward_exitable):
+            if not self.verify_all_locations_reachable(item_location_reachable):
                 self.error_message = 'Not all locations are reachable.'
                 return False
-        elif not self.verify_most_locations_reachable(starting_variables, backward_exitable):
+        elif not self.verify_most_locations_reachable(item_location_reachable):
             self.error_message = 'Many locations are not reachable.'
             return False
 
         return True
 
-    def verify_any_location_reachable(self, starting_variables, backward_exitable):
-        """Verifies that at least one location is reachable without items."""
-        reachable, _, _, _ = self.verify_reachable_items(starting_variables, backward_exitable)
+    def get_item_locations_reachable(self, reachable: list[str]) -> set[str]:
+        """Converts item locations back to actual names."""
+        return {game_data.get_location_ap_name(name[4:]) for name in reachable if name.startswith('LOC_')}
 
-        # Convert item locations back to actual names
-        item_location_reachable = {game_data.get_location_ap_name(name[4:]) for name in reachable if name.startswith('LOC_')}
+    def verify_any_location_reachable(self, reachable: list[str]):
+        """Verifies that at least one location is reachable without items."""
+        item_location_reachable = self.get_item_locations_reachable(reachable)
         return len(item_location_reachable) > 0
 
-    def verify_all_locations_reachable(self, starting_variables, backward_exitable):
+    def verify_all_locations_reachable(self, item_location_reachable: set[str]):
         """Verifies that all locations are reachable if player has all items."""
-        # Mark all upgrades as obtained already
-        variables = dict(starting_variables)
-        for item in self.data.must_be_reachable:
-            variables[item] = True
-
-        reachable, _, _, _ = self.verify_reachable_items(variables, backward_exitable)
-
-        # Convert item locations back to actual names
-        item_location_reachable = {game_data.get_location_ap_name(name[4:]) for name in reachable if name.startswith('LOC_')}
-
         return self.locations_to_reach.issubset(item_location_reachable)
 
     # TODO: Remove this after eggs can be placed in other worlds.
-    def verify_most_locations_reachable(self, starting_variables, backward_exitable):
+    def verify_most_locations_reachable(self, item_location_reachable: set[str]):
         """Verifies that most locations are reachable if player has all items."""
-        # Mark all upgrades as obtained already
-        variables = dict(starting_variables)
-        for item in self.data.must_be_reachable:
-            variables[item] = True
-
-        reachable, _, _, _ = self.verify_reachable_items(variables, backward_exitable)
-
-        # Convert item locations back to actual names
-        item_location_reachable = {game_data.get_location_ap_name(name[4:]) for name in reachable if name.startswith('LOC_')}
         missing_locations = self.locations_to_reach - item_location_reachable
 
         # For now, require at least 60% of locations to be reachable
         percentage_missing = len(missing_locations) / len(self.locations_to_reach)
-        return percentage_missing < 0.4
\ No newline at end of file
+        return percentage_missing < 0.4
+
+class MapSearchWorker(object):
+    """The state of a process of the parallel map search, created once by the initializer of the process."""
+    current: "MapSearchWorker | None" = None
+
+    def __init__(self, settings: Any, locations_to_reach: set[str]):
+        self.data = RandomizerData(settings)
+        self.settings = settings
+        self.locations_to_reach = locations_to_reach
+        self.connectivity = MapConnectivity(self.data)
+
+    def search_batch(self, batch: list[tuple[int, int]]) -> int | None:
+        """Returns the first attempt in the batch that results in a valid allocation, or None."""
+        for attempt, seed in batch:
+            allocation = MapAllocation(self.data, self.settings, Random(seed))
+            allocation.shuffle(self.data, self.settings)
+            analyzer = MapAnalyzer(self.data, self.settings, allocation, self.locations_to_reach, self.connectivity)
+            if analyzer.success:
+                return attempt
+        return None
+
+def _init_map_search_process(settings: Any, locations_to_reach: set[str]):
+    MapSearchWorker.current = MapSearchWorker(settings, locations_to_reach)
+
+def _search_map_batch(batch: list[tuple[int, int]]) -> int | None:
+    assert MapSearchWorker.current is not None
+    return MapSearchWorker.current.search_batch(batch)
@@ -12,9 +12,6 @@ class Allocation(object):
     # dict: incoming_edges  [location -> list(Edge)]
     # list: edges  [list(Edge)]   <-- indexed by edge_id
     #
-    # dict: modified_outgoing [location : str -> initial_len : int]
-    # dict: modified_incoming [location : str -> initial_len : int]
-    #
     # list: walking_left_transitions  (MapTransition objects)
     #
     # dict: edge_replacements  [(from_location, to_location) -> template_changes]
@@ -134,51 +131,44 @@ class Allocation(object):
             self.random.shuffle(self.walking_left_transitions)
 
     def construct_graph(self, data, settings):
+        # AP Change: The graph is an overlay on the initial graph in data, which is never modified.
+        # Edges that differ from data.initial_edges are picked from the edges created by
+        # preprocess_overlay_edges, and only the edge lists of locations with map transitions are replaced.
+        # This way, allocations can share the data.
         edges = list(data.initial_edges)
         edge_id = data.replacement_edges_id
 
         originalNEdges = data.transition_edges_id
-        outgoing_edges = data.initial_outgoing_edges
-        incoming_edges = data.initial_incoming_edges
-        modified_outgoing = dict()
-        modified_incoming = dict()
+        outgoing_edges = dict(data.initial_outgoing_edges)
+        incoming_edges = dict(data.initial_incoming_edges)
 
         # Edge Constraints
+        # AP Change: The initial edges already have the original constraints, so only replacements are applied
         edge_replacements = self.edge_replacements
+        template_change_edges = data.template_change_edges
         for original_constraint in data.edge_constraints:
             key = (original_constraint.from_location, original_constraint.to_location)
             if key in edge_replacements:
-                constraint = edge_replacements[key]
-            else:
-                constraint = original_constraint
-            edges[edge_id].satisfied = constraint.prereq_lambda
-            edges[edge_id].satisfied_expr = constraint.prereq_expression
+                edges[edge_id] = template_change_edges[edge_replacements[key]]
             edge_id += 1
 
         # Map Transitions
         # AP Change: Moved shuffling of map transitions to a separate method in init
         if settings.shuffle_map_transitions:
+            transition_edges = data.transition_edges
             edge_id = data.transition_edges_id
             for ltr in self.walking_left_transitions:
-                edges[edge_id].to_location = ltr.origin_location
-                edges[edge_id+1].from_location = ltr.origin_location
+                edges[edge_id] = transition_edges[(edge_id, ltr.origin_location)]
+                edges[edge_id+1] = transition_edges[(edge_id+1, ltr.origin_location)]
                 edge_id += 2
 
         for edge in edges[originalNEdges:]:
-            from_loc = edge.from_location
-            to_loc = edge.to_location
-            if from_loc not in modified_outgoing:
-                modified_outgoing[from_loc] = len(outgoing_edges[from_loc])
-            if to_loc not in modified_incoming:
-                modified_incoming[to_loc] = len(incoming_edges[to_loc])
-            outgoing_edges[edge.from_location].append(edge.edge_id)
-            incoming_edges[edge.to_location].append(edge.edge_id)
+            outgoing_edges[edge.from_location] = outgoing_edges[edge.from_location] + [edge.edge_id]
+            incoming_edges[edge.to_location] = incoming_edges[edge.to_location] + [edge.edge_id]
 
         self.edges = edges
         self.outgoing_edges = outgoing_edges
         self.incoming_edges = incoming_edges
-        self.modified_outgoing = modified_outgoing
-        self.modified_incoming = modified_incoming
 
     def choose_starting_location(self, data, settings):
         if settings.shuffle_start_location:
@@ -191,11 +181,8 @@ class Allocation(object):
             self.start_location = data.start_locations[0]
 
     def revert_graph(self, data):
-        def revert_edges(changes: dict, loc_edges: dict):
-            for loc, edge_count in changes.items():
-                loc_edges[loc] = loc_edges[loc][:edge_count]
-        revert_edges(self.modified_incoming, data.initial_incoming_edges)
-        revert_edges(self.modified_outgoing, data.initial_outgoing_edges)
+        # AP Change: construct_graph no longer modifies data, so there is nothing to revert.
+        pass
 
     def shift_eggs_to_hard_to_reach(self, data, settings, reachable_items, hard_to_reach_items):
         reachable_items = set(reachable_items)
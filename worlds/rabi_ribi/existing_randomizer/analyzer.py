@@ -156,6 +156,20 @@ class Analyzer(object):
 
 
     def verify_reachable_items(self, starting_variables, backward_exitable):
+        # AP Change: Implemented with iterate_reachable_items, stopping at the first fixpoint
+        iterator = self.iterate_reachable_items(starting_variables, backward_exitable)
+        results = next(iterator)
+        # Let the iterator finish without additional variables, which renders the visualization
+        next(iterator, None)
+        return results
+
+    def iterate_reachable_items(self, starting_variables, backward_exitable):
+        """
+        AP Change: Generator version of verify_reachable_items.
+        Yields (reachable, unreachable, levels, variables) whenever nothing new can be reached.
+        Sending a list of variable names marks them as obtained, and continues the search from the
+        current state instead of starting over. Sending None ends the search.
+        """
         if self.visualize:
             from visualizer import Visualization
             vis = Visualization(self.settings)
@@ -174,6 +188,11 @@ class Analyzer(object):
         # Persistent variables
         variables = dict(starting_variables)
         untraversable_edges = data.initial_untraversable_edges.copy()
+        # AP Change: Also keep the variables as a bitset, to evaluate the constraints compiled to bitmasks
+        variable_bits = data.variable_bits
+        pseudo_item_masks = data.pseudo_item_masks
+        alternate_condition_masks = data.alternate_condition_masks
+        bitset = variables_to_bitset(variables, variable_bits)
         unreached_pseudo_items = dict(data.pseudo_items)
         unsatisfied_item_conditions = dict(data.alternate_conditions)
         edge_progression_default = edge_progression['DEFAULT'].copy()
@@ -217,10 +236,12 @@ class Analyzer(object):
                 # 0 Part A: Handle pseudo-items
                 to_remove.clear()
                 for target, condition in unreached_pseudo_items.items():
-                    if condition(variables):
+                    masks = pseudo_item_masks.get(target)
+                    if evaluate_expression_masks(masks, bitset) if masks is not None else condition(variables):
                         current_level_part1.append(target)
                         to_remove.append(target)
                         variables[target] = True
+                        bitset |= variable_bits.get(target, 0)
                         has_changes = True
 
                 for target in to_remove:
@@ -229,10 +250,12 @@ class Analyzer(object):
                 # 0 Part B: Handle alternate constraints for items
                 to_remove.clear()
                 for target, condition in unsatisfied_item_conditions.items():
-                    if condition(variables):
+                    masks = alternate_condition_masks.get(target)
+                    if evaluate_expression_masks(masks, bitset) if masks is not None else condition(variables):
                         if not variables[target]:
                             current_level_part1.append(target)
                             variables[target] = True
+                            bitset |= variable_bits.get(target, 0)
                             has_changes = True
                         to_remove.append(target)
 
@@ -250,7 +273,8 @@ class Analyzer(object):
             new_variables_edges |= edge_progression_default
             for edge_id in new_variables_edges:
                 edge = edges[edge_id]
-                if edge.satisfied(variables):
+                masks = edge.satisfied_masks
+                if evaluate_expression_masks(masks, bitset) if masks is not None else edge.satisfied(variables):
                     newly_traversable_edges.add(edge_id)
                     if edge.from_location in forward_enterable:
                         forward_frontier.add(edge.from_location)
@@ -376,9 +400,21 @@ class Analyzer(object):
 
             for node in current_level_part2:
                 variables[node] = True
+                bitset |= variable_bits.get(node, 0)
 
             if len(current_level_part1) == 0 and len(current_level_part2) == 0:
-                break
+                # AP Change: Report the current results, and continue if more variables are obtained
+                reachable = sorted(name for name, value in variables.items() if value)
+                unreachable = sorted(name for name, value in variables.items() if not value)
+                additional_variables = yield reachable, unreachable, levels, variables
+                if additional_variables is None:
+                    break
+                for name in additional_variables:
+                    if not variables[name]:
+                        variables[name] = True
+                        bitset |= variable_bits.get(name, 0)
+                        previous_new_variables.add(name)
+                continue
             levels.append(current_level_part1)
             levels.append(current_level_part2)
             previous_new_variables.update(current_level_part2)
@@ -411,16 +447,12 @@ class Analyzer(object):
                 level = min(level, 19)
                 vis.set_node_color(loc, colors[level])
             vis.render()
-        reachable = sorted(name for name, value in variables.items() if value)
-        unreachable = sorted(name for name, value in variables.items() if not value)
 
         #if self.visualize:
             #for en, level in enumerate(levels):
                 #print_ln('LEVEL %d' % en)
                 #print_ln(level)
 
-        return reachable, unreachable, levels, variables
-
     def analyze_with_variable_set(self, starting_variables):
         result, backward_exitable = self.verify_warps_reachable(starting_variables, diff_analysis=True)
         reachable, unreachable, levels, ending_variables = self.verify_reachable_items(starting_variables, backward_exitable)
@@ -0,0 +1,22 @@
+"""
+AP Change: Writing the files of the on-disk caches (see constraintcache.py and diffcache.py).
+"""
+import os, tempfile
+
+def write_cache_file_atomically(cache_file, data: bytes) -> None:
+    """
+    Writes data to cache_file. The data is written to a temporary file first, so other processes
+    never read a partial cache. Failing to write the cache is not an error.
+    """
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(cache_file), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp_file, cache_file)
+        except BaseException:
+            os.remove(temp_file)
+            raise
+    except OSError:
+        pass
@@ -0,0 +1,81 @@
+"""
+AP Change: On-disk cache for the parsed edge, item and template constraints.
+
+Parsing the constraint files makes up most of the time spent constructing the randomizer data,
+so the parsed expression trees are pickled into the Archipelago cache directory.
+The cache file name is a hash of the constraint files, the settings that affect parsing and the
+definitions the expressions are parsed against, so stale caches are never loaded.
+
+The cache only stores the constraint and expression classes, and no code: the expressions are compiled
+again when they are unpickled, and the unpickler refuses every other global.
+"""
+import hashlib, importlib.util, pickle
+from typing import Any, Optional
+
+from Utils import cache_path
+
+from . import utility
+from .cachefile import write_cache_file_atomically
+from ..resource_utility import load_text_file
+
+# Increment when the parsing of constraints, or the pickled classes, change in a way
+# that is not reflected by the hashed files.
+CONSTRAINT_CACHE_VERSION = 3
+
+# The classes of the parsed constraints, the only globals the constraint cache may contain.
+_CONSTRAINT_CLASSES = frozenset({
+    utility.EdgeConstraintData,
+    utility.ItemConstraintData,
+    utility.TemplateConstraintData,
+    utility.ExpressionLambda,
+    utility.ExpressionData,
+    utility.OpLit,
+    utility.OpNot,
+    utility.OpOr,
+    utility.OpAnd,
+    utility.OpBacktrack,
+})
+
+class _ConstraintUnpickler(pickle.Unpickler):
+    def find_class(self, module: str, name: str) -> Any:
+        if module == utility.__name__ and getattr(utility, name, None) in _CONSTRAINT_CLASSES:
+            return getattr(utility, name)
+        raise pickle.UnpicklingError(f'Global {module}.{name} is forbidden in the constraint cache')
+
+def get_constraint_cache_key(source_files, *key_data) -> str:
+    """
+    Hashes the given source files and the string representation of everything else that affects parsing.
+    """
+    hash = hashlib.sha256()
+    hash.update(str(CONSTRAINT_CACHE_VERSION).encode())
+    hash.update(importlib.util.MAGIC_NUMBER)
+    for source_file in source_files:
+        hash.update(source_file.encode())
+        hash.update(load_text_file(source_file).encode())
+    for data in key_data:
+        hash.update(str(data).encode())
+    return hash.hexdigest()
+
+def get_constraint_cache_file(cache_key) -> str:
+    return cache_path('rabi_ribi', f'constraints_{cache_key[:32]}.pickle')
+
+def load_cached_constraints(cache_key) -> Optional[Any]:
+    """
+    Returns the constraints stored under cache_key, or None if there is no valid cache.
+    """
+    try:
+        with open(get_constraint_cache_file(cache_key), 'rb') as file:
+            stored_key, constraints = _ConstraintUnpickler(file).load()
+    except Exception:
+        # Missing, corrupted or incompatible caches are regenerated.
+        return None
+    if stored_key != cache_key:
+        return None
+    return constraints
+
+def save_cached_constraints(cache_key, constraints) -> None:
+    """
+    Stores the constraints under cache_key. Failing to write the cache is not an error.
+    """
+    cache_file = get_constraint_cache_file(cache_key)
+    write_cache_file_atomically(cache_file, pickle.dumps((cache_key, constraints), protocol=pickle.HIGHEST_PROTOCOL))
@@ -1,7 +1,9 @@
-import ast, re, os
+import ast, copy, re, os, threading
+from collections import defaultdict
 from typing import Any, Dict, List
 
 from .utility import *
+from .constraintcache import get_constraint_cache_key, load_cached_constraints, save_cached_constraints
 from ..options import RabiRibiOptions
 from ..resource_utility import resource_listdir
 
@@ -163,11 +165,14 @@ def define_alternate_conditions(settings, variable_names_set, default_expression
         })
 
     # AP Change: Fixed reuse of d (dict[str, str])
+    # AP Change: Also return the parsed expressions, so they can be compiled to bitmasks
     callable_d = {}
+    expressions = {}
     for key in d.keys():
         if type(d[key]) == str:
-            callable_d[key] = parse_expression_lambda(d[key], variable_names_set, default_expressions)
-    return callable_d
+            expressions[key] = parse_expression(d[key], variable_names_set, default_expressions)
+            callable_d[key] = ExpressionLambda(expressions[key]).expression_lambda
+    return callable_d, expressions
 
 
 def define_default_expressions(variable_names_set):
@@ -328,9 +333,13 @@ def enough_amu_food(variables, amount):
 
 
 def evaluate_pseudo_item_constraints(pseudo_items, variable_names_set, default_expressions):
+    # AP Change: Return the parsed expressions, so they can be compiled to bitmasks
+    expressions = {}
     for key in pseudo_items.keys():
         if type(pseudo_items[key]) == str:
-            pseudo_items[key] = parse_expression_lambda(pseudo_items[key], variable_names_set, default_expressions)
+            expressions[key] = parse_expression(pseudo_items[key], variable_names_set, default_expressions)
+            pseudo_items[key] = ExpressionLambda(expressions[key]).expression_lambda
+    return expressions
 
 
 def parse_locations_and_items():
@@ -574,6 +583,19 @@ def parse_template_constraints(settings, locations_set, variable_names_set, defa
                 src_t.conflicts_names.append(cmp_t.name)
     return template_constraints
 
+def get_constraint_files(settings):
+    """
+    AP Change: Returns the files read by parse_edge_constraints, parse_item_constraints and parse_template_constraints.
+    """
+    files = [
+        os.path.join('existing_randomizer', 'constraints_graph.txt'),
+        os.path.join('existing_randomizer', 'constraints.txt'),
+        os.path.join('existing_randomizer', 'maptemplates', 'template_constraints.txt'),
+    ]
+    if settings.shuffle_start_location:
+        files.append(os.path.join('existing_randomizer', 'maptemplates', 'start_rando_template_constraints.txt'))
+    return files
+
 
 def read_config(default_setting_flags, item_locations_set, shufflable_gift_items_set, config_flags_set, predefined_additional_items_set, settings):
     lines = read_file_and_strip_comments(settings.config_file)
@@ -723,57 +745,50 @@ def parse_item_from_string(line):
     item = Item(ast.literal_eval(pos), int(areaid), int(itemid), name)
     return item
 
-class RandomizerData(object):
-    # Attributes:
-    #
-    # Raw Information
-    #
-    # dict: setting_flags   (setting_name -> bool)
-    # dict: pseudo_items   (psuedo_item_name -> condition)
-    # dict: additional_items   (item_name -> item_id)
-    # dict: locations   (location -> location_type)
-    # list: items   (Item objects)
-    # dict: alternate_conditions   (item_name -> constraint lambda)
-    # list: edge_constraints   (EdgeConstraintData objects)
-    # list: item_constraints   (ItemConstraintData objects)
-    # list: map_transitions   (MapTransition objects)
-    # list: start_locations   (StartLocation objects)
-    #
-    # obj: config_data  (ConfigData object. Used for analysis printing, not used in generation.)
-    #
-    # Intermediate Information
-    #
-    # list: item_names
-    # list: location_list
-    # set: locations_set
-    #
-    #
-    # Preprocessed - Based on settings
-    #
-    # dict: configured_variables        (variable_name -> value)
-    # dict: pessimistic_variables        (variable_name -> value)
-    # list: graph_vertices           (list(node_name))
-    # dict: item_locations_in_node   (node_name -> list(item_name))
-    # list: initial_edges             (edge_id -> GraphEdge)
-    # dict: initial_outgoing_edges     (node_name -> list(edge_id))
-    # dict: initial_incoming_edges     (node_name -> list(edge_id))
-    #
-    #
-    # Preprocessed Information
-    #
-    # list: items_to_allocate
-    # dict: edge_progression (variable_name -> set(edge_id))
-    #
-    # list: walking_left_transitions
-    # list: walking_right_transitions
-    #
-    # int: nLocations
-    # int: nNormalItems
-    # int: nAdditionalItems
-    # int: originalNEggs
-    # int: nEggs
-
-
+# AP Change: The parsed data only depends on a few settings, so it is cached and shared
+# between the RandomizerData of every world, instead of being parsed again for each of them.
+_static_data_cache: Dict[tuple, "StaticRandomizerData"] = {}
+_static_data_lock = threading.Lock()
+
+def get_static_data_key(settings) -> tuple:
+    return (bool(settings.open_mode), bool(settings.shuffle_gift_items), bool(settings.shuffle_start_location))
+
+def get_static_data(settings) -> "StaticRandomizerData":
+    key = get_static_data_key(settings)
+    with _static_data_lock:
+        static_data = _static_data_cache.get(key)
+        if static_data is None:
+            static_data = StaticRandomizerData(settings)
+            _static_data_cache[key] = static_data
+    return static_data
+
+def preprocess_variables_with_settings(variable_names_list, setting_flags):
+    # Mark all unconstrained pseudo-items
+    variables: Dict[str, bool] = dict((name, False) for name in variable_names_list)
+    variables.update(setting_flags)
+
+    to_remove = set()
+    unreached_pseudo_items = dict()
+    has_changes = True
+    while has_changes:
+        has_changes = False
+        to_remove.clear()
+        for target, condition in unreached_pseudo_items.items():
+            if condition(variables):
+                variables[target] = True
+                to_remove.add(target)
+                has_changes = True
+
+        for target in to_remove:
+            del unreached_pseudo_items[target]
+
+    return variables
+
+class StaticRandomizerData(object):
+    """
+    AP Change: The part of RandomizerData which only depends on open_mode, shuffle_gift_items and
+    shuffle_start_location. Instances are shared between worlds, so they must not be modified after creation.
+    """
     def __init__(self, settings):
         self.default_config_flags = define_config_flags()
         self.pessimistic_config_flags = dict((key, False) for key in self.default_config_flags.keys())
@@ -795,9 +810,7 @@ class RandomizerData(object):
             self.default_map_modifications += self.gift_item_map_modifications
             for item in self.shufflable_gift_items:
                 del self.additional_items[item.name]
-        shufflable_gift_items_set = set(item.name for item in self.shufflable_gift_items)
-
-        self.nHardToReach = settings.num_hard_to_reach
+        self.shufflable_gift_items_set = set(item.name for item in self.shufflable_gift_items)
 
         # Do some preprocessing of variable names
         self.item_names = [item.name for item in self.items]
@@ -816,52 +829,65 @@ class RandomizerData(object):
             fail('Repeat names detected: %s' % ','.join(repeat_names))
 
         self.locations_set = set(self.location_list)
-        items_set = set(self.item_names)
-
-        # More config loading
-        config_flags_set = set(self.default_config_flags.keys())
-        self.configured_setting_flags, self.to_shuffle, self.must_be_reachable, self.included_additional_items, self.config_data = \
-            read_config(self.default_setting_flags, items_set, shufflable_gift_items_set, config_flags_set, set(self.all_additional_items.keys()), settings)
+        self.items_set = set(self.item_names)
 
         default_expressions = define_default_expressions(variable_names_set)
-        evaluate_pseudo_item_constraints(self.pseudo_items, variable_names_set, default_expressions)
-        self.alternate_conditions = define_alternate_conditions(settings, variable_names_set, default_expressions)
-        self.edge_constraints = parse_edge_constraints(self.locations_set, variable_names_set, default_expressions)
-        self.item_constraints = parse_item_constraints(settings, items_set, shufflable_gift_items_set, self.locations_set, variable_names_set, default_expressions)
-        self.template_constraints = parse_template_constraints(settings, self.locations_set, variable_names_set, default_expressions, self.edge_constraints)
+        pseudo_item_expressions = evaluate_pseudo_item_constraints(self.pseudo_items, variable_names_set, default_expressions)
+        self.alternate_conditions, alternate_condition_expressions = define_alternate_conditions(settings, variable_names_set, default_expressions)
+        self.edge_constraints, self.item_constraints, self.template_constraints = \
+            self.load_constraints(settings, variable_names_set, default_expressions)
 
-        self.preprocess_data(settings)
-        self.preprocess_variables(settings)
+        self.preprocess_map_transitions(settings)
+        self.pessimistic_variables = preprocess_variables_with_settings(self.variable_names_list, self.pessimistic_setting_flags)
         self.preprocess_graph(settings)
-
-        self.preprocess_backward_reachable(settings)
         self.preprocess_template_constraints(settings)
+        self.preprocess_expression_masks(pseudo_item_expressions, alternate_condition_expressions)
+        self.preprocess_overlay_edges()
+
+    def load_constraints(self, settings, variable_names_set, default_expressions):
+        # AP Change: Load the parsed constraints from the on-disk cache if possible
+        cache_key = get_constraint_cache_key(
+            get_constraint_files(settings),
+            get_static_data_key(settings),
+            sorted(resource_listdir(DIR_TEMPLATE_PATCH_FILES)),
+            self.variable_names_list,
+            sorted((name, str(expression)) for name, expression in default_expressions.items()),
+        )
+        constraints = load_cached_constraints(cache_key)
+        if constraints is None:
+            edge_constraints = parse_edge_constraints(self.locations_set, variable_names_set, default_expressions)
+            item_constraints = parse_item_constraints(settings, self.items_set, self.shufflable_gift_items_set, self.locations_set, variable_names_set, default_expressions)
+            template_constraints = parse_template_constraints(settings, self.locations_set, variable_names_set, default_expressions, edge_constraints)
+            constraints = edge_constraints, item_constraints, template_constraints
+            save_cached_constraints(cache_key, constraints)
+        return constraints
+
+    def preprocess_map_transitions(self, settings):
+        # map_transitions
+        walking_right_transitions = [tr for tr in self.map_transitions if tr.walking_right]
+        walking_right_transitions.sort(key=lambda tr : (tr.origin_location, tr.rect))
+        walking_left_transitions = []
 
-    def preprocess_variables_with_settings(self, setting_flags, settings):
-        # Mark all unconstrained pseudo-items
-        variables: Dict[str, bool] = dict((name, False) for name in self.variable_names_list)
-        variables.update(setting_flags)
-
-        to_remove = set()
-        unreached_pseudo_items = dict()
-        has_changes = True
-        while has_changes:
-            has_changes = False
-            to_remove.clear()
-            for target, condition in unreached_pseudo_items.items():
-                if condition(variables):
-                    variables[target] = True
-                    to_remove.add(target)
-                    has_changes = True
+        left_transition_dict = dict(( (tr.area_current, tr.entry_current), tr )
+            for tr in self.map_transitions if not tr.walking_right)
 
-            for target in to_remove:
-                del unreached_pseudo_items[target]
+        for rtr in walking_right_transitions:
+            key = (rtr.area_target, rtr.entry_target)
+            ltr = left_transition_dict.get(key)
+            if ltr == None:
+                fail('Matching map transition not found for %s' % rtr.origin_location)
+                break
+            if rtr.area_current != ltr.area_target or rtr.entry_current != ltr.entry_target:
+                fail("Map transitions don't match! %s vs %s" % (rtr.origin_location, ltr.origin_location))
+                break
+            walking_left_transitions.append(ltr)
+            del left_transition_dict[key]
 
-        return variables
+        for ltr in left_transition_dict.values():
+            fail('Matching map transition not found for %s' % ltr.origin_location)
 
-    def preprocess_variables(self, settings):
-        self.configured_variables = self.preprocess_variables_with_settings(self.configured_setting_flags, settings)
-        self.pessimistic_variables = self.preprocess_variables_with_settings(self.pessimistic_setting_flags, settings)
+        self.walking_right_transitions = walking_right_transitions
+        self.walking_left_transitions = walking_left_transitions
 
     def preprocess_graph(self, settings):
         pessimistic_variables = self.pessimistic_variables
@@ -998,6 +1024,141 @@ class RandomizerData(object):
         self.initial_incoming_edges = initial_incoming_edges
         self.edge_progression = generate_progression_dict(self.variable_names_list, edges, keep_progression=False)
 
+    def preprocess_template_constraints(self, settings):
+        initial_template_index = dict()
+        initial_template_weights = list()
+        templates = self.template_constraints
+        total_weight = 0
+        for i in range(len(templates)):
+            t = templates[i]
+            total_weight += t.weight
+            initial_template_index[t.name] = i
+            initial_template_weights.append(total_weight)
+
+        self.initial_template_index = initial_template_index
+        self.initial_template_weights = initial_template_weights
+
+    def preprocess_expression_masks(self, pseudo_item_expressions, alternate_condition_expressions):
+        """
+        AP Change: Assigns every variable a bit, and compiles the constraints to bitmasks for the analyzer.
+        Constraints that can't be compiled keep being evaluated with their lambda.
+        """
+        variable_bits = dict((name, 1 << i) for i, name in enumerate(self.variable_names_list))
+        compile_masks = lambda expression : compile_expression_masks(expression, variable_bits)
+
+        for edge in self.initial_edges:
+            edge.satisfied_masks = compile_masks(edge.satisfied_expr)
+        for constraint in self.edge_constraints:
+            constraint.prereq_masks = compile_masks(constraint.prereq_expression)
+        for template in self.template_constraints:
+            for change in template.changes:
+                change.prereq_masks = compile_masks(change.prereq_expression)
+
+        self.variable_bits = variable_bits
+        self.pseudo_item_masks = dict((name, compile_masks(expression)) for name, expression in pseudo_item_expressions.items())
+        self.alternate_condition_masks = dict((name, compile_masks(expression)) for name, expression in alternate_condition_expressions.items())
+
+    def preprocess_overlay_edges(self):
+        """
+        AP Change: Creates every edge that an allocation can place over the initial graph, so that
+        constructing the graph of an allocation does not need to copy or modify any edges.
+        """
+        edge_ids = dict(((edge.from_location, edge.to_location), edge.edge_id)
+                        for edge in self.initial_edges[self.replacement_edges_id:self.transition_edges_id])
+        self.template_change_edges = {}
+        for template in self.template_constraints:
+            for change in template.changes:
+                edge = copy.copy(self.initial_edges[edge_ids[(change.from_location, change.to_location)]])
+                edge.satisfied = change.prereq_lambda
+                edge.satisfied_expr = change.prereq_expression
+                edge.satisfied_masks = change.prereq_masks
+                self.template_change_edges[change] = edge
+
+        self.transition_edges = {}
+        for edge_id in range(self.transition_edges_id, len(self.initial_edges), 2):
+            for ltr in self.walking_left_transitions:
+                edge1 = copy.copy(self.initial_edges[edge_id])
+                edge1.to_location = ltr.origin_location
+                edge2 = copy.copy(self.initial_edges[edge_id+1])
+                edge2.from_location = ltr.origin_location
+                self.transition_edges[(edge_id, ltr.origin_location)] = edge1
+                self.transition_edges[(edge_id+1, ltr.origin_location)] = edge2
+
+class RandomizerData(object):
+    # Attributes:
+    #
+    # Raw Information
+    #
+    # dict: setting_flags   (setting_name -> bool)
+    # dict: pseudo_items   (psuedo_item_name -> condition)
+    # dict: additional_items   (item_name -> item_id)
+    # dict: locations   (location -> location_type)
+    # list: items   (Item objects)
+    # dict: alternate_conditions   (item_name -> constraint lambda)
+    # list: edge_constraints   (EdgeConstraintData objects)
+    # list: item_constraints   (ItemConstraintData objects)
+    # list: map_transitions   (MapTransition objects)
+    # list: start_locations   (StartLocation objects)
+    #
+    # obj: config_data  (ConfigData object. Used for analysis printing, not used in generation.)
+    #
+    # Intermediate Information
+    #
+    # list: item_names
+    # list: location_list
+    # set: locations_set
+    #
+    #
+    # Preprocessed - Based on settings
+    #
+    # dict: configured_variables        (variable_name -> value)
+    # dict: pessimistic_variables        (variable_name -> value)
+    # list: graph_vertices           (list(node_name))
+    # dict: item_locations_in_node   (node_name -> list(item_name))
+    # list: initial_edges             (edge_id -> GraphEdge)
+    # dict: initial_outgoing_edges     (node_name -> list(edge_id))
+    # dict: initial_incoming_edges     (node_name -> list(edge_id))
+    # dict: template_change_edges      (EdgeConstraintData -> GraphEdge)  AP Change: see preprocess_overlay_edges
+    # dict: transition_edges           ((edge_id, origin_location) -> GraphEdge)
+    #
+    #
+    # Preprocessed Information
+    #
+    # list: items_to_allocate
+    # dict: edge_progression (variable_name -> set(edge_id))
+    #
+    # list: walking_left_transitions
+    # list: walking_right_transitions
+    #
+    # int: nLocations
+    # int: nNormalItems
+    # int: nAdditionalItems
+    # int: originalNEggs
+    # int: nEggs
+
+    def __init__(self, settings):
+        # AP Change: The settings independent data is parsed once and shared between instances.
+        # The graph is not modified during generation, as allocations build an overlay on it.
+        static_data = get_static_data(settings)
+        self.__dict__.update(static_data.__dict__)
+
+        self.edge_progression = defaultdict(set, static_data.edge_progression)
+
+        self.nHardToReach = settings.num_hard_to_reach
+
+        # More config loading
+        config_flags_set = set(self.default_config_flags.keys())
+        self.configured_setting_flags, self.to_shuffle, self.must_be_reachable, self.included_additional_items, self.config_data = \
+            read_config(self.default_setting_flags, self.items_set, self.shufflable_gift_items_set, config_flags_set, set(self.all_additional_items.keys()), settings)
+
+        self.preprocess_data(settings)
+        self.preprocess_variables(settings)
+
+        self.preprocess_backward_reachable(settings)
+
+    def preprocess_variables(self, settings):
+        self.configured_variables = preprocess_variables_with_settings(self.variable_names_list, self.configured_setting_flags)
+
     def preprocess_data(self, settings):
         ### For item shuffle
         to_shuffle_set = set(self.to_shuffle)
@@ -1031,33 +1192,6 @@ class RandomizerData(object):
         else:
             self.unshuffled_allocations += list(zip(unshuffled_eggs, unshuffled_eggs))
 
-        # map_transitions
-        walking_right_transitions = [tr for tr in self.map_transitions if tr.walking_right]
-        walking_right_transitions.sort(key=lambda tr : (tr.origin_location, tr.rect))
-        walking_left_transitions = []
-
-        left_transition_dict = dict(( (tr.area_current, tr.entry_current), tr )
-            for tr in self.map_transitions if not tr.walking_right)
-
-        for rtr in walking_right_transitions:
-            key = (rtr.area_target, rtr.entry_target)
-            ltr = left_transition_dict.get(key)
-            if ltr == None:
-                fail('Matching map transition not found for %s' % rtr.origin_location)
-                break
-            if rtr.area_current != ltr.area_target or rtr.entry_current != ltr.entry_target:
-                fail("Map transitions don't match! %s vs %s" % (rtr.origin_location, ltr.origin_location))
-                break
-            walking_left_transitions.append(ltr)
-            del left_transition_dict[key]
-
-        for ltr in left_transition_dict.values():
-            fail('Matching map transition not found for %s' % ltr.origin_location)
-
-        self.walking_right_transitions = walking_right_transitions
-        self.walking_left_transitions = walking_left_transitions
-
-
     def generate_variables(self):
         return dict(self.configured_variables)
 
@@ -1135,17 +1269,3 @@ class RandomizerData(object):
         self.initial_untraversable_edges = set(edge.edge_id for edge in edges) - traversable_edges
         self.pending_static_edges = pending_static_edges
         self.dynamic_edges_id = dynamic_edges_id
-
-    def preprocess_template_constraints(self, settings):
-        initial_template_index = dict()
-        initial_template_weights = list()
-        templates = self.template_constraints
-        total_weight = 0
-        for i in range(len(templates)):
-            t = templates[i]
-            total_weight += t.weight
-            initial_template_index[t.name] = i
-            initial_template_weights.append(total_weight)
-
-        self.initial_template_index = initial_template_index
-        self.initial_template_weights = initial_template_weights
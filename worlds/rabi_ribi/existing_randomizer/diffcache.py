@@ -0,0 +1,148 @@
+"""
+AP Change: Compiled map diff patches, cached on disk.
+
+Parsing the text map diffs (see converter/diffgenerator.py) dominates applying them, so each diff file
+is compiled once into runs of consecutive tile indices with their values, per area and layer, and stored
+in a compact binary file in the Archipelago cache directory. The runs are applied with slice assignments.
+The cache file name is a hash of the diff file, so stale compiled diffs are never loaded.
+"""
+import hashlib, struct, sys
+from array import array
+from typing import Optional
+
+from Utils import cache_path
+
+from .cachefile import write_cache_file_atomically
+from .converter.diffgenerator import DiffData
+from ..resource_utility import load_text_file
+
+# Increment when the compiled format changes.
+DIFF_CACHE_VERSION = 1
+DIFF_CACHE_MAGIC = b'RRDF'
+_HEADER = struct.Struct('<4sII')
+_LAYER_HEADER = struct.Struct('<hB15sII')
+
+class CompiledLayerDiff(object):
+    """
+    The tiles a diff sets in one layer of an area. The tiles starting at run_starts[i] are set to
+    the next run_lengths[i] values of values.
+    """
+    def __init__(self, run_starts, run_lengths, values):
+        self.run_starts = run_starts
+        self.run_lengths = run_lengths
+        self.values = values
+
+    @staticmethod
+    def from_diffs(diffs):
+        # Later diffs overwrite earlier ones, so only the last value of each tile is kept.
+        tile_values = {}
+        for diff in diffs:
+            for index, _coords, value in diff:
+                tile_values[index] = value
+        run_starts, run_lengths, values = array('I'), array('I'), array('h')
+        previous_index = None
+        for index in sorted(tile_values):
+            if previous_index is not None and index == previous_index + 1:
+                run_lengths[-1] += 1
+            else:
+                run_starts.append(index)
+                run_lengths.append(1)
+            values.append(tile_values[index])
+            previous_index = index
+        return CompiledLayerDiff(run_starts, run_lengths, values)
+
+    def apply(self, layer):
+        position = 0
+        for start, length in zip(self.run_starts, self.run_lengths):
+            layer[start:start + length] = self.values[position:position + length]
+            position += length
+
+class CompiledDiff(object):
+    def __init__(self, area_diffs):
+        # {areaid: {layer_name: CompiledLayerDiff}}
+        self.area_diffs = area_diffs
+
+    @staticmethod
+    def from_diff_data(diff_data):
+        return CompiledDiff(dict(
+            (areaid, dict((layer_name, CompiledLayerDiff.from_diffs(diffs)) for layer_name, diffs in layer_diffs.items()))
+            for areaid, layer_diffs in diff_data.area_diffs.items()))
+
+    def get_areaids(self):
+        return sorted(self.area_diffs.keys())
+
+    def to_bytes(self):
+        layers = [(areaid, layer_name, layer_diff)
+                  for areaid, layer_diffs in self.area_diffs.items()
+                  for layer_name, layer_diff in layer_diffs.items()]
+        data = [_HEADER.pack(DIFF_CACHE_MAGIC, DIFF_CACHE_VERSION, len(layers))]
+        for areaid, layer_name, layer_diff in layers:
+            name = layer_name.encode()
+            data.append(_LAYER_HEADER.pack(areaid, len(name), name, len(layer_diff.run_starts), len(layer_diff.values)))
+            for data_array in (layer_diff.run_starts, layer_diff.run_lengths, layer_diff.values):
+                data.append(_to_little_endian(data_array).tobytes())
+        return b''.join(data)
+
+    @staticmethod
+    def from_bytes(data):
+        magic, version, layer_count = _HEADER.unpack_from(data)
+        if magic != DIFF_CACHE_MAGIC or version != DIFF_CACHE_VERSION:
+            raise ValueError('Unsupported compiled diff')
+        view = memoryview(data)
+        position = _HEADER.size
+        area_diffs = {}
+        for _ in range(layer_count):
+            areaid, name_length, name, run_count, value_count = _LAYER_HEADER.unpack_from(data, position)
+            position += _LAYER_HEADER.size
+            arrays = []
+            for typecode, count in (('I', run_count), ('I', run_count), ('h', value_count)):
+                data_array = array(typecode)
+                size = count * data_array.itemsize
+                if position + size > len(data):
+                    raise ValueError('Truncated compiled diff')
+                data_array.frombytes(view[position:position + size])
+                arrays.append(_to_little_endian(data_array))
+                position += size
+            area_diffs.setdefault(areaid, {})[name[:name_length].decode()] = CompiledLayerDiff(*arrays)
+        if position != len(data):
+            raise ValueError('Invalid compiled diff size')
+        return CompiledDiff(area_diffs)
+
+def _to_little_endian(data_array):
+    if sys.byteorder == 'big':
+        data_array = array(data_array.typecode, data_array)
+        data_array.byteswap()
+    return data_array
+
+def get_diff_cache_file(diff_text) -> str:
+    hash = hashlib.sha256()
+    hash.update(str(DIFF_CACHE_VERSION).encode())
+    hash.update(diff_text.encode())
+    return cache_path('rabi_ribi', 'diffs', f'{hash.hexdigest()[:32]}.bin')
+
+# Compiled diffs loaded by this process, by diff file.
+_compiled_diffs: dict[str, CompiledDiff] = {}
+
+def load_compiled_diff(diff_file) -> CompiledDiff:
+    """
+    Returns the compiled diff of a diff file, compiling it and storing it in the cache if needed.
+    """
+    compiled_diff = _compiled_diffs.get(diff_file)
+    if compiled_diff is not None:
+        return compiled_diff
+    diff_text = load_text_file(diff_file)
+    cache_file = get_diff_cache_file(diff_text)
+    compiled_diff = _load_cached_diff(cache_file)
+    if compiled_diff is None:
+        compiled_diff = CompiledDiff.from_diff_data(DiffData(diff_file))
+        write_cache_file_atomically(cache_file, compiled_diff.to_bytes())
+    _compiled_diffs[diff_file] = compiled_diff
+    return compiled_diff
+
+def _load_cached_diff(cache_file) -> Optional[CompiledDiff]:
+    try:
+        with open(cache_file, 'rb') as file:
+            return CompiledDiff.from_bytes(file.read())
+    except Exception:
+        # Missing, corrupted or incompatible caches are regenerated.
+        return None
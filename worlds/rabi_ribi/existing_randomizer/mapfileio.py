@@ -1,4 +1,5 @@
 import struct
+from array import array
 from .utility import *
 
 MAP_SIZE = 100000
@@ -21,21 +22,38 @@ EGG_ID = -250
 NORMAL_BOMB_BLOCK_ID = 2
 CHAIN_BOMB_BLOCK_ID = 3
 BOMB_BLOCK_IDS = (NORMAL_BOMB_BLOCK_ID, CHAIN_BOMB_BLOCK_ID)
+# AP Change: The layers of a map file, as (StoredMapData attribute, offset, number of shorts)
+MAP_LAYERS = (
+    ('tiledata_map', MAP_COLLISION_OFFSET, MAP_SIZE),
+    ('tiledata_event', MAP_EVENTS_OFFSET, MAP_SIZE),
+    ('tiledata_roomtype', MAP_ROOMTYPE_OFFSET, MINIMAP_SIZE),
+    ('tiledata_roomcolor', MAP_ROOMCOLOR_OFFSET, MINIMAP_SIZE),
+    ('tiledata_roombg', MAP_ROOMBG_OFFSET, MINIMAP_SIZE),
+    ('tiledata_items', MAP_ITEMS_OFFSET, MAP_SIZE),
+    ('tiledata_tiles0', MAP_TILES0_OFFSET, MAP_SIZE),
+    ('tiledata_tiles1', MAP_TILES1_OFFSET, MAP_SIZE),
+    ('tiledata_tiles2', MAP_TILES2_OFFSET, MAP_SIZE),
+    ('tiledata_tiles3', MAP_TILES3_OFFSET, MAP_SIZE),
+    ('tiledata_tiles4', MAP_TILES4_OFFSET, MAP_SIZE),
+    ('tiledata_tiles5', MAP_TILES5_OFFSET, MAP_SIZE),
+    ('tiledata_tiles6', MAP_TILES6_OFFSET, MAP_SIZE),
+)
+MAP_FILE_SIZE = max(offset + size*2 for _, offset, size in MAP_LAYERS)
 
 def write_all(areaid, items, stored_data, path='.'):
-    tiledata_map = list(stored_data.tiledata_map)
-    tiledata_event = list(stored_data.tiledata_event)
-    tiledata_items = list(stored_data.tiledata_items)
-    tiledata_roomtype = list(stored_data.tiledata_roomtype)
-    tiledata_roomcolor = list(stored_data.tiledata_roomcolor)
-    tiledata_roombg = list(stored_data.tiledata_roombg)
-    tiledata_tiles0 = list(stored_data.tiledata_tiles0)
-    tiledata_tiles1 = list(stored_data.tiledata_tiles1)
-    tiledata_tiles2 = list(stored_data.tiledata_tiles2)
-    tiledata_tiles3 = list(stored_data.tiledata_tiles3)
-    tiledata_tiles4 = list(stored_data.tiledata_tiles4)
-    tiledata_tiles5 = list(stored_data.tiledata_tiles5)
-    tiledata_tiles6 = list(stored_data.tiledata_tiles6)
+    # AP Change: The layers are arrays of shorts, and only the layers items are placed in are copied.
+    # Only the layers that differ from the map file in path are written.
+    layers = dict((name, getattr(stored_data, name)) for name, _, _ in MAP_LAYERS)
+    for name in ('tiledata_map', 'tiledata_event', 'tiledata_items', 'tiledata_tiles1',
+                 'tiledata_tiles3', 'tiledata_tiles4', 'tiledata_tiles5'):
+        layers[name] = array('h', layers[name])
+    tiledata_map = layers['tiledata_map']
+    tiledata_event = layers['tiledata_event']
+    tiledata_items = layers['tiledata_items']
+    tiledata_tiles1 = layers['tiledata_tiles1']
+    tiledata_tiles3 = layers['tiledata_tiles3']
+    tiledata_tiles4 = layers['tiledata_tiles4']
+    tiledata_tiles5 = layers['tiledata_tiles5']
     
     # Note: read from stored data, write to actual data
     for item in items:
@@ -61,34 +79,15 @@ def write_all(areaid, items, stored_data, path='.'):
             # place item
             tiledata_items[index] = item.itemid
 
-    f = open(map_filename(areaid, path) , "r+b")
-    f.seek(MAP_COLLISION_OFFSET)
-    f.write(struct.pack('%dh' % MAP_SIZE, *tiledata_map))
-    f.seek(MAP_EVENTS_OFFSET)
-    f.write(struct.pack('%dh' % MAP_SIZE, *tiledata_event))
-    f.seek(MAP_ITEMS_OFFSET)
-    f.write(struct.pack('%dh' % MAP_SIZE, *tiledata_items))
-    f.seek(MAP_ROOMTYPE_OFFSET)
-    f.write(struct.pack('%dh' % MINIMAP_SIZE, *tiledata_roomtype))
-    f.seek(MAP_ROOMCOLOR_OFFSET)
-    f.write(struct.pack('%dh' % MINIMAP_SIZE, *tiledata_roomcolor))
-    f.seek(MAP_ROOMBG_OFFSET)
-    f.write(struct.pack('%dh' % MINIMAP_SIZE, *tiledata_roombg))
-    f.seek(MAP_TILES0_OFFSET)
-    f.write(struct.pack('%dh' % MAP_SIZE, *tiledata_tiles0))
-    f.seek(MAP_TILES1_OFFSET)
-    f.write(struct.pack('%dh' % MAP_SIZE, *tiledata_tiles1))
-    f.seek(MAP_TILES2_OFFSET)
-    f.write(struct.pack('%dh' % MAP_SIZE, *tiledata_tiles2))
-    f.seek(MAP_TILES3_OFFSET)
-    f.write(struct.pack('%dh' % MAP_SIZE, *tiledata_tiles3))
-    f.seek(MAP_TILES4_OFFSET)
-    f.write(struct.pack('%dh' % MAP_SIZE, *tiledata_tiles4))
-    f.seek(MAP_TILES5_OFFSET)
-    f.write(struct.pack('%dh' % MAP_SIZE, *tiledata_tiles5))
-    f.seek(MAP_TILES6_OFFSET)
-    f.write(struct.pack('%dh' % MAP_SIZE, *tiledata_tiles6))
-    f.close()
+    with open(map_filename(areaid, path), "r+b") as f:
+        file_data = bytearray(MAP_FILE_SIZE)
+        file_view = memoryview(file_data)[:f.readinto(file_data)]
+        for name, offset, size in MAP_LAYERS:
+            layer = layers[name]
+            layer_data = layer.tobytes() if isinstance(layer, array) else array('h', layer).tobytes()
+            if layer_data != file_view[offset:offset + size*2]:
+                f.seek(offset)
+                f.write(layer_data)
     
 
 def write_items(areaid, items, path='.'):
@@ -157,48 +156,54 @@ def ensure_neighboring_chain_bomb_block(tiledata_event, x, y):
     print_ln('ERROR ENSURING NEIGHBORING CHAIN BLOCK: (%d, %d)' % (x,y))
 
 
+def find_tile_indices(tiledata, value):
+    """
+    AP Change: Returns the indices of the tiles with the given value, searching with array.index
+    instead of iterating over every tile in python.
+    """
+    indices = []
+    index = -1
+    try:
+        while True:
+            index = tiledata.index(value, index + 1)
+            indices.append(index)
+    except ValueError:
+        return indices
+
+def replace_tile_values(tiledata, old_value, new_value):
+    """
+    AP Change: Replaces the tiles with old_value in place, instead of building a new layer.
+    """
+    for index in find_tile_indices(tiledata, old_value):
+        tiledata[index] = new_value
+
+
 class StoredMapData(object):
     def __init__(self, filename):
-        f = open(filename, "rb")
-        f.seek(MAP_COLLISION_OFFSET)
-        self.tiledata_map = list(struct.unpack('%dh' % MAP_SIZE, f.read(MAP_SIZE*2)))
-        f.seek(MAP_EVENTS_OFFSET)
-        self.tiledata_event = list(struct.unpack('%dh' % MAP_SIZE, f.read(MAP_SIZE*2)))
-        f.seek(MAP_ROOMTYPE_OFFSET)
-        self.tiledata_roomtype = list(struct.unpack('%dh' % MINIMAP_SIZE, f.read(MINIMAP_SIZE*2)))
-        f.seek(MAP_ROOMCOLOR_OFFSET)
-        self.tiledata_roomcolor = list(struct.unpack('%dh' % MINIMAP_SIZE, f.read(MINIMAP_SIZE*2)))
-        f.seek(MAP_ROOMBG_OFFSET)
-        self.tiledata_roombg = list(struct.unpack('%dh' % MINIMAP_SIZE, f.read(MINIMAP_SIZE*2)))
-        f.seek(MAP_ITEMS_OFFSET)
-        self.tiledata_items = list(struct.unpack('%dh' % MAP_SIZE, f.read(MAP_SIZE*2)))
-        f.seek(MAP_TILES0_OFFSET)
-        self.tiledata_tiles0 = list(struct.unpack('%dh' % MAP_SIZE, f.read(MAP_SIZE*2)))
-        f.seek(MAP_TILES1_OFFSET)
-        self.tiledata_tiles1 = list(struct.unpack('%dh' % MAP_SIZE, f.read(MAP_SIZE*2)))
-        f.seek(MAP_TILES2_OFFSET)
-        self.tiledata_tiles2 = list(struct.unpack('%dh' % MAP_SIZE, f.read(MAP_SIZE*2)))
-        f.seek(MAP_TILES3_OFFSET)
-        self.tiledata_tiles3 = list(struct.unpack('%dh' % MAP_SIZE, f.read(MAP_SIZE*2)))
-        f.seek(MAP_TILES4_OFFSET)
-        self.tiledata_tiles4 = list(struct.unpack('%dh' % MAP_SIZE, f.read(MAP_SIZE*2)))
-        f.seek(MAP_TILES5_OFFSET)
-        self.tiledata_tiles5 = list(struct.unpack('%dh' % MAP_SIZE, f.read(MAP_SIZE*2)))
-        f.seek(MAP_TILES6_OFFSET)
-        self.tiledata_tiles6 = list(struct.unpack('%dh' % MAP_SIZE, f.read(MAP_SIZE*2)))
-        f.close()
+        # AP Change: Read the whole map with a single readinto, and store each layer as an array of shorts.
+        file_data = bytearray(MAP_FILE_SIZE)
+        with open(filename, "rb") as f:
+            if f.readinto(file_data) != MAP_FILE_SIZE:
+                raise ValueError('Map file %s is too short' % filename)
+        file_view = memoryview(file_data)
+        for name, offset, size in MAP_LAYERS:
+            layer = array('h')
+            layer.frombytes(file_view[offset:offset + size*2])
+            setattr(self, name, layer)
 
     def clear_items(self):
-        self.tiledata_items = [0]*MAP_SIZE
+        self.tiledata_items = array('h', bytes(MAP_SIZE*2))
 
     def clear_eggs(self):
+        # AP Change: Only visit the egg tiles, and remove them in place.
         to_set_to_bomb_block = set()
-        for i in range(MAP_SIZE):
+        egg_indices = find_tile_indices(self.tiledata_event, EGG_EVENT_ID)
+        for i in egg_indices:
             x, y = to_position(i)
-            if self.tiledata_event[i] == EGG_EVENT_ID and self.tiledata_map[i] != 0 and \
-                    has_neighboring_bomb_block(self.tiledata_event, x, y):
+            if self.tiledata_map[i] != 0 and has_neighboring_bomb_block(self.tiledata_event, x, y):
                 to_set_to_bomb_block.add(i)
-        self.tiledata_event = [(0 if x == EGG_EVENT_ID else x) for x in self.tiledata_event]
+        for i in egg_indices:
+            self.tiledata_event[i] = 0
         for i in to_set_to_bomb_block:
             self.tiledata_event[i] = CHAIN_BOMB_BLOCK_ID
 
@@ -207,19 +212,24 @@ class StoredMapData(object):
         self.clear_eggs()
 
 
+def load_stored_map_data(areaid, source_dir='.'):
+    stored_data = StoredMapData(map_filename(areaid, source_dir))
+    stored_data.clear_items_and_eggs()
+    return stored_data
+
+
 class ItemModifier(object):
-    def __init__(self, areaids, source_dir='.'):
+    def __init__(self, areaids, source_dir='.', executor=None):
         self.areaids = list(areaids)
         self.items = dict((areaid, {}) for areaid in areaids)
 
         # AP Change: Removed dead code path
         self._set_all_dirty_flags(True)
 
-        self.stored_datas = {}
-        for areaid in self.areaids:
-            stored_data = StoredMapData(map_filename(areaid, source_dir))
-            stored_data.clear_items_and_eggs()
-            self.stored_datas[areaid] = stored_data
+        # AP Change: The areas are independent, so they can be loaded concurrently with an executor.
+        map_function = executor.map if executor is not None else map
+        stored_datas = map_function(lambda areaid: load_stored_map_data(areaid, source_dir), self.areaids)
+        self.stored_datas = dict(zip(self.areaids, stored_datas))
 
     def _set_all_dirty_flags(self, value):
         self.modified = dict((areaid, value) for areaid in self.areaids)
@@ -237,12 +247,17 @@ class ItemModifier(object):
 
     # AP Change: Removed dead code referencing dead code.
 
-    def save(self, output_dir='.'):
-        for areaid, modified in self.modified.items():
-            if not modified: continue
+    def save(self, output_dir='.', executor=None):
+        # AP Change: The areas are independent, so they can be written concurrently with an executor.
+        def save_area(areaid):
             #write_items(areaid, self.items[areaid].values(), output_dir)
             write_all(areaid, self.items[areaid].values(), self.stored_datas[areaid], path=output_dir)
 
+        modified_areaids = [areaid for areaid, modified in self.modified.items() if modified]
+        map_function = executor.map if executor is not None else map
+        # Consume the results to raise the errors of the writes.
+        list(map_function(save_area, modified_areaids))
+
         # Reset dirty flags
         self._set_all_dirty_flags(False)
 
@@ -253,13 +268,15 @@ def exists_map_files(areaids, path='.'):
             return False
     return True
 
-def grab_original_maps(source_dir='original_maps', output_dir='.'):
+def grab_original_maps(source_dir='original_maps', output_dir='.', executor=None):
     areaids = list(range(10))
     import shutil
     import os
     BACKUP_DIR = source_dir.rstrip('/')
-    for f in filter(lambda s : s.endswith('.map'), os.listdir(BACKUP_DIR)):
-        shutil.copyfile('%s/%s' % (BACKUP_DIR, f), '%s/%s' % (output_dir, f))
+    # AP Change: The maps can be copied concurrently with an executor.
+    map_function = executor.map if executor is not None else map
+    filenames = filter(lambda s : s.endswith('.map'), os.listdir(BACKUP_DIR))
+    list(map_function(lambda f: shutil.copyfile('%s/%s' % (BACKUP_DIR, f), '%s/%s' % (output_dir, f)), filenames))
 
 
 if __name__ == '__main__':
@@ -6,7 +6,7 @@ from . import backgroundrandomizer
 from .utility import *
 from .generator import Generator
 from .dataparser import RandomizerData
-from .converter import diffgenerator as diffgenerator
+from . import diffcache
 
 def parse_args():
     # AP Change: Remove versioning
@@ -155,12 +155,13 @@ def apply_fixes_for_randomizer(areaid, data):
 
 
 def apply_open_mode_fixes(areaid, data):
+    # AP Change: Replace the events in place.
     # Prologue triggers that prevent you from getting past many areas
-    data.tiledata_event = [0 if x==300 else x for x in data.tiledata_event]
+    mapfileio.replace_tile_values(data.tiledata_event, 300, 0)
 
     if areaid == 0:
         # Trigger blocking going to beach from start
-        data.tiledata_event = [0 if x==301 else x for x in data.tiledata_event]
+        mapfileio.replace_tile_values(data.tiledata_event, 301, 0)
 
 
 def apply_post_game_fixes(areaid, data):
@@ -450,16 +451,9 @@ def build_start_game_shaft(areaid, data, events_list, settings):
 
 
 def apply_diff_patch_fixes(mod, diff_patch_files):
-    def apply_diff(arrays, diffs):
-        for layer_name, diff_list in diffs.items():
-            array = arrays[layer_name]
-            for diff in diff_list:
-                for index, coords, value in diff:
-                    array[index] = value
-
-    area_arrays = {}
-    for areaid, stored_data in mod.stored_datas.items():
-        area_arrays[areaid] = {
+    # AP Change: Apply the compiled diffs (see diffcache.py), and only to the areas they modify.
+    def get_area_arrays(stored_data):
+        return {
             'roomtype': stored_data.tiledata_roomtype,
             'roomcolor': stored_data.tiledata_roomcolor,
             'roombg': stored_data.tiledata_roombg,
@@ -475,10 +469,14 @@ def apply_diff_patch_fixes(mod, diff_patch_files):
             'items': stored_data.tiledata_items
         }
 
+    area_arrays = {}
     for diff_path_file in diff_patch_files:
-        diff_data = diffgenerator.DiffData(diff_path_file)
-        for areaid, diffs in diff_data.area_diffs.items():
-            apply_diff(area_arrays[areaid], diffs)
+        compiled_diff = diffcache.load_compiled_diff(diff_path_file)
+        for areaid, layer_diffs in compiled_diff.area_diffs.items():
+            if areaid not in area_arrays:
+                area_arrays[areaid] = get_area_arrays(mod.stored_datas[areaid])
+            for layer_name, layer_diff in layer_diffs.items():
+                layer_diff.apply(area_arrays[areaid][layer_name])
 
 def pre_modify_map_data(mod, settings, diff_patch_files, config):
     # apply beginner mod
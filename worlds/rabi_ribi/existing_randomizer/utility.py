@@ -6,6 +6,7 @@ import re
 import ast
 import os
 from collections import defaultdict
+from functools import lru_cache
 from typing import Callable, Dict, List, Set
 
 from ..resource_utility import load_text_file
@@ -94,8 +95,21 @@ class EdgeConstraintData(object):
         self.from_location = from_location
         self.to_location = to_location
         self.prereq_expression = prereq_expression
-        self.prereq_lambda = ExpressionLambda(prereq_expression).expression_lambda
+        # AP Change: Keep the ExpressionLambda, so the constraint can be pickled and the lambda recreated
+        self.prereq = ExpressionLambda(prereq_expression)
+        self.prereq_lambda = self.prereq.expression_lambda
         self.prereq_literals = get_prereq_literals( prereq_expression )
+        # AP Change: Bitmasks of the prereq, assigned by StaticRandomizerData, see compile_expression_masks
+        self.prereq_masks = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['prereq_lambda']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.prereq_lambda = self.prereq.expression_lambda
 
     def __str__(self):
         return '\n'.join([
@@ -139,6 +153,8 @@ class GraphEdge(object):
         self.satisfied = constraint
         # AP Change: Store the expression so we can read the original logic in AP
         self.satisfied_expr = constraint_expr
+        # AP Change: Bitmasks of the constraint, see compile_expression_masks
+        self.satisfied_masks = None
         self.progression = progression
         self.backtrack_cost = backtrack_cost
 
@@ -150,19 +166,39 @@ class GraphEdge(object):
             'Cost: %s' % self.backtrack_cost,
         ])
     
+# AP Change: Many constraints share the same expression, so each expression is only compiled once
+@lru_cache(maxsize=None)
+def compile_expression(source):
+    return compile(source, "<node>", mode= "eval")
+
 class ExpressionLambda(object):
     def __init__(self, expression):
         self.expression = expression
-        self.expression_compile = compile(expression.compile(), "<node>", mode= "eval")
+        self.expression_compile = compile_expression(expression.compile())
         self.expression_lambda = lambda v : eval(self.expression_compile, None, {"variables": v})
 
+    # AP Change: Only pickle the expression, and compile it again when unpickling.
+    # The constraint cache never stores code that is evaluated.
+    def __getstate__(self):
+        return self.expression
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
 class ExpressionData(object):
     def __init__(self, exp):
         self.exp = exp
-        compiled = compile(exp.compile(), "<node>", mode= "eval")
+        compiled = compile_expression(exp.compile())
         self.exp_lambda = lambda v : eval(compiled, None, {"variables": v})
         self.exp_literals = get_prereq_literals( exp )
 
+    # AP Change: Only pickle the expression, and compile it again when unpickling, see ExpressionLambda
+    def __getstate__(self):
+        return self.exp
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
 class ConfigData(object):
     def __init__(self, knowledge, difficulty, settings):
         self.knowledge = knowledge
@@ -314,8 +350,9 @@ def parse_expression_logic(line, variable_names_set, default_expressions, curren
 class OpLit(object):
     def __init__(self, name):
         self.name = name
+    # AP Change: Quote the name, so an expression loaded from the constraint cache can only read variables
     def compile(self):
-        return "variables['%s']" % self.name
+        return "variables[%r]" % str(self.name)
     def evaluate(self, variables):
         return variables[self.name]
     def __str__(self):
@@ -357,6 +394,59 @@ class OpAnd(object):
         return '(%s AND %s)' % (self.exprL, self.exprR)
     __repr__ = __str__
 
+# AP Change: Compile expressions to bitmasks, so they can be evaluated against a bitset of variables
+MAX_EXPRESSION_MASK_TERMS = 64
+
+def compile_expression_masks(expression, variable_bits):
+    """
+    Converts an expression to disjunctive normal form, as a tuple of (required, forbidden) bitmasks.
+    The expression is satisfied if for any term, all required bits and none of the forbidden bits are set.
+    Returns None if the expression contains BACKTRACK or would need more than MAX_EXPRESSION_MASK_TERMS terms.
+    """
+    def convert(expression, negated):
+        if isinstance(expression, OpLit):
+            bit = variable_bits.get(expression.name)
+            if bit is None: return None
+            return [(0, bit)] if negated else [(bit, 0)]
+        if isinstance(expression, OpNot):
+            return convert(expression.expr, not negated)
+        if not isinstance(expression, (OpAnd, OpOr)):
+            return None
+        left = convert(expression.exprL, negated)
+        if left is None: return None
+        right = convert(expression.exprR, negated)
+        if right is None: return None
+        if isinstance(expression, OpAnd) != negated:
+            terms = []
+            for left_required, left_forbidden in left:
+                for right_required, right_forbidden in right:
+                    required = left_required | right_required
+                    forbidden = left_forbidden | right_forbidden
+                    # Terms that require and forbid the same variable can never be satisfied
+                    if not required & forbidden:
+                        terms.append((required, forbidden))
+        else:
+            terms = left + right
+        if len(terms) > MAX_EXPRESSION_MASK_TERMS: return None
+        return terms
+
+    terms = convert(expression, False)
+    if terms is None: return None
+    return tuple(dict.fromkeys(terms))
+
+def evaluate_expression_masks(masks, bitset):
+    for required, forbidden in masks:
+        if bitset & required == required and not bitset & forbidden:
+            return True
+    return False
+
+def variables_to_bitset(variables, variable_bits):
+    bitset = 0
+    for name, value in variables.items():
+        if value is True and name in variable_bits:
+            bitset |= variable_bits[name]
+    return bitset
+
 def backtrackEvaluate(variables, nSteps):
     # Yes, we're cheating by putting backtrack data in variables lol.
     if not variables['IS_BACKTRACKING']: return False
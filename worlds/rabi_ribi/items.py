@@ -26,6 +26,11 @@ item_table: dict[str, int] = {name: data.code for name, data in item_data_table.
 
 lookup_item_id_to_name: dict[int, str] = {data.code: item_name for item_name, data in item_data_table.items() if data.code}
 
+# Rabi-ribi item id of each item, by item id.
+lookup_item_id_to_game_id: dict[int, int] = {
+    item_data_table[item.name].code: int(item.id) for item in data.items if item_data_table[item.name].code
+}
+
 item_groups: dict[str, set[str]] = data.create_item_groups()
 
 filler_items : dict[str, int] = {
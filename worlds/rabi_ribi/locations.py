@@ -8,6 +8,14 @@ class RabiRibiLocation(Location):
 
 all_locations: dict[str, int] = {location.name: BASE_ID + location.id for location in data.locations}
 lookup_location_id_to_name: dict[int, str] = {code: name for name, code in all_locations.items()}
+location_ids_by_coordinates: dict[tuple[int, int, int], int] = {
+    (location.area_id, location.x_position, location.y_position): all_locations[location.name]
+    for location in data.locations
+}
+location_coordinates_by_id: dict[int, tuple[int, int, int]] = {
+    all_locations[location.name]: (location.area_id, location.x_position, location.y_position)
+    for location in data.locations
+}
 location_groups: dict[str, set[str]] = data.create_location_groups()
 
 @staticmethod
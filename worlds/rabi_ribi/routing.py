@@ -0,0 +1,142 @@
+"""
+This module defines RegionGraph, which finds the shortest routes through the regions of a world
+for the tracker's get_logical_path command. Walking to a region in the same area costs less than
+a map transition, and the player can warp between the warp stones of the regions they can reach.
+"""
+import heapq
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from BaseClasses import CollectionState, Entrance, Region
+from worlds.AutoWorld import World
+
+from .data import RegionData, data
+
+# Rough route costs, in regions walked.
+ENTRANCE_COST = 1
+MAP_TRANSITION_COST = 2
+WARP_COST = 3
+
+# Shortest paths to remember, by the items of the player. The tracker uses one state with glitched logic
+# and one without, so a couple of them is enough.
+MAX_CACHED_SHORTEST_PATHS = 4
+
+
+class RouteStep(NamedTuple):
+    """A step of a route. The entrance is None when the player warps to the region."""
+    region: Region
+    entrance: Optional[Entrance]
+
+
+class ShortestPaths:
+    """
+    The shortest routes from the origin region to every region the player can reach.
+    """
+
+    def __init__(self, graph: "RegionGraph", costs: list[float], previous: list[tuple[int, Optional[Entrance]] | None]):
+        self.graph = graph
+        self.costs = costs
+        # The previous region index and entrance of each region on its shortest route.
+        self.previous = previous
+
+    def can_reach(self, region: Region) -> bool:
+        index = self.graph.region_indices.get(region.name)
+        return index is not None and self.costs[index] != float("inf")
+
+    def get_route(self, region: Region) -> list[RouteStep]:
+        """
+        Returns the steps from the origin region to region, or an empty list if it cannot be reached.
+        """
+        if not self.can_reach(region):
+            return []
+        route: list[RouteStep] = []
+        index = self.graph.region_indices[region.name]
+        while self.previous[index] is not None:
+            previous_index, entrance = self.previous[index]
+            route.append(RouteStep(self.graph.regions[index], entrance))
+            index = previous_index
+        route.reverse()
+        return route
+
+
+class RegionGraph:
+    """
+    The regions and entrances of a world, as adjacency lists of region indices. Build it once the
+    regions are connected.
+    """
+
+    def __init__(self, world: World):
+        self.regions: list[Region] = list(world.get_regions())
+        self.region_indices: dict[str, int] = {region.name: index for index, region in enumerate(self.regions)}
+        self.origin_index = self.region_indices[world.origin_region_name]
+        # (region index, entrance, cost) of the exits of each region
+        self.exits: list[list[tuple[int, Entrance, int]]] = [[] for _ in self.regions]
+        for index, region in enumerate(self.regions):
+            for entrance in region.exits:
+                if entrance.connected_region is None or entrance.connected_region.name not in self.region_indices:
+                    continue
+                cost = MAP_TRANSITION_COST if self._is_map_transition(region, entrance.connected_region) \
+                    else ENTRANCE_COST
+                self.exits[index].append((self.region_indices[entrance.connected_region.name], entrance, cost))
+        self.warp_indices: list[int] = [
+            index for index, region in enumerate(self.regions)
+            if getattr(self._get_region_data(region.name), "has_warp", False)]
+        self.cached_shortest_paths: OrderedDict[frozenset[tuple[str, int]], ShortestPaths] = OrderedDict()
+
+    @staticmethod
+    def _get_region_data(region_name: str) -> Optional[RegionData]:
+        try:
+            return data.get_region_by_ap_name(region_name)
+        except KeyError:
+            return None
+
+    def _is_map_transition(self, from_region: Region, to_region: Region) -> bool:
+        """Regions in different areas of the game are connected by map transitions"""
+        from_data = self._get_region_data(from_region.name)
+        to_data = self._get_region_data(to_region.name)
+        return from_data is not None and to_data is not None and from_data.region != to_data.region
+
+    def get_shortest_paths(self, state: CollectionState, player: int) -> ShortestPaths:
+        """
+        Returns the shortest routes with the items of state, reusing them while the items of the player are unchanged.
+        """
+        key = frozenset(state.prog_items[player].items())
+        shortest_paths = self.cached_shortest_paths.get(key)
+        if shortest_paths is None:
+            shortest_paths = self._find_shortest_paths(state)
+            if len(self.cached_shortest_paths) >= MAX_CACHED_SHORTEST_PATHS:
+                self.cached_shortest_paths.popitem(last=False)
+            self.cached_shortest_paths[key] = shortest_paths
+        else:
+            self.cached_shortest_paths.move_to_end(key)
+        return shortest_paths
+
+    def _find_shortest_paths(self, state: CollectionState) -> ShortestPaths:
+        costs = [float("inf")] * len(self.regions)
+        previous: list[tuple[int, Optional[Entrance]] | None] = [None] * len(self.regions)
+        settled = [False] * len(self.regions)
+        # The player can only warp to the warp stones they can reach.
+        warp_targets = [index for index in self.warp_indices if self.regions[index].can_reach(state)]
+        warp_sources = set(warp_targets)
+
+        costs[self.origin_index] = 0
+        queue = [(0, self.origin_index)]
+        while queue:
+            cost, index = heapq.heappop(queue)
+            if settled[index]:
+                continue
+            settled[index] = True
+            for to_index, entrance, entrance_cost in self.exits[index]:
+                if settled[to_index] or cost + entrance_cost >= costs[to_index]:
+                    continue
+                if entrance.access_rule(state):
+                    costs[to_index] = cost + entrance_cost
+                    previous[to_index] = (index, entrance)
+                    heapq.heappush(queue, (costs[to_index], to_index))
+            if index in warp_sources:
+                for to_index in warp_targets:
+                    if not settled[to_index] and cost + WARP_COST < costs[to_index]:
+                        costs[to_index] = cost + WARP_COST
+                        previous[to_index] = (index, None)
+                        heapq.heappush(queue, (costs[to_index], to_index))
+        return ShortestPaths(self, costs, previous)
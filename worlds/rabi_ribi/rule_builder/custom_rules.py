@@ -10,6 +10,7 @@ from .glitched_rules import LogicState, evaluate_rule, get_indentation, get_logi
 
 from ..bases import RabiRibiWorldBase
 from ..constants import GAME_NAME
+from ..counters import AMULET_FOOD_COUNT, MAGIC_TYPE_COUNT, MAIN_GAME_TOWN_MEMBER_COUNT, TOWN_MEMBER_COUNT
 from ..items import item_groups, recruit_table, recruit_table_irisu
 from ..names import ItemName
 from ..options import *
@@ -218,20 +219,8 @@ class MagicTypesRule(rules.Rule[RabiRibiWorldBase], game=GAME_NAME):
             return curr_magic_types >= self.num_magic_types
 
         def _count_magic_types(self, state: CollectionState) -> int:
-            curr_magic_types = state.count_group_unique("Magic", self.player)
-            if self._rainbow_shot_in_logic(state):
-                curr_magic_types += 1
-            return curr_magic_types
-
-        def _rainbow_shot_in_logic(self, state: CollectionState) -> bool:
-            """Player has Rainbow Shot and it's not out of logic by options"""
-            return (
-                (
-                    self.rainbow_shot_in_logic_enabled
-                    or state.has(ItemName.glitched_logic, self.player)
-                )
-                and state.has(ItemName.easter_egg, self.player, count=5)
-            )
+            """Counts the magic types, including Rainbow Shot when it's in logic"""
+            return state.count(MAGIC_TYPE_COUNT, self.player)
 
         def _rainbow_shot_out_of_logic(self, state: CollectionState) -> bool:
             return (
@@ -243,8 +232,10 @@ class MagicTypesRule(rules.Rule[RabiRibiWorldBase], game=GAME_NAME):
         @override
         def item_dependencies(self) -> dict[str, set[int]]:
             deps = super().item_dependencies()
-            for recruit in recruit_table:
-                deps.setdefault(recruit, set()).add(id(self))
+            deps.setdefault(ItemName.easter_egg, set()).add(id(self))
+            deps.setdefault(ItemName.glitched_logic, set()).add(id(self))
+            for magic in item_groups["Magic"]:
+                deps.setdefault(magic, set()).add(id(self))
             return deps
 
         def explain_rule_glitched(self, state: CollectionState | None, glitched_state: CollectionState | None, depth: int) -> list[JSONMessagePart]:
@@ -321,7 +312,7 @@ class TownMemberCountRule(rules.Rule[RabiRibiWorldBase], game=GAME_NAME):
 
         @override
         def _evaluate(self, state: CollectionState) -> bool:
-            return state.has_from_list_unique(recruit_table, self.player, self.num_town_members)
+            return state.has(TOWN_MEMBER_COUNT, self.player, self.num_town_members)
 
         @override
         def item_dependencies(self) -> dict[str, set[int]]:
@@ -345,11 +336,9 @@ class TownMemberCountRule(rules.Rule[RabiRibiWorldBase], game=GAME_NAME):
                 assert state is not None
                 assert glitched_state is not None
                 if result == LogicState.OutOfLogic:
-                    curr_town_members = glitched_state.count_from_list_unique(
-                        recruit_table, self.player)
+                    curr_town_members = glitched_state.count(TOWN_MEMBER_COUNT, self.player)
                 else:
-                    curr_town_members = state.count_from_list_unique(
-                        recruit_table, self.player)
+                    curr_town_members = state.count(TOWN_MEMBER_COUNT, self.player)
                 messages = [
                     {"type": "text", "text": f"{indent}Has "},
                     {
@@ -373,8 +362,7 @@ class TownMemberCountRule(rules.Rule[RabiRibiWorldBase], game=GAME_NAME):
                     {"type": "text", "text": " Town Members"},
                 ]
             else:
-                curr_town_members = state.count_from_list_unique(
-                    recruit_table, self.player)
+                curr_town_members = state.count(TOWN_MEMBER_COUNT, self.player)
                 color = "green" if curr_town_members >= self.num_town_members else "salmon"
                 messages = [
                     {"type": "text", "text": "Has "},
@@ -401,7 +389,7 @@ class TownMemberCountIrisuRule(rules.Rule[RabiRibiWorldBase], game=GAME_NAME):
     class Resolved(rules.Rule.Resolved):
         @override
         def _evaluate(self, state: CollectionState) -> bool:
-            return state.has_from_list_unique(recruit_table_irisu, self.player, 15)
+            return state.has(MAIN_GAME_TOWN_MEMBER_COUNT, self.player, 15)
 
         @override
         def item_dependencies(self) -> dict[str, set[int]]:
@@ -424,11 +412,9 @@ class TownMemberCountIrisuRule(rules.Rule[RabiRibiWorldBase], game=GAME_NAME):
                 assert state is not None
                 assert glitched_state is not None
                 if result == LogicState.OutOfLogic:
-                    curr_town_members = glitched_state.count_from_list_unique(
-                        recruit_table, self.player)
+                    curr_town_members = glitched_state.count(MAIN_GAME_TOWN_MEMBER_COUNT, self.player)
                 else:
-                    curr_town_members = state.count_from_list_unique(
-                        recruit_table, self.player)
+                    curr_town_members = state.count(MAIN_GAME_TOWN_MEMBER_COUNT, self.player)
                 messages = [
                     {"type": "text", "text": f"{indent}Has "},
                     {
@@ -451,8 +437,7 @@ class TownMemberCountIrisuRule(rules.Rule[RabiRibiWorldBase], game=GAME_NAME):
                     {"type": "text", "text": " Main Game Town Members"},
                 ]
             else:
-                curr_town_members = state.count_from_list_unique(
-                    recruit_table_irisu, self.player)
+                curr_town_members = state.count(MAIN_GAME_TOWN_MEMBER_COUNT, self.player)
                 color = "green" if curr_town_members >= 15 else "salmon"
                 messages = [
                     {"type": "text", "text": "Has "},
@@ -473,93 +458,18 @@ class HasEnoughAmuletFoodRule(rules.Rule[RabiRibiWorldBase], game=GAME_NAME):
 
     @override
     def _instantiate(self, world: RabiRibiWorldBase) -> rules.Rule.Resolved:
-        has_advanced_knowledge = world.options.knowledge.value >= Knowledge.option_advanced
-        rainbow_shot_in_logic_enabled = bool(
-            world.options.rainbow_shot_in_logic.value)
         return self.Resolved(
             self.num_amulet_food,
-            has_advanced_knowledge,
-            rainbow_shot_in_logic_enabled,
             player=world.player,
             caching_enabled=getattr(world, "rule_caching_enabled", False)
         )
 
     class Resolved(rules.Rule.Resolved):
         num_amulet_food: int
-        has_advanced_knowledge: bool
-        rainbow_shot_in_logic_enabled: bool
 
-        def _count_amulet_food(self, state):
-            amulet = self._count_amulet_charges(state)
-            food = 0
-
-            if self._has_item_menu(state):
-                if state.has(ItemName.rumi_donut, self.player) or state.has("Shop Reachable", self.player):
-                    food = 1
-                    # Eating a Rumi Donut gives an amulet charge
-                    if self._can_bunny_amulet(state):
-                        amulet += 1
-                    food += self._count_normal_consumable_items(state)
-                    # Kotri's buff can save enough amulet charge for an additional amulet use
-                    if amulet >= 4 and state.has(ItemName.kotri_recruit, self.player) and \
-                            state.has_from_list_unique(recruit_table, self.player, 3):
-                        amulet += 1
-            return (amulet + food)
-
-        def _count_amulet_charges(self, state: CollectionState) -> int:
-            """Counts the number of amulet charges the player has"""
-            if state.has(ItemName.bunny_amulet, self.player) or state.has("Chapter 2", self.player):
-                if state.has(ItemName.rumi_recruit, self.player):
-                    return 4
-                if state.has("Shop Reachable", self.player) or state.has("Chapter 4", self.player):
-                    return 3
-                if state.has("Chapter 3", self.player):
-                    return 2
-                return 1
-            return 0
-
-        def _count_normal_consumable_items(self, state: CollectionState) -> int:
-            """Counts which normal consumable items the player can reach, either from locations or purchases."""
-            consumables = 0
-            if state.has(ItemName.rumi_cake, self.player) or state.has("Shop Reachable", self.player):
-                consumables += 1
-            if state.has(ItemName.cocoa_bomb, self.player) or self._can_purchase_cocoa_bomb(state):
-                consumables += 1
-            if state.has(ItemName.gold_carrot, self.player):
-                consumables += 1
-            return consumables
-
-        def _can_purchase_cocoa_bomb(self, state: CollectionState) -> bool:
-            """Player can purchase cocoa bomb"""
-            return state.has("Chapter 1", self.player) and \
-                state.has(ItemName.cocoa_recruit, self.player) and \
-                state.has_from_list_unique(recruit_table, self.player, 3)
-
-        def _can_bunny_amulet(self, state: CollectionState) -> bool:
-            """Player can use the bunny amulet"""
-            return state.has(ItemName.rumi_cake, self.player) or state.has("Shop Reachable", self.player)
-
-        def _has_item_menu(self, state: CollectionState) -> bool:
-            """Player has access to the item menu"""
-            return state.has("Chapter 1", self.player) or \
-                (self._is_at_least_advanced_knowledge(
-                    state) and self._has_3_magic_types(state))
-
-        def _has_3_magic_types(self, state: CollectionState) -> bool:
-            """Player has at least 3 types of magic"""
-            # If playing with more than 5 Easter Eggs, Rainbow Shot could be used as a magic type
-            return state.has_group_unique("Magic", self.player, 2) or \
-                (self._rainbow_shot_in_logic(state)
-                 and state.has_group_unique("Magic", self.player, 1))
-
-        def _is_at_least_advanced_knowledge(self, state: CollectionState) -> bool:
-            """Knowledge is at least advanced"""
-            return self.has_advanced_knowledge or state.has(ItemName.glitched_logic, self.player)
-
-        def _rainbow_shot_in_logic(self, state: CollectionState) -> bool:
-            """Player has Rainbow Shot and it's not out of logic by options"""
-            return (self.rainbow_shot_in_logic_enabled or state.has(ItemName.glitched_logic, self.player)) and \
-                state.has(ItemName.easter_egg, self.player, count=5)
+        def _count_amulet_food(self, state: CollectionState) -> int:
+            """Counts the amulet charges and food items the player can use"""
+            return state.count(AMULET_FOOD_COUNT, self.player)
 
         @override
         def _evaluate(self, state: CollectionState) -> bool:
@@ -570,6 +480,7 @@ class HasEnoughAmuletFoodRule(rules.Rule[RabiRibiWorldBase], game=GAME_NAME):
         def item_dependencies(self) -> dict[str, set[int]]:
             deps = super().item_dependencies()
             deps.setdefault(ItemName.bunny_amulet, set()).add(id(self))
+            deps.setdefault(ItemName.rumi_recruit, set()).add(id(self))
             deps.setdefault(ItemName.easter_egg, set()).add(id(self))
             deps.setdefault(ItemName.glitched_logic, set()).add(id(self))
 
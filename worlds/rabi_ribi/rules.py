@@ -2,6 +2,7 @@ from dataclasses import dataclass, field
 import json
 import pkgutil
 import re
+import threading
 from rule_builder import rules
 from typing import Any
 from .bases import RabiRibiWorldBase
@@ -168,43 +169,75 @@ def _parse_template_constraint(constraint: TemplateConstraint):
             from_region.name, to_region.name, rule))
 
 
+# The constraint files of the existing randomizer, converted to JSON in data/connections.json
+_connection_files: dict[str, str] = {
+    "region_connections": "constraints_graph.txt",
+    "location_connections": "constraints.txt",
+    "template_constraints": "maptemplates/template_constraints.txt",
+    "start_rando_template_constraints": "maptemplates/start_rando_template_constraints.txt",
+}
+
+
+def convert_connection_files() -> dict[str, list[Any]]:
+    """Converts the constraint files to the contents of data/connections.json"""
+    return {key: _read_file_and_convert_to_json(filename) for key, filename in _connection_files.items()}
+
+
+def _load_connections() -> dict[str, list[Any]]:
+    file_data = pkgutil.get_data(__name__, "data/connections.json")
+    assert (isinstance(file_data, bytes))
+    return json.loads(file_data.decode("utf-8-sig"))
+
+
+_connections_parsed: bool = False
+_connections_lock = threading.Lock()
+
+
 def parse_connections():
-    region_connections: list[RegionConnection] = [
-        RegionConnection(**item)
-        for item in
-        _read_file_and_convert_to_json("constraints_graph.txt")
-    ]
-
-    for connection in region_connections:
-        _parse_region_connection(connection)
-
-    location_connections: list[LocationConnection] = [
-        LocationConnection(**item)
-        for item in
-        _read_file_and_convert_to_json("constraints.txt")
-    ]
-
-    for connection in location_connections:
-        _parse_location_connection(connection)
-
-    template_constraints: list[TemplateConstraint] = [
-        TemplateConstraint(**item)
-        for item in
-        _read_file_and_convert_to_json("maptemplates/template_constraints.txt")
-    ]
-
-    for constraint in template_constraints:
-        _parse_template_constraint(constraint)
-
-    start_rando_template_constraints: list[TemplateConstraint] = [
-        TemplateConstraint(**item)
-        for item in
-        _read_file_and_convert_to_json(
-            "maptemplates/start_rando_template_constraints.txt")
-    ]
-
-    for constraint in start_rando_template_constraints:
-        _parse_template_constraint(constraint)
+    """
+    Parses the logic into Rule Builder rules on the shared data.
+    The rules do not depend on the world, so this only parses once per process.
+    """
+    global _connections_parsed
+    with _connections_lock:
+        if _connections_parsed:
+            return
+
+        connections = _load_connections()
+
+        region_connections: list[RegionConnection] = [
+            RegionConnection(**item)
+            for item in connections["region_connections"]
+        ]
+
+        for connection in region_connections:
+            _parse_region_connection(connection)
+
+        location_connections: list[LocationConnection] = [
+            LocationConnection(**item)
+            for item in connections["location_connections"]
+        ]
+
+        for connection in location_connections:
+            _parse_location_connection(connection)
+
+        template_constraints: list[TemplateConstraint] = [
+            TemplateConstraint(**item)
+            for item in connections["template_constraints"]
+        ]
+
+        for constraint in template_constraints:
+            _parse_template_constraint(constraint)
+
+        start_rando_template_constraints: list[TemplateConstraint] = [
+            TemplateConstraint(**item)
+            for item in connections["start_rando_template_constraints"]
+        ]
+
+        for constraint in start_rando_template_constraints:
+            _parse_template_constraint(constraint)
+
+        _connections_parsed = True
 
 
 can_recruit_cocoa = \
@@ -14,5 +14,13 @@ class RabiRibiSettings(Group):
         description = "Rabi-Ribi Poptracker Path"
         required = False
 
+    class MapGenerationProcesses(int):
+        """
+        The number of processes used to search for a valid map transition and constraint layout during generation.
+        0 or 1 searches in the generating process. More processes are faster with restrictive options,
+        but each process has to load the game data first, and the chosen layout differs from a search in one process.
+        """
+
     game_installation_path: GameInstallationPath = GameInstallationPath("C:/Program Files (x86)/Steam/steamapps/common/Rabi-Ribi")
-    ut_pack_path : UTPackPath | str = UTPackPath()
\ No newline at end of file
+    ut_pack_path : UTPackPath | str = UTPackPath()
+    map_generation_processes: MapGenerationProcesses = MapGenerationProcesses(0)
@@ -0,0 +1,190 @@
+import asyncio
+import time
+
+from NetUtils import NetworkItem
+
+from . import RabiRibiTestBase
+from ..client.client import POTION_START_IDS, RabiRibiContext, watcher_tick
+from ..client.memory_io import (
+    EXCLAMATION_POINT_ITEM_ID,
+    SNAPSHOT_FIELDS,
+    SNAPSHOT_RANGES,
+    RabiRibiMemoryIO,
+    SnapshotEvent,
+    get_snapshot_events
+)
+from ..client.simulator import SimulatedRabiRibi
+from ..items import item_table
+from ..data import data
+from ..locations import all_locations, location_coordinates_by_id
+from ..names import ItemName
+
+class ClientTestMemoryIO(RabiRibiTestBase):
+    def connect(self, game: SimulatedRabiRibi) -> RabiRibiMemoryIO:
+        rr_interface = RabiRibiMemoryIO(lambda: game)
+        asyncio.run(rr_interface.connect(asyncio.Event()))
+        return rr_interface
+
+    def test_snapshot_matches_simulated_game(self) -> None:
+        """
+        Ensure that the snapshot decodes the state of the game the same as the single value reads.
+        """
+        game = SimulatedRabiRibi()
+        rr_interface = self.connect(game)
+        self.assertTrue(rr_interface.read_snapshot().is_on_main_menu())
+
+        game.load_game("1234567")
+        game.pick_up_item(1, 20, 30)
+        game.collect_egg(2, 40, 50)
+        game.set_paused(True)
+        snapshot = rr_interface.read_snapshot()
+        self.assertTrue(rr_interface.is_on_correct_scenerio("1234567"))
+        self.assertFalse(snapshot.is_on_main_menu())
+        self.assertEqual((2, 40, 50), snapshot.read_player_tile_position())
+        self.assertEqual(rr_interface.read_player_tile_position(), snapshot.read_player_tile_position())
+        self.assertTrue(snapshot.does_player_have_item_id(EXCLAMATION_POINT_ITEM_ID))
+        self.assertEqual([(2, 40, 50)], snapshot.get_collected_eggs())
+        self.assertEqual(rr_interface.get_collected_eggs(), snapshot.get_collected_eggs())
+        self.assertTrue(snapshot.is_player_frozen())
+        self.assertEqual(rr_interface.is_player_frozen(), snapshot.is_player_frozen())
+        self.assertEqual(rr_interface.is_in_item_receive_animation(), snapshot.is_in_item_receive_animation())
+        self.assertFalse(snapshot.has_zero_health())
+
+        rr_interface.set_player_health_to_zero()
+        rr_interface.set_event_state(600, True)
+        snapshot = rr_interface.read_snapshot()
+        self.assertTrue(snapshot.has_zero_health())
+        self.assertTrue(snapshot.get_event_state(600))
+
+    def test_snapshot_ranges_are_small(self) -> None:
+        """
+        Ensure that the snapshot reads little more than the fields themselves.
+        """
+        field_size = sum(field_struct.size for _, _, fields in SNAPSHOT_RANGES for _, field_struct, _ in fields)
+        self.assertEqual(len(SNAPSHOT_FIELDS), sum(len(fields) for _, _, fields in SNAPSHOT_RANGES))
+        self.assertLessEqual(sum(length for _, length, _ in SNAPSHOT_RANGES), field_size + 0x1000)
+
+    def test_give_item(self) -> None:
+        """
+        Ensure that the simulated game runs the give item code injected by the client.
+        """
+        game = SimulatedRabiRibi()
+        rr_interface = self.connect(game)
+        game.load_game("1234567")
+        rr_interface.give_item(51)
+        self.assertEqual([51], game.received_item_ids)
+        self.assertTrue(rr_interface.does_player_have_item_id(51))
+
+    def test_lost_connection(self) -> None:
+        """
+        Ensure that the client notices when the game closes.
+        """
+        game = SimulatedRabiRibi()
+        rr_interface = self.connect(game)
+        self.assertTrue(rr_interface.is_connected())
+        game.close()
+        self.assertFalse(rr_interface.is_connected())
+
+    def test_snapshot_events(self) -> None:
+        """
+        Ensure that comparing consecutive snapshots detects the changes in the game.
+        """
+        game = SimulatedRabiRibi()
+        rr_interface = self.connect(game)
+        game.load_game("1234567")
+        snapshot = rr_interface.read_snapshot()
+        self.assertIn(SnapshotEvent.INVENTORY_CHANGED, get_snapshot_events(None, snapshot))
+        self.assertEqual(set(), get_snapshot_events(snapshot, rr_interface.read_snapshot()))
+
+        game.collect_egg(2, 40, 50)
+        previous, snapshot = snapshot, rr_interface.read_snapshot()
+        self.assertEqual({SnapshotEvent.AREA_CHANGED, SnapshotEvent.EGGS_CHANGED, SnapshotEvent.ITEM_ANIMATION_STARTED},
+                         get_snapshot_events(previous, snapshot))
+
+        game.end_item_animation()
+        game.pick_up_item(2, 45, 50)
+        game.end_item_animation()
+        previous, snapshot = snapshot, rr_interface.read_snapshot()
+        self.assertEqual({SnapshotEvent.INVENTORY_CHANGED, SnapshotEvent.ITEM_ANIMATION_ENDED},
+                         get_snapshot_events(previous, snapshot))
+
+class ClientTestItemDelivery(RabiRibiTestBase):
+    def test_give_queued_items(self) -> None:
+        """
+        Ensure that queued items are given back to back, skipping Nothing items.
+        """
+        async def give_queued_items() -> None:
+            game = SimulatedRabiRibi(item_animation_time=0.01)
+            ctx = RabiRibiContext(None, None)
+            ctx.rr_interface = RabiRibiMemoryIO(lambda: game)
+            await ctx.rr_interface.connect(ctx.exit_event)
+            game.load_game("1234567")
+            ctx.items_received = [NetworkItem(0, 0, 0)] * 5
+            ctx.items_received_rabi_ribi_ids = [1, -1, 2, 3, 2]
+            ctx.time_since_last_paused = ctx.time_since_last_warp_menu = 0
+            ctx.time_since_last_costume_menu = ctx.time_since_last_save_menu = 0
+
+            snapshot = await ctx.give_queued_items(ctx.read_snapshot())
+            self.assertEqual([1, 2, 3], game.received_item_ids)
+            self.assertEqual(5, snapshot.get_last_received_item_index())
+            self.assertFalse(ctx.is_item_queued(snapshot))
+
+        asyncio.run(give_queued_items())
+
+    def test_received_item_ids(self) -> None:
+        """
+        Ensure that only the newly received items are converted to rabi-ribi item ids,
+        and that potions keep getting distinct ids.
+        """
+        async def received_item_ids() -> None:
+            ctx = RabiRibiContext(None, None)
+            ctx.slot = 1
+            hp_up = item_table[ItemName.hp_up]
+            egg_location = next(iter(all_locations.values()))
+            ctx.items_received = [
+                NetworkItem(hp_up, 0, 2),
+                NetworkItem(item_table[ItemName.nothing], 0, 2),
+                NetworkItem(item_table[ItemName.easter_egg], egg_location, 1),
+            ]
+            await ctx.set_received_rabi_ribi_item_ids()
+            first_hp_up = POTION_START_IDS[hp_up]
+            self.assertEqual([first_hp_up, -1], ctx.items_received_rabi_ribi_ids)
+            self.assertEqual({location_coordinates_by_id[egg_location]}, ctx.collected_eggs)
+
+            ctx.items_received.append(NetworkItem(hp_up, 0, 2))
+            await ctx.set_received_rabi_ribi_item_ids()
+            self.assertEqual([first_hp_up, -1, first_hp_up - 1], ctx.items_received_rabi_ribi_ids)
+
+            ctx.reset_received_rabi_ribi_item_ids()
+            await ctx.set_received_rabi_ribi_item_ids()
+            self.assertEqual([first_hp_up, -1, first_hp_up - 1], ctx.items_received_rabi_ribi_ids)
+
+        asyncio.run(received_item_ids())
+
+class ClientTestWatcher(RabiRibiTestBase):
+    def test_eggs_of_loaded_save_are_checked(self) -> None:
+        """
+        Ensure that the eggs of a loaded save are checked once the main menu grace period is over.
+        """
+        async def load_save() -> None:
+            game = SimulatedRabiRibi(item_animation_time=0.01)
+            ctx = RabiRibiContext(None, None)
+            ctx.rr_interface = RabiRibiMemoryIO(lambda: game)
+            await ctx.rr_interface.connect(ctx.exit_event)
+            ctx.seed_player_id = "1234567"
+            egg_location = next(location for location in data.locations if location.is_egg)
+            egg_location_id = all_locations[egg_location.name]
+            ctx.missing_locations = {egg_location_id}
+
+            game.load_game(ctx.seed_player_id)
+            game.collect_egg(egg_location.area_id, egg_location.x_position, egg_location.y_position)
+            game.end_item_animation()
+            await watcher_tick(ctx)
+            self.assertNotIn(egg_location_id, ctx.locations_checked)
+
+            # The next snapshot is unchanged, but the grace period is over
+            ctx.time_since_main_menu = time.time() - 10
+            await watcher_tick(ctx)
+            self.assertIn(egg_location_id, ctx.locations_checked)
+
+        asyncio.run(load_save())
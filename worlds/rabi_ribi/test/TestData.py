@@ -0,0 +1,17 @@
+from . import RabiRibiTestBase
+from ..data import data
+
+class DataTestLocations(RabiRibiTestBase):
+    def test_locations_near_match_linear_search(self) -> None:
+        """
+        Ensure that the spatial index finds the same locations as searching every location in the area.
+        """
+        for location in data.locations:
+            for x_offset, y_offset in ((0, 0), (3, -6), (-9, 0), (10, 1), (-4, -4)):
+                x, y = location.x_position + x_offset, location.y_position + y_offset
+                expected = sorted(
+                    ((abs(x - other.x_position) + abs(y - other.y_position), other.id)
+                     for other in data.get_locations_in_area(location.area_id).values()
+                     if abs(x - other.x_position) + abs(y - other.y_position) <= 9))
+                self.assertEqual(expected, [(distance, other.id) for distance, other in
+                                            data.get_locations_near(location.area_id, x, y, 9)])
@@ -0,0 +1,141 @@
+import os
+import random
+import shutil
+import struct
+import tempfile
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from . import RabiRibiTestBase
+from ..existing_randomizer.converter.diffgenerator import DiffData
+from ..existing_randomizer.diffcache import CompiledDiff
+from ..existing_randomizer.mapfileio import (CHAIN_BOMB_BLOCK_ID, EGG_EVENT_ID, EGG_ID, MAP_FILE_SIZE, MAP_LAYERS,
+                                             ItemModifier, StoredMapData, map_filename, write_all)
+from ..existing_randomizer.utility import to_index
+from ..resource_utility import resource_listdir
+
+class MapItem:
+    def __init__(self, areaid, position, itemid):
+        self.areaid = areaid
+        self.position = position
+        self.itemid = itemid
+
+class MapFileIOTestStoredMapData(RabiRibiTestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.source_dir = os.path.join(self.directory, "source")
+        self.output_dir = os.path.join(self.directory, "output")
+        os.mkdir(self.source_dir)
+        os.mkdir(self.output_dir)
+
+        rng = random.Random(0)
+        self.map_data = bytearray(rng.randbytes(MAP_FILE_SIZE))
+        events_offset = dict((name, offset) for name, offset, _ in MAP_LAYERS)['tiledata_event']
+        for index in (5, 1000, 99999):
+            struct.pack_into('h', self.map_data, events_offset + index*2, EGG_EVENT_ID)
+        with open(map_filename(0, self.source_dir), "wb") as f:
+            f.write(self.map_data)
+        shutil.copyfile(map_filename(0, self.source_dir), map_filename(0, self.output_dir))
+
+    def test_layers_match_file(self) -> None:
+        """
+        Ensure that the layers are read from their offsets in the map file.
+        """
+        stored_data = StoredMapData(map_filename(0, self.source_dir))
+        for name, offset, size in MAP_LAYERS:
+            self.assertEqual(list(struct.unpack_from('%dh' % size, self.map_data, offset)), list(getattr(stored_data, name)))
+
+    def test_clear_eggs(self) -> None:
+        """
+        Ensure that clearing the eggs removes every egg event in place.
+        """
+        stored_data = StoredMapData(map_filename(0, self.source_dir))
+        tiledata_event = stored_data.tiledata_event
+        original_events = list(tiledata_event)
+        stored_data.clear_eggs()
+        self.assertIs(tiledata_event, stored_data.tiledata_event)
+        for original_event, event in zip(original_events, tiledata_event):
+            if original_event == EGG_EVENT_ID:
+                self.assertIn(event, (0, CHAIN_BOMB_BLOCK_ID))
+            else:
+                self.assertEqual(original_event, event)
+
+    def test_write_only_modified_layers(self) -> None:
+        """
+        Ensure that writing a map only writes the modified layers, and does not modify the stored data.
+        """
+        stored_data = StoredMapData(map_filename(0, self.source_dir))
+        stored_data.clear_items()
+        stored_data.tiledata_roombg[3] = 7
+        items = [MapItem(0, (10, 20), 42), MapItem(0, (30, 40), EGG_ID), MapItem(1, (50, 60), 43)]
+        write_all(0, items, stored_data, self.output_dir)
+
+        with open(map_filename(0, self.output_dir), "rb") as f:
+            output_data = f.read()
+        self.assertEqual(len(self.map_data), len(output_data))
+        modified_layers = set()
+        for name, offset, size in MAP_LAYERS:
+            if output_data[offset:offset + size*2] != self.map_data[offset:offset + size*2]:
+                modified_layers.add(name)
+        self.assertLessEqual({'tiledata_items', 'tiledata_event', 'tiledata_roombg'}, modified_layers)
+        self.assertNotIn('tiledata_tiles0', modified_layers)
+        self.assertNotIn('tiledata_tiles2', modified_layers)
+
+        written_data = StoredMapData(map_filename(0, self.output_dir))
+        self.assertEqual(42, written_data.tiledata_items[to_index((10, 20))])
+        self.assertEqual(0, written_data.tiledata_items[to_index((50, 60))])
+        self.assertEqual(EGG_EVENT_ID, written_data.tiledata_event[to_index((30, 40))])
+        self.assertEqual(7, written_data.tiledata_roombg[3])
+        self.assertEqual(0, stored_data.tiledata_items[to_index((10, 20))])
+        self.assertNotEqual(EGG_EVENT_ID, stored_data.tiledata_event[to_index((30, 40))])
+
+    def test_item_modifier_executor(self) -> None:
+        """
+        Ensure that loading and saving the areas with an executor writes the same maps.
+        """
+        shutil.copyfile(map_filename(0, self.source_dir), map_filename(1, self.source_dir))
+        serial_dir = os.path.join(self.directory, "serial")
+        os.mkdir(serial_dir)
+        for directory in (serial_dir, self.output_dir):
+            for area_id in range(2):
+                shutil.copyfile(map_filename(area_id, self.source_dir), map_filename(area_id, directory))
+
+        items = [MapItem(0, (10, 20), 42), MapItem(1, (30, 40), EGG_ID)]
+        item_modifier = ItemModifier(range(2), self.source_dir)
+        for item in items:
+            item_modifier.add_item(item)
+        item_modifier.save(serial_dir)
+        with ThreadPoolExecutor() as executor:
+            item_modifier = ItemModifier(range(2), self.source_dir, executor)
+            for item in items:
+                item_modifier.add_item(item)
+            item_modifier.save(self.output_dir, executor)
+
+        for area_id in range(2):
+            with open(map_filename(area_id, serial_dir), "rb") as serial_file, \
+                 open(map_filename(area_id, self.output_dir), "rb") as f:
+                self.assertEqual(serial_file.read(), f.read())
+
+class MapFileIOTestCompiledDiff(RabiRibiTestBase):
+    def test_compiled_diffs_match_text_diffs(self) -> None:
+        """
+        Ensure that applying a compiled diff, after a round trip through the binary format,
+        sets the same tiles as applying the text diff in order.
+        """
+        directory = os.path.join('existing_randomizer', 'maptemplates', 'constraint_shuffle')
+        for filename in sorted(resource_listdir(directory))[:20]:
+            with self.subTest(filename=filename):
+                diff_data = DiffData(os.path.join(directory, filename))
+                compiled_diff = CompiledDiff.from_bytes(CompiledDiff.from_diff_data(diff_data).to_bytes())
+                self.assertEqual(diff_data.get_areaids(), compiled_diff.get_areaids())
+                for areaid, layer_diffs in diff_data.area_diffs.items():
+                    for layer_name, diffs in layer_diffs.items():
+                        expected_layer = array('h', bytes(MAP_FILE_SIZE))
+                        for diff in diffs:
+                            for index, _, value in diff:
+                                expected_layer[index] = value
+                        layer = array('h', bytes(MAP_FILE_SIZE))
+                        compiled_diff.area_diffs[areaid][layer_name].apply(layer)
+                        self.assertEqual(expected_layer, layer)
@@ -0,0 +1,101 @@
+from random import Random
+
+from . import RabiRibiTestBase
+from ..entrance_shuffle import (
+    MAX_ATTEMPTS,
+    PARALLEL_BATCH_SIZE,
+    MapAllocation,
+    MapAnalyzer,
+    MapConnectivity,
+    MapGenerator,
+    MapSearchWorker
+)
+from ..existing_randomizer.dataparser import RandomizerData
+from ..locations import setup_locations
+
+class MapGenerationTestParallel(RabiRibiTestBase):
+    options = {
+        "shuffle_map_transitions": True,
+        "number_of_constraint_changes": 25,
+    }
+
+    def test_parallel_search_is_deterministic(self) -> None:
+        """
+        Ensure that the parallel map search picks the first valid attempt, the same as searching the batches in order.
+        """
+        world = self.world
+        locations_to_reach = set(setup_locations(world.options).keys())
+        random_state = world.random.getstate()
+
+        randomizer_data = RandomizerData(world.existing_randomizer_args)
+        generator = MapGenerator(randomizer_data, world.existing_randomizer_args, locations_to_reach, world)
+        allocation, analyzer = generator.generate_seed_parallel(2)
+        self.assertTrue(analyzer.success)
+
+        # Draw the seeds of the attempts the same way as the parallel search
+        world.random.setstate(random_state)
+        MapGenerator(randomizer_data, world.existing_randomizer_args, locations_to_reach, world)
+        search_random = Random(world.random.getrandbits(64))
+        attempts = list(enumerate(search_random.getrandbits(64) for _ in range(MAX_ATTEMPTS)))
+        worker = MapSearchWorker(world.existing_randomizer_args, locations_to_reach)
+        attempt = None
+        for start in range(0, MAX_ATTEMPTS, PARALLEL_BATCH_SIZE):
+            attempt = worker.search_batch(attempts[start:start + PARALLEL_BATCH_SIZE])
+            if attempt is not None:
+                break
+        self.assertEqual(generator.attempts, attempt + 1)
+
+        expected = MapAllocation(randomizer_data, world.existing_randomizer_args, Random(attempts[attempt][1]))
+        expected.shuffle(randomizer_data, world.existing_randomizer_args)
+        self.assertEqual([template.name for template in expected.picked_templates],
+                         [template.name for template in allocation.picked_templates])
+        self.assertEqual(expected.start_location.location, allocation.start_location.location)
+
+    def test_incremental_reachability(self) -> None:
+        """
+        Ensure that continuing the reachability search after obtaining all upgrades
+        gives the same result as starting a new search with all upgrades.
+        """
+        world = self.world
+        randomizer_data = RandomizerData(world.existing_randomizer_args)
+        locations_to_reach = set(setup_locations(world.options).keys())
+        generator = MapGenerator(randomizer_data, world.existing_randomizer_args, locations_to_reach, world)
+        for _ in range(20):
+            generator.shuffle()
+            analyzer = MapAnalyzer(randomizer_data, world.existing_randomizer_args, generator.allocation, locations_to_reach,
+                                   generator.connectivity)
+            starting_variables = randomizer_data.generate_variables()
+            _, backward_exitable = analyzer.verify_warps_reachable(starting_variables)
+
+            variables = dict(starting_variables)
+            for item in randomizer_data.must_be_reachable:
+                variables[item] = True
+            expected, _, _, _ = analyzer.verify_reachable_items(variables, backward_exitable)
+
+            reachability = analyzer.iterate_reachable_items(starting_variables, backward_exitable)
+            next(reachability)
+            reachable, _, _, _ = reachability.send(randomizer_data.must_be_reachable)
+            reachability.close()
+            self.assertEqual(expected, reachable)
+
+    def test_connected_locations_are_upper_bound(self) -> None:
+        """
+        Ensure that the locations connected to the start location include every location the analyzer can reach.
+        """
+        world = self.world
+        randomizer_data = RandomizerData(world.existing_randomizer_args)
+        locations_to_reach = set(setup_locations(world.options).keys())
+        generator = MapGenerator(randomizer_data, world.existing_randomizer_args, locations_to_reach, world)
+        connectivity = MapConnectivity(randomizer_data)
+        for _ in range(20):
+            generator.shuffle()
+            analyzer = MapAnalyzer(randomizer_data, world.existing_randomizer_args, generator.allocation, locations_to_reach,
+                                   connectivity)
+            variables = randomizer_data.generate_variables()
+            for item in randomizer_data.must_be_reachable:
+                variables[item] = True
+            _, backward_exitable = analyzer.verify_warps_reachable(variables)
+            reachable, _, _, _ = analyzer.verify_reachable_items(variables, backward_exitable)
+
+            connected_locations = connectivity.get_connected_locations(generator.allocation)
+            self.assertTrue(analyzer.get_item_locations_reachable(reachable).issubset(connected_locations))
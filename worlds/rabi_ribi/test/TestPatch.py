@@ -0,0 +1,288 @@
+import asyncio
+import os
+import shutil
+import struct
+import tempfile
+import threading
+from unittest import mock
+
+from NetUtils import NetworkItem
+
+from . import RabiRibiTestBase
+from ..client.client import RabiRibiContext
+from ..client.map_writer import MapWriter, get_map_filename
+from ..client.memory_io import EXCLAMATION_POINT_ITEM_ID
+from ..client.patch import (
+    PatchInputs,
+    get_patch_key,
+    is_legacy_patched_map_dir,
+    is_patched_map_dir_valid,
+    write_patch_manifest
+)
+from ..existing_randomizer.mapfileio import MAP_FILE_SIZE, MAP_ITEMS_OFFSET
+from ..existing_randomizer.utility import to_index
+from ..locations import location_coordinates_by_id
+
+class PatchTestManifest(RabiRibiTestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.source_dir = os.path.join(self.directory, "source")
+        self.output_dir = os.path.join(self.directory, "output")
+        os.mkdir(self.source_dir)
+        os.mkdir(self.output_dir)
+        for area_id in range(2):
+            for directory in (self.source_dir, self.output_dir):
+                with open(os.path.join(directory, f"area{area_id}.map"), "wb") as f:
+                    f.write(bytes([area_id]) * 100)
+        self.patch_inputs = PatchInputs(
+            slot=1,
+            slot_data={"start_location": "Starting Forest", "required_egg_count": 5},
+            locations_info={1: NetworkItem(10, 1, 1), 2: NetworkItem(20, 2, 2)},
+            custom_seed_subdir=self.output_dir,
+            seed_player="AP_1234_P1",
+            seed_player_id="1234567"
+        )
+
+    def test_patch_key(self) -> None:
+        """
+        Ensure that the patch key only changes when the inputs of the patch change.
+        """
+        key = get_patch_key(self.patch_inputs, self.source_dir)
+        self.patch_inputs = self.patch_inputs._replace(
+            slot_data={"required_egg_count": 5, "start_location": "Starting Forest"},
+            locations_info={2: NetworkItem(20, 2, 2), 1: NetworkItem(10, 1, 1)}
+        )
+        self.assertEqual(key, get_patch_key(self.patch_inputs, self.source_dir))
+
+        self.patch_inputs.locations_info[2] = NetworkItem(21, 2, 2)
+        self.assertNotEqual(key, get_patch_key(self.patch_inputs, self.source_dir))
+        self.patch_inputs.locations_info[2] = NetworkItem(20, 2, 2)
+
+        # A game update changes the modification time of the original maps
+        stat = os.stat(os.path.join(self.source_dir, "area1.map"))
+        os.utime(os.path.join(self.source_dir, "area1.map"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        self.assertNotEqual(key, get_patch_key(self.patch_inputs, self.source_dir))
+
+    def test_patched_map_dir_valid(self) -> None:
+        """
+        Ensure that the patched maps are only reused if the manifest matches the key and the files.
+        """
+        key = get_patch_key(self.patch_inputs, self.source_dir)
+        self.assertFalse(is_patched_map_dir_valid(self.output_dir, key))
+        write_patch_manifest(self.output_dir, key)
+        self.assertTrue(is_patched_map_dir_valid(self.output_dir, key))
+        self.assertFalse(is_patched_map_dir_valid(self.output_dir, "another key"))
+
+        with open(os.path.join(self.output_dir, "area1.map"), "r+b") as f:
+            f.truncate(50)
+        self.assertFalse(is_patched_map_dir_valid(self.output_dir, key))
+        os.remove(os.path.join(self.output_dir, "area1.map"))
+        self.assertFalse(is_patched_map_dir_valid(self.output_dir, key))
+
+    def test_legacy_patched_map_dir(self) -> None:
+        """
+        Ensure that maps patched without a manifest are recognized, so they are kept.
+        """
+        self.assertTrue(is_legacy_patched_map_dir(self.output_dir))
+        write_patch_manifest(self.output_dir, get_patch_key(self.patch_inputs, self.source_dir))
+        self.assertFalse(is_legacy_patched_map_dir(self.output_dir))
+        self.assertFalse(is_legacy_patched_map_dir(os.path.join(self.directory, "missing")))
+
+class PatchTestMapWriter(RabiRibiTestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.map_data = bytearray(MAP_FILE_SIZE)
+        for position, item_id in (((10, 20), EXCLAMATION_POINT_ITEM_ID), ((30, 40), EXCLAMATION_POINT_ITEM_ID), ((50, 60), 7)):
+            struct.pack_into('<h', self.map_data, MAP_ITEMS_OFFSET + to_index(position)*2, item_id)
+        for area_id in range(2):
+            with open(get_map_filename(self.directory, area_id), "wb") as f:
+                f.write(self.map_data)
+
+    def read_item(self, area_id: int, position: tuple[int, int]) -> int:
+        with open(get_map_filename(self.directory, area_id), "rb") as f:
+            f.seek(MAP_ITEMS_OFFSET + to_index(position)*2)
+            return struct.unpack('<h', f.read(2))[0]
+
+    def test_remove_exclamation_points(self) -> None:
+        """
+        Ensure that the removals are batched per map file, and only remove exclamation points.
+        """
+        async def remove_exclamation_points() -> MapWriter:
+            map_writer = MapWriter(write_delay=0.01)
+            for x, y in ((10, 20), (30, 40), (50, 60)):
+                map_writer.remove_exclamation_point(self.directory, 1, x, y)
+            await asyncio.sleep(0.2)
+            map_writer.remove_exclamation_point(self.directory, 0, 30, 40)
+            await map_writer.close()
+            return map_writer
+
+        map_writer = asyncio.run(remove_exclamation_points())
+        self.assertEqual(2, map_writer.write_count)
+        self.assertEqual(0, self.read_item(1, (10, 20)))
+        self.assertEqual(0, self.read_item(1, (30, 40)))
+        self.assertEqual(7, self.read_item(1, (50, 60)))
+        self.assertEqual(EXCLAMATION_POINT_ITEM_ID, self.read_item(0, (10, 20)))
+        self.assertEqual(0, self.read_item(0, (30, 40)))
+        with open(get_map_filename(self.directory, 1), "rb") as f:
+            self.assertEqual(MAP_FILE_SIZE, len(f.read()))
+
+    def test_failed_write_is_retried(self) -> None:
+        """
+        Ensure that the removals of a failed write are logged and queued again.
+        """
+        missing_directory = os.path.join(self.directory, "missing")
+
+        async def remove_exclamation_points() -> MapWriter:
+            map_writer = MapWriter(write_delay=0.01)
+            map_writer.remove_exclamation_point(missing_directory, 1, 10, 20)
+            map_writer.remove_exclamation_point(self.directory, 1, 10, 20)
+            with self.assertLogs("Client", "WARNING"):
+                await asyncio.sleep(0.2)
+            self.assertTrue(map_writer.flush_task.done())
+            self.assertEqual({get_map_filename(missing_directory, 1): {(10, 20)},
+                              get_map_filename(self.directory, 1): {(10, 20)}}, map_writer.pending)
+            shutil.copytree(self.directory, missing_directory)
+            await map_writer.close()
+            return map_writer
+
+        map_writer = asyncio.run(remove_exclamation_points())
+        self.assertEqual({}, map_writer.pending)
+        self.assertEqual(0, self.read_item(1, (10, 20)))
+        with open(get_map_filename(missing_directory, 1), "rb") as f:
+            f.seek(MAP_ITEMS_OFFSET + to_index((10, 20))*2)
+            self.assertEqual(0, struct.unpack('<h', f.read(2))[0])
+
+    def test_remove_checked_exclamation_points(self) -> None:
+        """
+        Ensure that the exclamation points of the checked locations are removed again from newly patched maps.
+        """
+        location_id, (area_id, x, y) = next(iter(location_coordinates_by_id.items()))
+        struct.pack_into('<h', self.map_data, MAP_ITEMS_OFFSET + to_index((x, y))*2, EXCLAMATION_POINT_ITEM_ID)
+        with open(get_map_filename(self.directory, area_id), "wb") as f:
+            f.write(self.map_data)
+
+        async def remove_checked_exclamation_points() -> None:
+            ctx = RabiRibiContext(None, None)
+            ctx.custom_seed_subdir = self.directory
+            ctx.locations_checked = {location_id}
+            ctx.remove_checked_exclamation_points_from_maps()
+            await ctx.map_writer.close()
+
+        asyncio.run(remove_checked_exclamation_points())
+        self.assertEqual(0, self.read_item(area_id, (x, y)))
+
+class PatchTestTask(RabiRibiTestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def connect(self, ctx: RabiRibiContext, seed_player_id: str) -> None:
+        ctx.slot = 1
+        ctx.slot_data = {"start_location": "Starting Forest", "death_link": False}
+        ctx.locations_info = {1: NetworkItem(10, 1, 1)}
+        ctx.custom_seed_subdir = os.path.join(self.directory, seed_player_id)
+        ctx.seed_player = f"AP_{seed_player_id}"
+        ctx.seed_player_id = seed_player_id
+
+    def test_patch_of_reset_client_is_ignored(self) -> None:
+        """
+        Ensure that the patch reads a copy of the client state, that a patch of a previous connection
+        does not mark the maps as patched, and that the patches never run at the same time.
+        """
+        patches: list[PatchInputs] = []
+        running = threading.Semaphore(1)
+        first_patch_started = threading.Event()
+        finish_first_patch = threading.Event()
+
+        def patch_map_files_if_needed(patch_inputs: PatchInputs, report_progress) -> bool:
+            self.assertTrue(running.acquire(blocking=False))
+            patches.append(patch_inputs)
+            if len(patches) == 1:
+                first_patch_started.set()
+                finish_first_patch.wait()
+            running.release()
+            return False
+
+        async def reconnect_while_patching() -> RabiRibiContext:
+            ctx = RabiRibiContext(None, None)
+            self.connect(ctx, "1111111")
+            ctx.patch_if_recieved_all_data()
+            first_patch = ctx.patch_task
+            await asyncio.to_thread(first_patch_started.wait)
+            ctx.patch_if_recieved_all_data()
+            self.assertIs(first_patch, ctx.patch_task)
+
+            ctx.reset_client_state()
+            self.connect(ctx, "2222222")
+            ctx.patch_if_recieved_all_data()
+            second_patch = ctx.patch_task
+            await asyncio.sleep(0.05)
+            self.assertEqual(1, len(patches))
+            finish_first_patch.set()
+            await first_patch
+            self.assertFalse(ctx.maps_patched)
+            await second_patch
+            await ctx.map_writer.close()
+            return ctx
+
+        with mock.patch("worlds.rabi_ribi.client.patch.patch_map_files_if_needed", patch_map_files_if_needed):
+            ctx = asyncio.run(reconnect_while_patching())
+        self.assertTrue(ctx.maps_patched)
+        self.assertEqual(["1111111", "2222222"], [patch_inputs.seed_player_id for patch_inputs in patches])
+        self.assertEqual({"start_location": "Starting Forest", "death_link": False}, patches[0].slot_data)
+
+    def test_failed_patch_ends_wait(self) -> None:
+        """
+        Ensure that the watcher stops waiting for the patch if patching the maps fails.
+        """
+        def patch_map_files_if_needed(patch_inputs: PatchInputs, report_progress) -> bool:
+            raise OSError("The map files are locked")
+
+        async def connect_and_wait() -> RabiRibiContext:
+            ctx = RabiRibiContext(None, None)
+            self.connect(ctx, "1111111")
+            ctx.patch_if_recieved_all_data()
+            with self.assertLogs("Client", "ERROR"):
+                await ctx.patch_task
+            await asyncio.wait_for(ctx.wait_for_initial_connection_info(), timeout=5)
+            await ctx.map_writer.close()
+            return ctx
+
+        with mock.patch("worlds.rabi_ribi.client.patch.patch_map_files_if_needed", patch_map_files_if_needed):
+            ctx = asyncio.run(connect_and_wait())
+        self.assertTrue(ctx.patch_failed)
+        self.assertFalse(ctx.maps_patched)
+
+    def test_queued_removals_are_written_before_patching(self) -> None:
+        """
+        Ensure that the queued and running map writes finish before the patch rewrites the map files.
+        """
+        map_data = bytearray(MAP_FILE_SIZE)
+        struct.pack_into('<h', map_data, MAP_ITEMS_OFFSET + to_index((10, 20))*2, EXCLAMATION_POINT_ITEM_ID)
+        items_written: list[int] = []
+
+        def patch_map_files_if_needed(patch_inputs: PatchInputs, report_progress) -> bool:
+            with open(get_map_filename(patch_inputs.custom_seed_subdir, 1), "rb") as f:
+                f.seek(MAP_ITEMS_OFFSET + to_index((10, 20))*2)
+                items_written.append(struct.unpack('<h', f.read(2))[0])
+            return False
+
+        async def patch_with_queued_removals() -> None:
+            ctx = RabiRibiContext(None, None)
+            self.connect(ctx, "1111111")
+            os.mkdir(ctx.custom_seed_subdir)
+            with open(get_map_filename(ctx.custom_seed_subdir, 1), "wb") as f:
+                f.write(map_data)
+            ctx.map_writer.remove_exclamation_point(ctx.custom_seed_subdir, 1, 10, 20)
+            ctx.patch_if_recieved_all_data()
+            await ctx.patch_task
+            await ctx.map_writer.close()
+
+        with mock.patch("worlds.rabi_ribi.client.patch.patch_map_files_if_needed", patch_map_files_if_needed):
+            asyncio.run(patch_with_queued_removals())
+        self.assertEqual([0], items_written)
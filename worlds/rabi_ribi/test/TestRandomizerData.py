@@ -0,0 +1,110 @@
+import io
+import marshal
+import os
+import pickle
+from random import Random
+
+from . import RabiRibiTestBase
+from ..entrance_shuffle import MapAllocation
+from ..existing_randomizer.constraintcache import _ConstraintUnpickler
+from ..existing_randomizer.dataparser import RandomizerData, get_static_data
+from ..existing_randomizer.utility import ExpressionLambda, OpLit, evaluate_expression_masks, variables_to_bitset
+
+class RandomizerDataTestShared(RabiRibiTestBase):
+    options = {
+        "shuffle_map_transitions": True,
+        "number_of_constraint_changes": 5,
+    }
+
+    def test_parsed_data_is_shared(self) -> None:
+        """
+        Ensure that worlds share the parsed data and the graph, but not the variables that depend on the settings.
+        """
+        randomizer_data = self.world.randomizer_data
+        other_data = RandomizerData(self.world.existing_randomizer_args)
+
+        self.assertIs(randomizer_data.item_constraints, other_data.item_constraints)
+        self.assertIs(randomizer_data.initial_edges, other_data.initial_edges)
+        self.assertIs(randomizer_data.initial_outgoing_edges, other_data.initial_outgoing_edges)
+        self.assertIsNot(randomizer_data.configured_variables, other_data.configured_variables)
+
+    def test_allocation_does_not_modify_graph(self) -> None:
+        """
+        Ensure that constructing the graph of an allocation leaves the shared graph untouched.
+        """
+        randomizer_data = self.world.randomizer_data
+        settings = self.world.existing_randomizer_args
+        graph = [(edge, edge.from_location, edge.to_location, edge.satisfied_expr) for edge in randomizer_data.initial_edges]
+        outgoing_edges = {location: list(edge_ids) for location, edge_ids in randomizer_data.initial_outgoing_edges.items()}
+        incoming_edges = {location: list(edge_ids) for location, edge_ids in randomizer_data.initial_incoming_edges.items()}
+
+        allocations = [MapAllocation(randomizer_data, settings, Random(seed)) for seed in range(5)]
+        for allocation in allocations:
+            allocation.shuffle(randomizer_data, settings)
+
+        self.assertEqual(graph, [(edge, edge.from_location, edge.to_location, edge.satisfied_expr) for edge in randomizer_data.initial_edges])
+        self.assertEqual(outgoing_edges, randomizer_data.initial_outgoing_edges)
+        self.assertEqual(incoming_edges, randomizer_data.initial_incoming_edges)
+        for allocation in allocations:
+            for location, edge_ids in allocation.outgoing_edges.items():
+                for edge_id in edge_ids:
+                    self.assertEqual(location, allocation.edges[edge_id].from_location)
+
+    def test_cached_constraints_round_trip(self) -> None:
+        """
+        Ensure that constraints loaded from the constraint cache evaluate the same as the parsed constraints.
+        """
+        static_data = get_static_data(self.world.existing_randomizer_args)
+        constraints = static_data.edge_constraints, static_data.item_constraints, static_data.template_constraints
+        edge_constraints, item_constraints, template_constraints = \
+            _ConstraintUnpickler(io.BytesIO(pickle.dumps(constraints))).load()
+
+        variables = self.world.randomizer_data.generate_variables()
+        for original, loaded in zip(static_data.edge_constraints, edge_constraints):
+            self.assertEqual(str(original.prereq_expression), str(loaded.prereq_expression))
+            self.assertEqual(original.prereq_lambda(variables), loaded.prereq_lambda(variables))
+        for original, loaded in zip(static_data.item_constraints, item_constraints):
+            self.assertEqual(original.entry_prereq.expression_lambda(variables), loaded.entry_prereq.expression_lambda(variables))
+            self.assertEqual(original.exit_progression, loaded.exit_progression)
+            for name, expression_data in original.alternate_entries.items():
+                self.assertEqual(expression_data.exp_lambda(variables), loaded.alternate_entries[name].exp_lambda(variables))
+        self.assertEqual([t.name for t in static_data.template_constraints], [t.name for t in template_constraints])
+
+    def test_constraint_cache_contains_no_code(self) -> None:
+        """
+        Ensure that the constraint cache refuses globals other than the constraint classes,
+        and that a loaded expression can only read variables.
+        """
+        class CallSystem:
+            def __reduce__(self):
+                return os.system, ("exit 0",)
+
+        class LoadCode:
+            def __reduce__(self):
+                return marshal.loads, (marshal.dumps(compile("0", "<node>", "eval")),)
+
+        for payload in (CallSystem(), LoadCode()):
+            with self.assertRaises(pickle.UnpicklingError):
+                _ConstraintUnpickler(io.BytesIO(pickle.dumps(payload))).load()
+
+        expression = ExpressionLambda(OpLit("TRUE'] or __import__('os') or variables['TRUE"))
+        loaded = _ConstraintUnpickler(io.BytesIO(pickle.dumps(expression))).load()
+        with self.assertRaises(KeyError):
+            loaded.expression_lambda({"TRUE": True})
+
+    def test_expression_masks_match_lambdas(self) -> None:
+        """
+        Ensure that constraints compiled to bitmasks evaluate the same as their lambdas.
+        """
+        randomizer_data = self.world.randomizer_data
+        for _ in range(20):
+            variables = {name: self.world.random.random() < 0.5 for name in randomizer_data.variable_names_list}
+            variables.update(TRUE=True, FALSE=False)
+            bitset = variables_to_bitset(variables, randomizer_data.variable_bits)
+            for edge in randomizer_data.initial_edges:
+                if edge.satisfied_masks is not None:
+                    self.assertEqual(edge.satisfied(variables), evaluate_expression_masks(edge.satisfied_masks, bitset),
+                                     str(edge.satisfied_expr))
+            for name, masks in randomizer_data.pseudo_item_masks.items():
+                if masks is not None:
+                    self.assertEqual(randomizer_data.pseudo_items[name](variables), evaluate_expression_masks(masks, bitset))
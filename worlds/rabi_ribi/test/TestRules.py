@@ -0,0 +1,154 @@
+from BaseClasses import CollectionState
+
+from . import RabiRibiTestBase
+from ..counters import AMULET_FOOD_COUNT, MAGIC_TYPE_COUNT, MAIN_GAME_TOWN_MEMBER_COUNT, TOWN_MEMBER_COUNT, counter_names
+from ..data import data
+from ..items import item_groups, recruit_table, recruit_table_irisu
+from ..names import ItemName
+from ..rule_builder.custom_rules import MagicTypesRule
+from ..rules import _load_connections, convert_connection_files, parse_connections
+
+class RulesTestConnections(RabiRibiTestBase):
+    def test_connections_json_is_up_to_date(self) -> None:
+        """
+        Ensure that data/connections.json matches the constraint files of the existing randomizer.
+        Regenerate it by dumping convert_connection_files() with an indent of 2 if this fails.
+        """
+        self.assertEqual(convert_connection_files(), _load_connections())
+
+    def test_parse_connections_is_idempotent(self) -> None:
+        """
+        Ensure that parsing the connections again does not modify the shared data.
+        """
+        connections = {region.name: dict(region.connections) for region in data.regions}
+        changes = {constraint.name: list(constraint.changes) for constraint in data.constraints}
+        parse_connections()
+        self.assertEqual(connections, {region.name: region.connections for region in data.regions})
+        self.assertEqual(changes, {constraint.name: constraint.changes for constraint in data.constraints})
+
+class RulesTestCaching(RabiRibiTestBase):
+    options = {
+        "include_post_game": True,
+        "knowledge": "advanced",
+    }
+
+    def test_cached_rules_match_fresh_evaluation(self) -> None:
+        """
+        Ensure that the cached rule results are invalidated when collecting and removing items,
+        by comparing them to the results of a state with an empty cache.
+        """
+        self.assertTrue(self.world.rule_caching_enabled)
+        event_items = [location.item for location in self.multiworld.get_locations(self.player)
+                       if location.item is not None and location.address is None]
+        items = [item for item in self.multiworld.itempool if item.player == self.player] + event_items
+        self.multiworld.random.shuffle(items)
+        rules = [location.access_rule for location in self.multiworld.get_locations(self.player)] + \
+                [entrance.access_rule for entrance in self.multiworld.get_entrances(self.player)]
+
+        def assert_rules_match(collected_items) -> None:
+            fresh_state = CollectionState(self.multiworld)
+            for item in collected_items:
+                fresh_state.collect(item, True)
+            # Like the fill, update the reachable regions before evaluating the rules
+            fresh_state.update_reachable_regions(self.player)
+            state.update_reachable_regions(self.player)
+            for rule in rules:
+                self.assertEqual(rule(fresh_state), rule(state), str(rule))
+
+        state = CollectionState(self.multiworld)
+        for index, item in enumerate(items):
+            state.collect(item, True)
+            if index % 10 == 9:
+                assert_rules_match(items[:index + 1])
+        for index in range(len(items) - 1, 0, -1):
+            state.remove(items[index])
+            if index % 15 == 0:
+                assert_rules_match(items[:index])
+
+    def test_magic_types_rule_dependencies(self) -> None:
+        """
+        Ensure that collecting magic invalidates the cached result of a magic types rule.
+        """
+        rule = MagicTypesRule(2).resolve(self.world)
+        self.world.register_rule_dependencies(rule)
+        state = CollectionState(self.multiworld)
+        for magic in sorted(item_groups["Magic"])[:2]:
+            self.assertFalse(rule(state))
+            state.collect(self.world.create_item(magic), True)
+        self.assertTrue(rule(state))
+
+class RulesTestCounters(RabiRibiTestBase):
+    options = {
+        "include_plurkwood": True,
+        "include_post_game": True,
+        "knowledge": "advanced",
+    }
+
+    def test_counters_match_collected_items(self) -> None:
+        """
+        Ensure that the derived counters match recounting the collected items while collecting and removing items,
+        and do not depend on the order the items were collected in.
+        """
+        event_items = [location.item for location in self.multiworld.get_locations(self.player)
+                       if location.item is not None and location.address is None]
+        items = [item for item in self.multiworld.itempool if item.player == self.player] + event_items
+        self.multiworld.random.shuffle(items)
+
+        def assert_counters_match(collected_items) -> None:
+            self.assertEqual(state.count_from_list_unique(recruit_table, self.player),
+                             state.count(TOWN_MEMBER_COUNT, self.player))
+            self.assertEqual(state.count_from_list_unique(recruit_table_irisu, self.player),
+                             state.count(MAIN_GAME_TOWN_MEMBER_COUNT, self.player))
+            rainbow_shot = state.has(ItemName.easter_egg, self.player, 5) and \
+                state.has(ItemName.glitched_logic, self.player)
+            self.assertEqual(state.count_group_unique("Magic", self.player) + rainbow_shot,
+                             state.count(MAGIC_TYPE_COUNT, self.player))
+            reversed_state = CollectionState(self.multiworld)
+            for item in reversed(collected_items):
+                reversed_state.collect(item, True)
+            for name in counter_names:
+                self.assertEqual(reversed_state.count(name, self.player), state.count(name, self.player), name)
+
+        state = CollectionState(self.multiworld)
+        for index, item in enumerate(items):
+            state.collect(item, True)
+            if index % 10 == 9:
+                assert_counters_match(items[:index + 1])
+        self.assertGreater(state.count(AMULET_FOOD_COUNT, self.player), 0)
+        for index in range(len(items) - 1, -1, -1):
+            state.remove(items[index])
+            if index % 15 == 0:
+                assert_counters_match(items[:index])
+        for name in counter_names:
+            self.assertNotIn(name, state.prog_items[self.player])
+
+class RulesTestIndirectConditions(RabiRibiTestBase):
+    options = {
+        "include_plurkwood": True,
+        "include_post_game": True,
+        "knowledge": "obscure",
+    }
+
+    def test_explicit_indirect_conditions(self) -> None:
+        """
+        Ensure that the registered indirect conditions reach the same regions as rechecking every blocked entrance.
+        """
+        self.assertTrue(self.world.explicit_indirect_conditions)
+        items = [item for item in self.multiworld.itempool if item.player == self.player]
+        self.multiworld.random.shuffle(items)
+
+        def get_reachable_regions(collected_items, explicit_indirect_conditions: bool) -> set[str]:
+            self.world.explicit_indirect_conditions = explicit_indirect_conditions
+            try:
+                state = CollectionState(self.multiworld)
+                for item in collected_items:
+                    state.collect(item, True)
+                state.sweep_for_advancements()
+                return {region.name for region in state.reachable_regions[self.player]}
+            finally:
+                del self.world.explicit_indirect_conditions
+
+        for count in range(0, len(items), 10):
+            with self.subTest(count=count):
+                self.assertEqual(get_reachable_regions(items[:count], False),
+                                 get_reachable_regions(items[:count], True))
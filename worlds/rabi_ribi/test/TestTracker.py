@@ -0,0 +1,78 @@
+from BaseClasses import CollectionState
+from Utils import get_intended_text
+
+from . import RabiRibiTestBase
+from ..data import data
+from ..names import ItemName
+from ..tracker import NameIndex
+
+class TrackerTestCommands(RabiRibiTestBase):
+    def test_glitched_state_is_reused(self) -> None:
+        """
+        Ensure that the glitched state is reused until the items of the player change.
+        """
+        state = CollectionState(self.multiworld)
+        state.sweep_for_advancements()
+        glitched_state = self.world.get_glitched_state(state)
+        self.assertTrue(glitched_state.has(ItemName.glitched_logic, self.player))
+        self.assertFalse(state.has(ItemName.glitched_logic, self.player))
+        self.assertIs(glitched_state, self.world.get_glitched_state(state.copy()))
+
+        state.collect(self.world.create_item(ItemName.air_jump), True)
+        new_glitched_state = self.world.get_glitched_state(state)
+        self.assertIsNot(glitched_state, new_glitched_state)
+        self.assertTrue(new_glitched_state.has(ItemName.air_jump, self.player))
+
+    def test_name_index_matches_intended_text(self) -> None:
+        """
+        Ensure that the name index matches names like get_intended_text.
+        """
+        names = [location.name for location in self.world.get_locations()]
+        name_index = NameIndex(names)
+        for text in (names[0], names[1].upper(), names[2][:-3], "Erina", "not a location"):
+            with self.subTest(text=text):
+                guess, usable, response, confidence = name_index.match(text)
+                self.assertEqual(get_intended_text(text, names), (guess, usable, response))
+                self.assertIs(name_index.match(text)[0], guess)
+                if usable:
+                    self.assertEqual(guess, self.world.get_location(guess).name)
+
+class TrackerTestRouting(RabiRibiTestBase):
+    options = {
+        "include_post_game": True,
+    }
+
+    def test_routes_follow_reachable_entrances(self) -> None:
+        """
+        Ensure that the shortest routes reach the same regions as the state, only through usable entrances
+        or warps between reachable warp stones, and are reused while the items are unchanged.
+        """
+        items = [item for item in self.multiworld.itempool if item.player == self.player]
+        self.multiworld.random.shuffle(items)
+        state = CollectionState(self.multiworld)
+        for item in items[:len(items) // 2]:
+            state.collect(item, True)
+        state.sweep_for_advancements()
+
+        shortest_paths = self.world.region_graph.get_shortest_paths(state, self.player)
+        self.assertIs(shortest_paths, self.world.region_graph.get_shortest_paths(state.copy(), self.player))
+        for region in self.world.get_regions():
+            with self.subTest(region=region.name):
+                self.assertEqual(region.can_reach(state), shortest_paths.can_reach(region))
+                previous_region = self.world.get_region(self.world.origin_region_name)
+                for step in shortest_paths.get_route(region):
+                    if step.entrance is None:
+                        self.assertTrue(data.get_region_by_ap_name(previous_region.name).has_warp)
+                        self.assertTrue(data.get_region_by_ap_name(step.region.name).has_warp)
+                    else:
+                        self.assertIs(previous_region, step.entrance.parent_region)
+                        self.assertIs(step.region, step.entrance.connected_region)
+                        self.assertTrue(step.entrance.access_rule(state))
+                    previous_region = step.region
+                if shortest_paths.can_reach(region):
+                    self.assertIs(region, previous_region)
+
+        location = next(location for location in self.world.get_locations()
+                        if location.address is not None and location.can_reach(state))
+        messages = self.world.get_logical_path(location.name, state)
+        self.assertIn({"type": "color", "color": "green", "text": location.name}, messages)
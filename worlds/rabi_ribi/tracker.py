@@ -1,6 +1,7 @@
+from collections import Counter
 from functools import cached_property
-from typing import Any, Optional, override
-from BaseClasses import CollectionState, Entrance, Location, Region
+from typing import Any, Iterable, Optional, override
+from BaseClasses import CollectionState, Location, Region
 from NetUtils import JSONMessagePart
 from Options import Option
 from Utils import get_fuzzy_results, get_intended_text
@@ -13,6 +14,7 @@ from .data import data
 from .items import item_data_table
 from .locations import all_locations
 from .names import ItemName
+from .routing import RegionGraph
 
 
 def should_regenerate_seed_for_universal_tracker(world: World):
@@ -65,6 +67,48 @@ poptracker_name_mapping: dict[str, int] = {
     location.poptracker_name: BASE_ID + location.id for location in data.locations}
 
 
+class NameIndex:
+    """
+    The names a tracker command can refer to, built once per world. Exact and case insensitive matches
+    are looked up directly, and fuzzy match results are remembered, since the names never change.
+    """
+    # Fuzzy match results to remember, by input text.
+    MAX_CACHED_RESULTS = 256
+
+    def __init__(self, names: Iterable[str]):
+        self.names: list[str] = list(dict.fromkeys(names))
+        self.name_set: frozenset[str] = frozenset(self.names)
+        self.names_by_lowercase: dict[str, str] = {}
+        for name in self.names:
+            self.names_by_lowercase.setdefault(name.lower(), name)
+        self.results: dict[str, tuple[str, bool, str, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def match(self, text: str) -> tuple[str, bool, str, int]:
+        """
+        Returns the closest name to text, whether it is usable, a response for the user and the match confidence,
+        like Utils.get_intended_text.
+        """
+        if len(self.names) > 1:
+            if text in self.name_set:
+                return text, True, "Perfect Match", 101
+            lowercase_match = self.names_by_lowercase.get(text.lower())
+            if lowercase_match is not None:
+                return lowercase_match, True, "Case Insensitive Perfect Match", 100
+
+        result = self.results.get(text)
+        if result is None:
+            guess, usable, response = get_intended_text(text, self.names)
+            confidence = 100 if usable else get_fuzzy_results(text, self.names, limit=1)[0][1]
+            result = guess, usable, response, confidence
+            if len(self.results) >= self.MAX_CACHED_RESULTS:
+                self.results.clear()
+            self.results[text] = result
+        return result
+
+
 class RabiRibiUTWorld(RabiRibiWorldBase):
     tracker_world = {
         "map_page_maps": ["maps/maps.jsonc"],
@@ -79,6 +123,10 @@ class RabiRibiUTWorld(RabiRibiWorldBase):
     ut_can_gen_without_yaml = True
     glitches_item_name = ItemName.glitched_logic
 
+    # The last state with the glitched logic item, and the items of the player it was built from.
+    _glitched_state: CollectionState | None = None
+    _glitched_state_items: Counter[str] | None = None
+
     @cached_property
     def is_ut(self) -> bool:
         return getattr(self.multiworld, "generation_is_fake", False)
@@ -103,6 +151,40 @@ class RabiRibiUTWorld(RabiRibiWorldBase):
             self.start_location = slot_data["start_location"]
         super().generate_early()
 
+    @cached_property
+    def location_name_index(self) -> NameIndex:
+        return NameIndex(location.name for location in self.get_locations())
+
+    @cached_property
+    def region_name_index(self) -> NameIndex:
+        return NameIndex(region.name for region in self.get_regions())
+
+    @cached_property
+    def item_name_index(self) -> NameIndex:
+        return NameIndex(self.item_name_to_id.keys())
+
+    @cached_property
+    def macro_name_index(self) -> NameIndex:
+        return NameIndex(self.rule_macros.keys())
+
+    @cached_property
+    def region_graph(self) -> RegionGraph:
+        return RegionGraph(self)
+
+    def get_glitched_state(self, state: CollectionState) -> CollectionState:
+        """
+        Returns a copy of state that also has the glitched logic item. Building it sweeps the whole multiworld,
+        so the last one is reused until the items of the player change.
+        """
+        items = state.prog_items[self.player]
+        if self._glitched_state is None or self._glitched_state.multiworld is not state.multiworld or \
+                self._glitched_state_items != items:
+            glitched_state = state.copy()
+            glitched_state.collect(self.create_item(self.glitches_item_name))
+            self._glitched_state = glitched_state
+            self._glitched_state_items = items.copy()
+        return self._glitched_state
+
     def get_logical_path(self, dest_name: str, state: CollectionState, *_: Any, **__: Any) -> list[JSONMessagePart]:
         if not dest_name:
             return [{"type": "text", "text": "Provide a location or region to route to using /get_logical_path [name]"}]
@@ -110,8 +192,7 @@ class RabiRibiUTWorld(RabiRibiWorldBase):
         goal_location: Location | None = None
         goal_region: Region | None = None
         region_name = ""
-        location_name, usable, response = get_intended_text(
-            dest_name, [loc.name for loc in self.get_locations()])
+        location_name, usable, response, _confidence = self.location_name_index.match(dest_name)
         if usable:
             try:
                 goal_location = self.get_location(location_name)
@@ -121,58 +202,53 @@ class RabiRibiUTWorld(RabiRibiWorldBase):
             if not goal_region:
                 return [{"type": "text", "text": f"Location {location_name} has no parent region"}]
         else:
-            region_name, usable, _resp = get_intended_text(
-                dest_name,
-                [reg.name for reg in self.get_regions()],
-            )
+            region_name, usable, _resp, _confidence = self.region_name_index.match(dest_name)
             if usable:
                 goal_region = self.get_region(region_name)
             else:
                 return [{"type": "text", "text": response}]
 
-        in_logic = True
-        glitched_state = state.copy()
-        glitched_state.collect(self.create_item(self.glitches_item_name))
-        if (goal_location and not goal_location.can_reach(state)) or (
-            goal_region not in state.path and goal_region.name != self.origin_region_name
-        ):
-            in_logic = False
-
-        if goal_location and not goal_location.can_reach(glitched_state):
-            return [{"type": "text", "text": f"Location {goal_location.name} cannot be reached"}]
-        if goal_region not in glitched_state.path and goal_region.name != self.origin_region_name:
-            return [{"type": "text", "text": f"Region {goal_region.name} cannot be reached"}]
+        glitched_state = self.get_glitched_state(state)
+        shortest_paths = self.region_graph.get_shortest_paths(state, self.player)
+        in_logic = shortest_paths.can_reach(goal_region) and (not goal_location or goal_location.can_reach(state))
+        if not in_logic:
+            shortest_paths = self.region_graph.get_shortest_paths(glitched_state, self.player)
+            if goal_location and not goal_location.can_reach(glitched_state):
+                return [{"type": "text", "text": f"Location {goal_location.name} cannot be reached"}]
+            if not shortest_paths.can_reach(goal_region):
+                return [{"type": "text", "text": f"Region {goal_region.name} cannot be reached"}]
 
         messages: list[JSONMessagePart] = [
             {"type": "color", "color": "slateblue",
                 "text": f"Start -> {self.origin_region_name}\n"},
         ]
-        if goal_region.name != self.origin_region_name:
-            path: list[Entrance] = []
-            name, connection = state.path[goal_region] if in_logic else glitched_state.path[goal_region]
-            while connection is not None:
-                name, connection = connection
-                if "->" in name or name.endswith(" Portal"):
-                    path.append(self.get_entrance(name))
-
-            path.reverse()
-            for p in path:
-                rule_json = rule_to_json(
-                    p.access_rule, state, glitched_state, 1)
+        for step in shortest_paths.get_route(goal_region):
+            if step.entrance is None:
                 messages.extend(
                     [
-                        {"type": "entrance_name", "text": p.name,
-                            "player": self.player},
+                        {"type": "color", "color": "slateblue",
+                            "text": f"Warp -> {step.region.name}"},
+                        {"type": "text", "text": "\n"},
+                    ]
+                )
+                continue
+
+            rule_json = rule_to_json(
+                step.entrance.access_rule, state, glitched_state, 1)
+            messages.extend(
+                [
+                    {"type": "entrance_name", "text": step.entrance.name,
+                        "player": self.player},
+                    {"type": "text", "text": "\n"},
+                ]
+            )
+            if len(rule_json) > 0:
+                messages.extend(
+                    [
+                        *rule_json,
                         {"type": "text", "text": "\n"},
                     ]
                 )
-                if len(rule_json) > 0:
-                    messages.extend(
-                        [
-                            *rule_json,
-                            {"type": "text", "text": "\n"},
-                        ]
-                    )
 
         if goal_location:
             rule_json = rule_to_json(
@@ -208,8 +284,7 @@ class RabiRibiUTWorld(RabiRibiWorldBase):
             "item": self._explain_item,
         }
 
-        glitched_state = state.copy()
-        glitched_state.collect(self.create_item(self.glitches_item_name))
+        glitched_state = self.get_glitched_state(state)
 
         attempts = list(types_to_try.keys())
         parts = dest_name.split(maxsplit=1)
@@ -237,14 +312,8 @@ class RabiRibiUTWorld(RabiRibiWorldBase):
         return best_guess
 
     def _explain_location(self, location_name: str, state: CollectionState, glitched_state: CollectionState) -> tuple[list[JSONMessagePart], bool, int]:
-        all_location_names = set(
-            self.multiworld.regions.location_cache[self.player])
-        guess, usable, response = get_intended_text(
-            location_name, all_location_names)
+        guess, usable, response, confidence = self.location_name_index.match(location_name)
         if not usable:
-            picks = get_fuzzy_results(
-                location_name, all_location_names, limit=1)
-            confidence = picks[0][1]
             return [{"type": "text", "text": response}], False, confidence
 
         location_name = guess
@@ -269,13 +338,8 @@ class RabiRibiUTWorld(RabiRibiWorldBase):
         return messages, True, 100
 
     def _explain_region(self, region_name: str, state: CollectionState, glitched_state: CollectionState) -> tuple[list[JSONMessagePart], bool, int]:
-        all_region_names = set(
-            self.multiworld.regions.region_cache[self.player])
-        guess, usable, response = get_intended_text(
-            region_name, all_region_names)
+        guess, usable, response, confidence = self.region_name_index.match(region_name)
         if not usable:
-            picks = get_fuzzy_results(region_name, all_region_names, limit=1)
-            confidence = picks[0][1]
             return [{"type": "text", "text": response}], False, confidence
 
         region_name = guess
@@ -313,11 +377,8 @@ class RabiRibiUTWorld(RabiRibiWorldBase):
         return messages, True, 100
 
     def _explain_item(self, item_name: str, state: CollectionState, glitched_state: CollectionState) -> tuple[list[JSONMessagePart], bool, int]:
-        all_item_names = set(self.item_name_to_id.keys())
-        guess, usable, response = get_intended_text(item_name, all_item_names)
+        guess, usable, response, confidence = self.item_name_index.match(item_name)
         if not usable:
-            picks = get_fuzzy_results(item_name, all_item_names, limit=1)
-            confidence = picks[0][1]
             return [{"type": "text", "text": response}], False, confidence
 
         item_name = guess
@@ -346,15 +407,11 @@ class RabiRibiUTWorld(RabiRibiWorldBase):
         return messages, True, 100
 
     def _explain_macro(self, macro_name: str, state: CollectionState, glitched_state: CollectionState) -> tuple[list[JSONMessagePart], bool, int]:
-        all_macro_names = set(self.rule_macros.keys())
-        if len(all_macro_names) == 0:
+        if len(self.macro_name_index) == 0:
             return [{"type": "text", "text": "No macros found!"}], False, 0
 
-        guess, usable, response = get_intended_text(
-            macro_name, all_macro_names)
+        guess, usable, response, confidence = self.macro_name_index.match(macro_name)
         if not usable:
-            picks = get_fuzzy_results(macro_name, all_macro_names, limit=1)
-            confidence = picks[0][1]
             return [{"type": "text", "text": response}], False, confidence
 
         macro_name = guess
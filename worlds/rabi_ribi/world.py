@@ -32,6 +32,9 @@ class RabiRibiWorld(RabiRibiUTWorld):
     web: ClassVar[WebWorld] = RabiRibiWeb()
     base_id: int = BASE_ID
     topology_present: bool = False
+    # Entrance rules that can reach regions register them as indirect conditions in set_rule,
+    # from the region dependencies of the resolved rules.
+    explicit_indirect_conditions: bool = True
 
     item_name_groups: ClassVar[dict[str, set[str]]] = item_groups
     location_name_groups: ClassVar[dict[str, set[str]]] = location_groups